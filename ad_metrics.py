@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+"""
+Contadores de impressões e cliques de anúncios.
+
+As contagens são acumuladas em memória por worker e gravadas a cada
+poucos segundos em `ad_stats_hourly` (uma linha por anúncio por hora),
+evitando um UPDATE por visualização de sala.
+"""
+
+import threading
+from datetime import datetime, timedelta
+from sqlalchemy import func
+from models import AdStatHourly, Advertisement
+from db_utils import upsert_increment
+from background import start_periodic_task
+
+
+def hour_bucket(moment=None):
+    """Início da hora (UTC) de `moment`"""
+    return (moment or datetime.utcnow()).replace(minute=0, second=0, microsecond=0)
+
+
+class AdCounterBuffer:
+    """Acumula impressões e cliques por (anúncio, hora)"""
+
+    def __init__(self):
+        self._pending = {}
+        self._lock = threading.Lock()
+
+    def _add(self, ad_id, impressions=0, clicks=0, hour=None):
+        key = (ad_id, hour or hour_bucket())
+        with self._lock:
+            counts = self._pending.setdefault(key, [0, 0])
+            counts[0] += impressions
+            counts[1] += clicks
+
+    def record_impressions(self, ad_ids):
+        """Conta uma impressão para cada anúncio exibido"""
+        for ad_id in ad_ids:
+            self._add(ad_id, impressions=1)
+
+    def record_click(self, ad_id):
+        """Conta um clique no anúncio"""
+        self._add(ad_id, clicks=1)
+
+    def flush(self, db_session):
+        """Soma os contadores pendentes às linhas horárias"""
+        with self._lock:
+            batch, self._pending = self._pending, {}
+
+        if not batch:
+            return 0
+
+        try:
+            # Anúncios excluídos com contagens pendentes: descartadas (a linha
+            # horária violaria a chave estrangeira e travaria o lote inteiro)
+            existing = {ad_id for ad_id, in db_session.query(Advertisement.id).filter(
+                Advertisement.id.in_({ad_id for ad_id, _ in batch})
+            )}
+            rows = [
+                {'ad_id': ad_id, 'hour': hour, 'impressions': impressions, 'clicks': clicks}
+                for (ad_id, hour), (impressions, clicks) in batch.items()
+                if ad_id in existing
+            ]
+            if not rows:
+                db_session.rollback()
+                return 0
+            upsert_increment(db_session, AdStatHourly.__table__, rows,
+                             ['ad_id', 'hour'], ['impressions', 'clicks'])
+            db_session.commit()
+        except Exception:
+            db_session.rollback()
+            # Devolver ao buffer para a próxima tentativa, na hora original
+            for (ad_id, hour), (impressions, clicks) in batch.items():
+                self._add(ad_id, impressions, clicks, hour)
+            raise
+
+        return len(rows)
+
+    def __len__(self):
+        return len(self._pending)
+
+
+ad_counters = AdCounterBuffer()
+
+
+def init_ad_metrics(app, socketio):
+    """Inicia a gravação periódica dos contadores de anúncios"""
+    start_periodic_task(
+        app, socketio, app.config.get('AD_STATS_FLUSH_SECONDS', 5),
+        ad_counters.flush, 'gravar contadores de anúncios'
+    )
+
+
+def hourly_stats(db_session, ad_id, hours=168):
+    """Série horária de impressões e cliques das últimas `hours` horas"""
+    since = hour_bucket() - timedelta(hours=hours - 1)
+    rows = db_session.query(AdStatHourly).filter(
+        AdStatHourly.ad_id == ad_id,
+        AdStatHourly.hour >= since
+    ).order_by(AdStatHourly.hour).all()
+
+    return [{
+        'hour': row.hour.isoformat(),
+        'impressions': row.impressions,
+        'clicks': row.clicks
+    } for row in rows]
+
+
+def totals_by_ad(db_session, ad_ids):
+    """Totais de impressões e cliques por anúncio"""
+    if not ad_ids:
+        return {}
+
+    rows = db_session.query(
+        AdStatHourly.ad_id,
+        func.sum(AdStatHourly.impressions),
+        func.sum(AdStatHourly.clicks)
+    ).filter(
+        AdStatHourly.ad_id.in_(ad_ids)
+    ).group_by(AdStatHourly.ad_id).all()
+
+    totals = {}
+    for ad_id, impressions, clicks in rows:
+        impressions = impressions or 0
+        clicks = clicks or 0
+        totals[ad_id] = {
+            'impressions': impressions,
+            'clicks': clicks,
+            'ctr': round(clicks / impressions * 100, 2) if impressions else 0.0
+        }
+    return totals
@@ -0,0 +1,411 @@
+#!/usr/bin/env python3
+"""
+Agenda em memória de anúncios e mensagens do administrador.
+
+Mantém os itens ativos por sala e uma roda de temporização (timer wheel)
+com os próximos limites de início/fim. Quando um limite é atingido a
+transição é enviada via Socket.IO para os clientes conectados, sem
+consultas ao banco a cada carregamento de página.
+
+Com vários workers (REDIS_URL configurado):
+
+* cada criação/edição/exclusão é publicada no canal `ad_schedule`; os
+  demais workers recarregam o item do banco na hora, sem esperar a
+  ressincronização periódica;
+* a roda de temporização roda em todos os workers, mas só o dono da posse
+  `leader:ad_schedule` envia as transições de início/fim (com a fila do
+  Socket.IO, um único envio chega a todos os clientes).
+"""
+
+import json
+import threading
+import time
+from datetime import datetime
+from models import Advertisement, AdminMessage, Room
+from redis_pool import LeaderLock, get_redis, subscriber
+
+INVALIDATION_CHANNEL = 'ad_schedule'
+
+EPOCH = datetime(1970, 1, 1)
+
+
+def _timestamp(dt):
+    """Converte datetime UTC (sem timezone) em segundos desde a época"""
+    return (dt - EPOCH).total_seconds()
+
+
+class ScheduledItem:
+    """Cópia leve de um anúncio ou mensagem do administrador"""
+
+    __slots__ = ('kind', 'id', 'room_id', 'room_slug', 'title', 'content', 'image_path',
+                 'link', 'priority', 'start_date', 'end_date', 'created_at', 'is_active')
+
+    def __init__(self, kind, obj, room_slug=None):
+        self.kind = kind
+        self.id = obj.id
+        self.room_id = getattr(obj, 'room_id', None)
+        self.room_slug = room_slug
+        self.title = obj.title
+        self.content = obj.content
+        self.image_path = obj.image_path
+        self.link = obj.link
+        self.priority = obj.priority or 1
+        self.start_date = obj.start_date
+        self.end_date = obj.end_date
+        self.created_at = obj.created_at or datetime.utcnow()
+        self.is_active = bool(obj.is_active)
+
+    @property
+    def key(self):
+        return (self.kind, self.id)
+
+    def state(self, now):
+        """'pending', 'active' ou 'expired' no instante `now`"""
+        if not self.is_active or now > self.end_date:
+            return 'expired'
+        if now < self.start_date:
+            return 'pending'
+        return 'active'
+
+    @property
+    def is_current(self):
+        return self.state(datetime.utcnow()) == 'active'
+
+    @property
+    def is_expired(self):
+        return datetime.utcnow() > self.end_date
+
+    @property
+    def days_remaining(self):
+        if self.is_expired:
+            return 0
+        return max(0, (self.end_date - datetime.utcnow()).days)
+
+    def sort_key(self):
+        return (-self.priority, -_timestamp(self.created_at))
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'room': self.room_slug,
+            'title': self.title,
+            'content': self.content,
+            'image_path': self.image_path,
+            'link': self.link,
+            'priority': self.priority,
+            'start_date': self.start_date.isoformat(),
+            'end_date': self.end_date.isoformat()
+        }
+
+
+class TimerWheel:
+    """Roda de temporização com resolução de `tick` segundos.
+
+    Agendar e cancelar custam O(1); cada tick percorre apenas um slot.
+    Prazos além de uma volta completa permanecem no slot até chegar a vez.
+    """
+
+    def __init__(self, slots=3600, tick=1.0):
+        self.tick = tick
+        self._slots = [[] for _ in range(slots)]
+        self._current = int(time.time() // tick)
+
+    def schedule(self, when, key, token):
+        """Agenda `key` para o instante `when` (segundos desde a época)"""
+        deadline = max(int(when // self.tick), self._current + 1)
+        self._slots[deadline % len(self._slots)].append((deadline, key, token))
+
+    def advance(self, now):
+        """Avança até `now` e retorna as entradas vencidas"""
+        target = int(now // self.tick)
+        due = []
+        steps = min(target - self._current, len(self._slots))
+        for step in range(1, steps + 1):
+            slot_index = (self._current + step) % len(self._slots)
+            slot = self._slots[slot_index]
+            if not slot:
+                continue
+            keep = []
+            for entry in slot:
+                (due if entry[0] <= target else keep).append(entry)
+            self._slots[slot_index] = keep
+        self._current = max(self._current, target)
+        return due
+
+
+class AdSchedule:
+    """Agenda de anúncios (por sala) e mensagens do administrador (globais)"""
+
+    def __init__(self):
+        self.loaded = False
+        self.socketio = None
+        self._items = {}
+        self._active = set()
+        self._tokens = {}
+        self._wheel = TimerWheel()
+        self._lock = threading.RLock()
+        self.redis = None
+        self.leader = LeaderLock('ad_schedule')
+
+    # ------------------------------------------------------------------
+    # Carga e atualização incremental
+    # ------------------------------------------------------------------
+
+    def load(self, db_session):
+        """Recarrega todos os itens ainda não expirados do banco (transições só no dono)"""
+        now = datetime.utcnow()
+        ads = db_session.query(Advertisement, Room.slug).join(
+            Room, Room.id == Advertisement.room_id
+        ).filter(
+            Advertisement.is_active == True,
+            Advertisement.end_date >= now
+        ).all()
+        admin_messages = db_session.query(AdminMessage).filter(
+            AdminMessage.is_active == True,
+            AdminMessage.end_date >= now
+        ).all()
+
+        items = [ScheduledItem('ad', ad, slug) for ad, slug in ads]
+        items += [ScheduledItem('admin', message) for message in admin_messages]
+
+        with self._lock:
+            current_keys = {item.key for item in items}
+            transitions = [self._remove(key) for key in list(self._items) if key not in current_keys]
+            transitions += [self._apply(item, now) for item in items]
+            self.loaded = True
+        self._emit_owned(transitions)
+
+    def ensure_loaded(self, db_session):
+        """Carrega a agenda na primeira utilização"""
+        if not self.loaded:
+            self.load(db_session)
+
+    def upsert_advertisement(self, advertisement, room_slug):
+        """Atualiza a agenda após criar, editar ou alternar um anúncio"""
+        self._upsert(ScheduledItem('ad', advertisement, room_slug))
+
+    def remove_advertisement(self, advertisement_id):
+        """Remove um anúncio excluído"""
+        self._delete(('ad', advertisement_id))
+
+    def upsert_admin_message(self, admin_message):
+        """Atualiza a agenda após criar, editar ou alternar uma mensagem do administrador"""
+        self._upsert(ScheduledItem('admin', admin_message))
+
+    def remove_admin_message(self, message_id):
+        """Remove uma mensagem do administrador excluída"""
+        self._delete(('admin', message_id))
+
+    # A transição de uma edição local é enviada por este worker; os demais só atualizam a agenda
+
+    def _upsert(self, item):
+        with self._lock:
+            transition = self._apply(item, datetime.utcnow(), updated=True)
+        self._emit([transition])
+        self._publish('upsert', item.key)
+
+    def _delete(self, key):
+        with self._lock:
+            transition = self._remove(key)
+        self._emit([transition])
+        self._publish('remove', key)
+
+    def _publish(self, op, key):
+        if self.redis is None:
+            return
+        try:
+            self.redis.publish(INVALIDATION_CHANNEL, json.dumps({
+                'op': op, 'kind': key[0], 'id': key[1], 'origin': self.leader.token
+            }))
+        except Exception as e:
+            print(f"Erro ao publicar alteração de anúncio: {e}")
+
+    def _load_item(self, db_session, kind, item_id):
+        """Item atual no banco (None se excluído)"""
+        if kind == 'ad':
+            row = db_session.query(Advertisement, Room.slug).join(
+                Room, Room.id == Advertisement.room_id
+            ).filter(Advertisement.id == item_id).first()
+            return ScheduledItem('ad', row[0], row[1]) if row else None
+        message = db_session.query(AdminMessage).filter(AdminMessage.id == item_id).first()
+        return ScheduledItem('admin', message) if message else None
+
+    def apply_invalidation(self, db_session, data):
+        """Aplica a alteração publicada por outro worker"""
+        key = (data['kind'], data['id'])
+        item = self._load_item(db_session, *key) if data['op'] == 'upsert' else None
+        with self._lock:
+            if item is None:
+                self._remove(key)
+            else:
+                self._apply(item, datetime.utcnow(), updated=True)
+
+    def _apply(self, item, now, updated=False):
+        """Registra o item, agenda o próximo limite e retorna a transição ocorrida"""
+        key = item.key
+        was_active = key in self._active
+        state = item.state(now)
+
+        self._items[key] = item
+        token = self._tokens.get(key, 0) + 1
+        self._tokens[key] = token
+
+        if state == 'pending':
+            self._wheel.schedule(_timestamp(item.start_date), key, token)
+        elif state == 'active':
+            self._wheel.schedule(_timestamp(item.end_date) + self._wheel.tick, key, token)
+
+        if state == 'active':
+            self._active.add(key)
+            if not was_active:
+                return ('activated', item)
+            return ('updated', item) if updated else None
+
+        self._active.discard(key)
+        if state == 'expired':
+            # Itens expirados não precisam permanecer na agenda
+            del self._items[key]
+            del self._tokens[key]
+        return ('expired', item) if was_active else None
+
+    def _remove(self, key):
+        item = self._items.pop(key, None)
+        self._tokens.pop(key, None)
+        if key in self._active:
+            self._active.discard(key)
+            return ('expired', item)
+        return None
+
+    # ------------------------------------------------------------------
+    # Leitura
+    # ------------------------------------------------------------------
+
+    def active_advertisements(self, room_id):
+        """Anúncios ativos da sala, por prioridade e data de criação"""
+        now = datetime.utcnow()
+        with self._lock:
+            items = [self._items[key] for key in self._active
+                     if key[0] == 'ad' and self._items[key].room_id == room_id]
+        return sorted((item for item in items if item.state(now) == 'active'), key=ScheduledItem.sort_key)
+
+    def active_admin_messages(self):
+        """Mensagens do administrador ativas, por prioridade e data de criação"""
+        now = datetime.utcnow()
+        with self._lock:
+            items = [self._items[key] for key in self._active if key[0] == 'admin']
+        return sorted((item for item in items if item.state(now) == 'active'), key=ScheduledItem.sort_key)
+
+    def get_advertisement(self, advertisement_id):
+        """Retorna o anúncio em memória (ativo ou agendado), se houver"""
+        return self._items.get(('ad', advertisement_id))
+
+    def active_counts(self):
+        """Quantidade de anúncios e mensagens do administrador ativos"""
+        with self._lock:
+            ads = sum(1 for kind, _ in self._active if kind == 'ad')
+            return {'advertisements': ads, 'admin_messages': len(self._active) - ads}
+
+    # ------------------------------------------------------------------
+    # Execução
+    # ------------------------------------------------------------------
+
+    def tick(self, now_ts=None):
+        """Processa os limites vencidos até `now_ts`"""
+        now_ts = now_ts if now_ts is not None else time.time()
+        now = datetime.utcfromtimestamp(now_ts)
+        transitions = []
+        with self._lock:
+            for _, key, token in self._wheel.advance(now_ts):
+                if self._tokens.get(key) != token:
+                    continue  # Entrada substituída por uma edição posterior
+                transitions.append(self._apply(self._items[key], now))
+        self._emit_owned(transitions)
+
+    def _emit_owned(self, transitions):
+        """Transições da roda e da ressincronização: enviadas apenas pelo dono da posse"""
+        if any(transitions) and self.leader.acquire():
+            self._emit(transitions)
+
+    def _emit(self, transitions):
+        """Envia as transições aos clientes conectados"""
+        if not self.socketio:
+            return
+        for transition in transitions:
+            if not transition:
+                continue
+            action, item = transition
+            payload = {'action': action, 'item': item.to_dict()}
+            try:
+                if item.kind == 'ad':
+                    self.socketio.emit('advertisement', payload, to=item.room_slug, namespace='/')
+                else:
+                    self.socketio.emit('admin_message', payload, namespace='/')
+            except Exception as e:
+                print(f"Erro ao enviar transição de anúncio: {e}")
+
+    def run(self, app):
+        """Laço em segundo plano: acorda a cada limite de tick"""
+        resync_every = app.config.get('AD_SCHEDULE_RESYNC_SECONDS', 600)
+        last_resync = time.monotonic()
+        while True:
+            now = time.time()
+            self.socketio.sleep(self._wheel.tick - (now % self._wheel.tick))
+            # Renova a posse a cada tick, mesmo sem transições
+            self.leader.acquire()
+            self.tick()
+
+            # Rede de segurança para invalidações perdidas (Redis fora do ar)
+            if resync_every and time.monotonic() - last_resync >= resync_every:
+                last_resync = time.monotonic()
+                with app.app_context():
+                    db = app.extensions['sqlalchemy']
+                    try:
+                        self.load(db.session)
+                    except Exception as e:
+                        print(f"Erro ao ressincronizar anúncios: {e}")
+                    finally:
+                        db.session.remove()
+
+
+    def listen(self, app):
+        """Recebe as alterações publicadas pelos outros workers"""
+        while True:
+            pubsub = subscriber(app)
+            try:
+                pubsub.subscribe(INVALIDATION_CHANNEL)
+                for message in pubsub.listen():
+                    data = json.loads(message['data'])
+                    if data.get('origin') == self.leader.token:
+                        continue
+                    with app.app_context():
+                        db = app.extensions['sqlalchemy']
+                        try:
+                            self.apply_invalidation(db.session, data)
+                        finally:
+                            db.session.remove()
+            except Exception as e:
+                print(f"Erro ao receber alterações de anúncios: {e}")
+            finally:
+                pubsub.close()
+            self.socketio.sleep(1)
+
+
+ad_schedule = AdSchedule()
+
+
+def init_ad_schedule(app, socketio):
+    """Carrega a agenda e inicia o laço de transições (e o assinante das alterações)"""
+    ad_schedule.socketio = socketio
+    ad_schedule.redis = get_redis(app)
+    ad_schedule.leader.redis = ad_schedule.redis
+    with app.app_context():
+        db = app.extensions['sqlalchemy']
+        try:
+            ad_schedule.load(db.session)
+        except Exception as e:
+            print(f"Erro ao carregar agenda de anúncios: {e}")
+        finally:
+            db.session.remove()
+    socketio.start_background_task(ad_schedule.run, app)
+    if ad_schedule.redis is not None:
+        socketio.start_background_task(ad_schedule.listen, app)
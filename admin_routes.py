@@ -4,6 +4,11 @@ from datetime import datetime, timedelta
 from sqlalchemy import func
 from models import User, Room, Message, Advertisement, AdminMessage, RoomMember
 from forms import AdminMessageForm
+from ad_schedule import ad_schedule
+from metrics import record_upload
+from redis_session import revoke_user_sessions
+from db_routing import read_replica
+from rollups import get_totals, top_rooms, top_users, messages_per_day as rollup_messages_per_day
 from werkzeug.utils import secure_filename
 import os
 
@@ -30,16 +35,18 @@ def admin_required(f):
 @admin_bp.route('/')
 @login_required
 @admin_required
+@read_replica
 def dashboard():
     """Dashboard do administrador com métricas do sistema"""
     db = current_app.extensions['sqlalchemy']
     
-    # Métricas básicas
-    total_users = db.session.query(User).count()
-    total_rooms = db.session.query(Room).count()
-    total_messages = db.session.query(Message).count()
-    total_advertisements = db.session.query(Advertisement).count()
-    total_admin_messages = db.session.query(AdminMessage).count()
+    # Totais mantidos incrementalmente (custo independente do histórico)
+    totals = get_totals(db.session)
+    total_users = totals['users']
+    total_rooms = totals['rooms']
+    total_messages = totals['messages']
+    total_advertisements = totals['advertisements']
+    total_admin_messages = totals['admin_messages']
     
     # Usuários online (últimos 5 minutos)
     five_minutes_ago = datetime.utcnow() - timedelta(minutes=5)
@@ -48,48 +55,17 @@ def dashboard():
     ).count()
     
     # Mensagens por dia (últimos 7 dias)
-    seven_days_ago = datetime.utcnow() - timedelta(days=7)
-    messages_per_day = db.session.query(
-        func.date(Message.created_at).label('date'),
-        func.count(Message.id).label('count')
-    ).filter(
-        Message.created_at >= seven_days_ago
-    ).group_by(
-        func.date(Message.created_at)
-    ).order_by(
-        func.date(Message.created_at)
-    ).all()
-    
-    # Salas mais ativas
-    active_rooms = db.session.query(
-        Room,
-        func.count(Message.id).label('message_count')
-    ).outerjoin(Message).group_by(Room.id).order_by(
-        func.count(Message.id).desc()
-    ).limit(5).all()
+    messages_per_day = rollup_messages_per_day(db.session, days=7)
     
-    # Usuários mais ativos
-    active_users = db.session.query(
-        User,
-        func.count(Message.id).label('message_count')
-    ).outerjoin(Message).group_by(User.id).order_by(
-        func.count(Message.id).desc()
-    ).limit(5).all()
-    
-    # Anúncios ativos
-    now = datetime.utcnow()
-    active_advertisements = db.session.query(Advertisement).filter(
-        Advertisement.is_active == True,
-        Advertisement.start_date <= now,
-        Advertisement.end_date >= now
-    ).count()
+    # Salas e usuários mais ativos
+    active_rooms = top_rooms(db.session)
+    active_users = top_users(db.session)
     
-    # Mensagens do admin ativas
-    active_admin_messages = db.session.query(AdminMessage).filter(
-        AdminMessage.is_active == True,
-        AdminMessage.start_date <= now,
-        AdminMessage.end_date >= now
-    ).count()
+    # Anúncios e mensagens do admin ativos (agenda em memória)
+    ad_schedule.ensure_loaded(db.session)
+    active_counts = ad_schedule.active_counts()
+    active_advertisements = active_counts['advertisements']
+    active_admin_messages = active_counts['admin_messages']
     
     return render_template('admin/dashboard.html',
                          total_users=total_users,
@@ -107,6 +83,7 @@ def dashboard():
 @admin_bp.route('/messages')
 @login_required
 @admin_required
+@read_replica
 def manage_messages():
     """Gerenciar mensagens globais do administrador"""
     db = current_app.extensions['sqlalchemy']
@@ -156,6 +133,7 @@ def create_message():
                 file_path = f"uploads/admin_messages/{filename}"
                 os.makedirs(os.path.join(current_app.static_folder, 'uploads/admin_messages'), exist_ok=True)
                 file.save(os.path.join(current_app.static_folder, file_path))
+                record_upload('admin_message', os.path.join(current_app.static_folder, file_path))
                 image_path = file_path
         
         # Criar mensagem do administrador
@@ -173,6 +151,7 @@ def create_message():
         
         db.session.add(admin_message)
         db.session.commit()
+        ad_schedule.upsert_admin_message(admin_message)
         
         flash('Mensagem do administrador criada com sucesso!', 'success')
         return redirect(url_for('admin.manage_messages'))
@@ -225,6 +204,7 @@ def edit_message(message_id):
                 file_path = f"uploads/admin_messages/{filename}"
                 os.makedirs(os.path.join(current_app.static_folder, 'uploads/admin_messages'), exist_ok=True)
                 file.save(os.path.join(current_app.static_folder, file_path))
+                record_upload('admin_message', os.path.join(current_app.static_folder, file_path))
                 admin_message.image_path = file_path
         
         # Atualizar dados
@@ -237,6 +217,7 @@ def edit_message(message_id):
         admin_message.is_active = form.is_active.data
         
         db.session.commit()
+        ad_schedule.upsert_admin_message(admin_message)
         flash('Mensagem do administrador atualizada com sucesso!', 'success')
         return redirect(url_for('admin.manage_messages'))
     
@@ -259,6 +240,7 @@ def delete_message(message_id):
     
     db.session.delete(admin_message)
     db.session.commit()
+    ad_schedule.remove_admin_message(message_id)
     
     return jsonify({'success': True, 'message': 'Mensagem deletada com sucesso!'})
 
@@ -273,6 +255,7 @@ def toggle_message(message_id):
     admin_message.is_active = not admin_message.is_active
     
     db.session.commit()
+    ad_schedule.upsert_admin_message(admin_message)
     
     status = 'ativada' if admin_message.is_active else 'desativada'
     return jsonify({
@@ -319,3 +302,25 @@ def get_message(message_id):
             'success': False,
             'error': str(e)
         }), 500
+
+@admin_bp.route('/users/<int:user_id>/sessions/revoke', methods=['POST'])
+@login_required
+@admin_required
+def revoke_sessions(user_id):
+    """Encerra todas as sessões de um usuário (logout forçado em todos os workers)"""
+    db = current_app.extensions['sqlalchemy']
+    user = db.session.get(User, user_id)
+    if not user:
+        return jsonify({'success': False, 'error': 'Usuário não encontrado'}), 404
+    
+    revoked = revoke_user_sessions(current_app, user.id)
+    if revoked is None:
+        return jsonify({
+            'success': False,
+            'error': 'Sessões no servidor não estão ativas (SESSION_STORE=redis)'
+        }), 400
+    
+    return jsonify({
+        'success': True,
+        'message': f'{revoked} sessão(ões) de {user.username} encerrada(s)'
+    })
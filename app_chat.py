@@ -4,6 +4,7 @@ from flask_sqlalchemy import SQLAlchemy
 from flask_login import LoginManager, current_user
 from config import Config
 from models import Base, User
+from user_cache import init_user_cache
 from forms import LoginForm, RegistrationForm
 from auth import handle_login, handle_registration, logout_user_handler
 
@@ -24,9 +25,7 @@ def create_app(config_class=Config):
     login_manager.login_message = 'Por favor, faça login para acessar esta página.'
     login_manager.login_message_category = 'info'
     
-    @login_manager.user_loader
-    def load_user(user_id):
-        return db.session.query(User).get(int(user_id))
+    init_user_cache(app, login_manager)
     
     # Criar diretórios necessários
     os.makedirs('instance', exist_ok=True)
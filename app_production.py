@@ -4,10 +4,17 @@ CHATLIVER1404 - Aplicação de Produção
 Versão otimizada para VPS com Docker
 """
 
+# O eventlet precisa substituir socket/threading/time antes de qualquer
+# outro import (Flask, SQLAlchemy, redis, psycopg2); módulos importados
+# antes guardam as versões bloqueantes e travam o hub inteiro
+import eventlet
+eventlet.monkey_patch()
+
 import os
 import logging
 import structlog
 from flask import Flask, render_template, request, redirect, url_for, flash, jsonify, send_from_directory
+from werkzeug.middleware.proxy_fix import ProxyFix
 from flask_socketio import SocketIO, emit, join_room, leave_room
 from flask_login import LoginManager, login_user, logout_user, login_required, current_user
 from flask_mail import Mail
@@ -15,7 +22,6 @@ from flask_compress import Compress
 from flask_limiter import Limiter
 from flask_limiter.util import get_remote_address
 from werkzeug.utils import secure_filename
-import redis
 from datetime import datetime
 from config_production import ProductionConfig
 from models import Base, User, Room, RoomMember, RoomInvite, Message, Attachment, AccessRequest
@@ -23,9 +29,29 @@ from forms import LoginForm, RegistrationForm
 from auth import handle_login, handle_registration
 from auth_routes import auth_bp
 from rooms_routes import rooms_bp
-from chat_routes import chat_bp
+from chat_routes import chat_bp, register_socket_events
 from messages import MessageHandler
 from invites import InviteGenerator, InviteEmailService
+from unread import init_unread, register_unread_events
+from notifications import join_user_channel
+from ad_schedule import init_ad_schedule
+from ad_metrics import init_ad_metrics
+from rollups import init_rollups
+from dashboard_live import live_dashboard, init_live_dashboard, register_dashboard_events
+from metrics import init_metrics, socket_connections
+from db_pool import pool_engine_options, socket_db_session, init_db_pool
+from sqlite_tuning import init_sqlite_tuning
+from db_routing import routing_session_options, init_db_routing
+from partitioning import init_partitioning
+from archive import init_archive
+from query_profiler import init_query_profiler
+from passwords import init_passwords
+from login_guard import init_login_guard
+from user_cache import init_user_cache
+from redis_session import init_redis_sessions
+from health import init_health
+from green_db import init_green_db
+from redis_pool import init_redis, limiter_options, socketio_queue_options
 
 # Configuração de logging estruturado
 structlog.configure(
@@ -53,6 +79,11 @@ def create_app():
     app = Flask(__name__)
     app.config.from_object(ProductionConfig)
     
+    # IP real do cliente atrás do nginx (login_guard, Flask-Limiter, logs)
+    if app.config.get('PROXY_FIX_X_FOR'):
+        app.wsgi_app = ProxyFix(app.wsgi_app, x_for=app.config['PROXY_FIX_X_FOR'],
+                                x_proto=app.config['PROXY_FIX_X_FOR'])
+    
     # Configurar logging
     if not app.debug:
         logging.basicConfig(
@@ -63,9 +94,14 @@ def create_app():
     
     # Inicialização das extensões
     from flask_sqlalchemy import SQLAlchemy
-    db = SQLAlchemy(app)
+    # Pool instrumentado (espera e ocupação exportadas nas métricas) e sessão que
+    # envia leituras de rotas @read_replica às réplicas
+    db = SQLAlchemy(app, engine_options=pool_engine_options(app), session_options=routing_session_options())
     mail = Mail(app)
     
+    # Pool Redis único do processo (verificador de saúde, limiter, sessões, fila do Socket.IO)
+    init_redis(app)
+    
     # Socket.IO com configurações de produção
     socketio = SocketIO(
         app, 
@@ -74,9 +110,16 @@ def create_app():
         ping_timeout=60,
         ping_interval=25,
         logger=True,
-        engineio_logger=True
+        engineio_logger=True,
+        **socketio_queue_options(app)
     )
     
+    # psycopg2 cooperativo: consultas não bloqueiam o hub do eventlet
+    init_green_db(app, socketio)
+    
+    # Instalação em um único servidor com SQLite: WAL, pragmas e escritor único
+    init_sqlite_tuning(app)
+    
     # Compressão
     Compress(app)
     
@@ -84,7 +127,8 @@ def create_app():
     limiter = Limiter(
         app=app,
         key_func=get_remote_address,
-        default_limits=["200 per day", "50 per hour"]
+        default_limits=["200 per day", "50 per hour"],
+        **limiter_options(app)
     )
     
     # Configuração do Login Manager
@@ -94,10 +138,11 @@ def create_app():
     login_manager.login_message = 'Por favor, faça login para acessar esta página.'
     login_manager.login_message_category = 'warning'
     
-    @login_manager.user_loader
-    def load_user(user_id):
-        """Carrega o usuário para o Flask-Login"""
-        return db.session.get(User, int(user_id))
+    # Usuário autenticado carregado de um cache TTL (invalidado em alterações)
+    init_user_cache(app, login_manager)
+    
+    # Sessões no Redis (opcional, SESSION_STORE=redis)
+    init_redis_sessions(app, login_manager)
     
     # Registro dos blueprints
     app.register_blueprint(auth_bp, url_prefix='/auth')
@@ -132,96 +177,44 @@ def create_app():
             return redirect(url_for('rooms.index'))
         return redirect(url_for('auth.login'))
     
-    # Health check
-    @app.route('/health')
-    def health_check():
-        """Health check para monitoramento"""
-        try:
-            # Verificar banco de dados
-            db.session.execute('SELECT 1')
-            # Verificar Redis
-            redis_client = redis.from_url(app.config['REDIS_URL'])
-            redis_client.ping()
-            
-            return jsonify({
-                'status': 'healthy',
-                'timestamp': datetime.utcnow().isoformat(),
-                'database': 'connected',
-                'redis': 'connected'
-            }), 200
-        except Exception as e:
-            logger.error("Health check failed", error=str(e))
-            return jsonify({
-                'status': 'unhealthy',
-                'timestamp': datetime.utcnow().isoformat(),
-                'error': str(e)
-            }), 500
-    
-    # Configuração do Socket.IO
-    def register_socket_events():
-        """Registra os eventos do Socket.IO"""
+    # Configuração do Socket.IO (join, leave, message e typing ficam em chat_routes)
+    def register_app_socket_events():
+        """Registra os eventos do Socket.IO da aplicação"""
         
         @socketio.on('connect')
+        @socket_db_session
         def handle_connect():
             logger.info("Cliente conectado", sid=request.sid)
+            join_user_channel()
+            live_dashboard.socket_connected()
+            socket_connections.inc()
             emit('status', {'msg': 'Conectado ao servidor'})
         
         @socketio.on('disconnect')
         def handle_disconnect():
             logger.info("Cliente desconectado", sid=request.sid)
-        
-        @socketio.on('join')
-        def handle_join(data):
-            room = data.get('room')
-            if room:
-                join_room(room)
-                username = current_user.username if current_user.is_authenticated else "Anônimo"
-                logger.info("Usuário entrou na sala", user=username, room=room)
-                emit('status', {'msg': f'Entrou na sala: {room}'}, room=room)
-        
-        @socketio.on('leave')
-        def handle_leave(data):
-            room = data.get('room')
-            if room:
-                leave_room(room)
-                username = current_user.username if current_user.is_authenticated else "Anônimo"
-                logger.info("Usuário saiu da sala", user=username, room=room)
-                emit('status', {'msg': f'Saiu da sala: {room}'}, room=room)
-        
-        @socketio.on('message')
-        def handle_message(data):
-            room = data.get('room')
-            message = data.get('message')
-            if room and message and current_user.is_authenticated:
-                try:
-                    # Salvar mensagem no banco
-                    message_handler = MessageHandler(db.session)
-                    saved_message = message_handler.create_message(
-                        room_slug=room,
-                        user_id=current_user.id,
-                        content=message
-                    )
-                    
-                    if saved_message:
-                        # Formatar mensagem para envio
-                        formatted_message = message_handler.format_message_for_socket(saved_message, current_user)
-                        emit('message', formatted_message, room=room)
-                        logger.info("Mensagem enviada", user=current_user.username, room=room)
-                except Exception as e:
-                    logger.error("Erro ao processar mensagem", error=str(e), user=current_user.username, room=room)
-        
-        @socketio.on('typing')
-        def handle_typing(data):
-            room = data.get('room')
-            is_typing = data.get('is_typing', False)
-            if room and current_user.is_authenticated:
-                emit('typing', {
-                    'user': current_user.username,
-                    'is_typing': is_typing
-                }, room=room, include_self=False)
+            live_dashboard.socket_disconnected()
+            socket_connections.dec()
     
     # Registrar eventos do Socket.IO
-    register_socket_events()
+    register_app_socket_events()
+    register_socket_events(socketio)
+    init_passwords(app, socketio)
+    init_login_guard(app)
+    register_unread_events(socketio)
+    register_dashboard_events(socketio)
+    init_unread(app, socketio)
+    init_ad_schedule(app, socketio)
+    init_ad_metrics(app, socketio)
+    init_rollups(app, socketio)
+    init_live_dashboard(app, socketio)
+    init_query_profiler(app)
+    init_metrics(app)
+    init_db_pool(app)
+    init_db_routing(app, socketio)
+    init_partitioning(app, socketio)
+    init_archive(app, socketio)
+    init_health(app, socketio)
     
     return app, db, mail, socketio
 
@@ -237,7 +230,5 @@ if __name__ == '__main__':
     logger.info("📱 PWA disponível para instalação no celular!")
     logger.info("🌐 Acesse: https://chatliver1404.com")
     
-    # Executar com eventlet para produção
-    import eventlet
-    eventlet.monkey_patch()
+    # Executar com eventlet para produção (monkey_patch no topo do módulo)
     socketio.run(app, host='0.0.0.0', port=5000, debug=False)
@@ -1,4 +1,5 @@
 from flask import Flask, render_template, request, redirect, url_for, flash, jsonify, send_from_directory
+from werkzeug.middleware.proxy_fix import ProxyFix
 from flask_socketio import SocketIO, emit, join_room, leave_room
 from flask_login import LoginManager, login_user, logout_user, login_required, current_user
 from flask_mail import Mail
@@ -15,16 +16,46 @@ from chat_routes import chat_bp, register_socket_events
 from admin_routes import admin_bp
 from messages import MessageHandler
 from invites import InviteGenerator, InviteEmailService
+from unread import init_unread, register_unread_events
+from notifications import join_user_channel
+from ad_schedule import init_ad_schedule
+from ad_metrics import init_ad_metrics
+from rollups import init_rollups
+from dashboard_live import live_dashboard, init_live_dashboard, register_dashboard_events
+from metrics import init_metrics, socket_connections
+from db_pool import pool_engine_options, socket_db_session, init_db_pool
+from sqlite_tuning import init_sqlite_tuning
+from db_routing import routing_session_options, init_db_routing
+from partitioning import init_partitioning
+from archive import init_archive
+from query_profiler import init_query_profiler
+from passwords import init_passwords
+from login_guard import init_login_guard
+from user_cache import init_user_cache
+from redis_session import init_redis_sessions
+from redis_pool import init_redis, socketio_queue_options
+from health import init_health
 
 # Configuração da aplicação
 app = Flask(__name__)
 app.config.from_object(Config)
 
+# IP real do cliente atrás do nginx (login_guard, Flask-Limiter, logs)
+if app.config.get('PROXY_FIX_X_FOR'):
+    app.wsgi_app = ProxyFix(app.wsgi_app, x_for=app.config['PROXY_FIX_X_FOR'],
+                            x_proto=app.config['PROXY_FIX_X_FOR'])
+
 # Inicialização das extensões
 from flask_sqlalchemy import SQLAlchemy
-db = SQLAlchemy(app)
+db = SQLAlchemy(app, engine_options=pool_engine_options(app), session_options=routing_session_options())
+# SQLite: WAL, pragmas e escritor único (antes da primeira conexão)
+init_sqlite_tuning(app)
 mail = Mail(app)
-socketio = SocketIO(app, cors_allowed_origins="*")
+
+# Pool Redis único do processo (se REDIS_URL estiver configurado)
+init_redis(app)
+
+socketio = SocketIO(app, cors_allowed_origins="*", **socketio_queue_options(app))
 
 # Registrar socketio no current_app para acesso pelas rotas
 app.socketio = socketio
@@ -36,10 +67,11 @@ login_manager.login_view = 'auth.login'
 login_manager.login_message = 'Por favor, faça login para acessar esta página.'
 login_manager.login_message_category = 'warning'
 
-@login_manager.user_loader
-def load_user(user_id):
-    """Carrega o usuário para o Flask-Login"""
-    return db.session.get(User, int(user_id))
+# Usuário autenticado carregado de um cache TTL (invalidado em alterações)
+init_user_cache(app, login_manager)
+
+# Sessões no Redis (opcional, SESSION_STORE=redis)
+init_redis_sessions(app, login_manager)
 
 # Registro dos blueprints
 app.register_blueprint(auth_bp, url_prefix='/auth')
@@ -75,62 +107,24 @@ def index():
         return redirect(url_for('rooms.index'))
     return redirect(url_for('auth.login'))
 
-# Configuração do Socket.IO
-def register_socket_events():
-    """Registra os eventos do Socket.IO"""
+# Configuração do Socket.IO (join, leave, message e typing ficam em chat_routes)
+def register_app_socket_events():
+    """Registra os eventos do Socket.IO da aplicação"""
     
     @socketio.on('connect')
+    @socket_db_session
     def handle_connect():
         print(f'Cliente conectado: {request.sid}')
+        join_user_channel()
+        live_dashboard.socket_connected()
+        socket_connections.inc()
         emit('status', {'msg': 'Conectado ao servidor'})
     
     @socketio.on('disconnect')
     def handle_disconnect():
         print(f'Cliente desconectado: {request.sid}')
-    
-    @socketio.on('join')
-    def handle_join(data):
-        room = data.get('room')
-        if room:
-            join_room(room)
-            print(f'Usuário {current_user.username if current_user.is_authenticated else "Anônimo"} entrou na sala: {room}')
-            emit('status', {'msg': f'Entrou na sala: {room}'}, room=room)
-    
-    @socketio.on('leave')
-    def handle_leave(data):
-        room = data.get('room')
-        if room:
-            leave_room(room)
-            print(f'Usuário {current_user.username if current_user.is_authenticated else "Anônimo"} saiu da sala: {room}')
-            emit('status', {'msg': f'Saiu da sala: {room}'}, room=room)
-    
-    @socketio.on('message')
-    def handle_message(data):
-        room = data.get('room')
-        message = data.get('message')
-        if room and message and current_user.is_authenticated:
-            # Salvar mensagem no banco
-            message_handler = MessageHandler(db)
-            saved_message = message_handler.create_message(
-                room_slug=room,
-                user_id=current_user.id,
-                content=message
-            )
-            
-            if saved_message:
-                # Formatar mensagem para envio
-                formatted_message = message_handler.format_message_for_socket(saved_message, current_user)
-                emit('message', formatted_message, room=room)
-    
-    @socketio.on('typing')
-    def handle_typing(data):
-        room = data.get('room')
-        is_typing = data.get('is_typing', False)
-        if room and current_user.is_authenticated:
-            emit('typing', {
-                'user': current_user.username,
-                'is_typing': is_typing
-            }, room=room, include_self=False)
+        live_dashboard.socket_disconnected()
+        socket_connections.dec()
     
     # Eventos específicos do chat
     @socketio.on('message_deleted')
@@ -160,7 +154,24 @@ def register_socket_events():
             }, room=room)
 
 # Registrar eventos do Socket.IO
-register_socket_events()
+register_app_socket_events()
+register_socket_events(socketio)
+init_passwords(app, socketio)
+init_login_guard(app)
+register_unread_events(socketio)
+register_dashboard_events(socketio)
+init_unread(app, socketio)
+init_ad_schedule(app, socketio)
+init_ad_metrics(app, socketio)
+init_rollups(app, socketio)
+init_live_dashboard(app, socketio)
+init_query_profiler(app)
+init_metrics(app)
+init_db_pool(app)
+init_db_routing(app, socketio)
+init_partitioning(app, socketio)
+init_archive(app, socketio)
+init_health(app, socketio)
 
 if __name__ == '__main__':
     # Criar tabelas se não existirem
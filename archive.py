@@ -0,0 +1,433 @@
+#!/usr/bin/env python3
+"""
+Arquivamento de mensagens antigas em arquivos de segmento comprimidos.
+
+Mensagens mais antigas que a retenção da sala (ARCHIVE_RETENTION_DAYS,
+com exceções por sala em ARCHIVE_ROOM_RETENTION_DAYS) saem da tabela
+`messages` e vão para segmentos em ARCHIVE_DIR:
+
+* cada segmento guarda até ARCHIVE_SEGMENT_MESSAGES mensagens de uma sala,
+  em ordem cronológica, como NDJSON comprimido (zstd se o pacote
+  `zstandard` estiver instalado, senão gzip);
+* o arquivo é dividido em blocos comprimidos independentes; a tabela
+  `archive_segments` guarda, por segmento, o intervalo de datas e o índice
+  dos blocos (offset, tamanho, primeira data), de modo que uma busca lê e
+  descomprime apenas os blocos necessários.
+
+O histórico paginado por cursor (`get_history_page(before=...)`) continua
+no arquivo quando as mensagens da tabela acabam, no mesmo formato.
+
+Os totais do dashboard não mudam (o arquivamento não passa pelos eventos
+do ORM); `rollups.py --rebuild` recalcula apenas a partir da tabela.
+
+Uso:
+    python archive.py run --database sqlite:///instance/chat.db --dir instance/archive \\
+        --retention-days 365 --room-retention sala-geral=90
+"""
+
+import argparse
+import bisect
+import gzip
+import json
+import os
+import sys
+from datetime import datetime, timedelta
+from sqlalchemy import text
+from background import start_periodic_task
+from cache import TTLCache
+from models import ArchiveSegment, Attachment, Message, Room, User
+
+try:
+    import zstandard
+    ZSTD_AVAILABLE = True
+except ImportError:
+    ZSTD_AVAILABLE = False
+
+# Chave do advisory lock do Postgres (um arquivamento por vez entre workers)
+ARCHIVE_LOCK_KEY = 1404049
+
+MESSAGE_COLUMNS = (
+    Message.id, Message.user_id, Message.content, Message.attachment_path,
+    Message.encrypted_content, Message.seq, Message.created_at, Message.updated_at
+)
+
+
+def _compress(codec, data):
+    if codec == 'zstd':
+        return zstandard.ZstdCompressor(level=10).compress(data)
+    return gzip.compress(data, compresslevel=6)
+
+
+def _decompress(codec, data):
+    if codec == 'zstd':
+        return zstandard.ZstdDecompressor().decompress(data)
+    return gzip.decompress(data)
+
+
+def _iso(value):
+    return value.isoformat() if value else None
+
+
+def _parse(value):
+    return datetime.fromisoformat(value) if value else None
+
+
+def _precedes(record, before, before_id=None):
+    """True se o registro vem antes do cursor: (created_at, id) < (before, before_id)"""
+    if before is None:
+        return True
+    created_at = _parse(record['created_at'])
+    if before_id is None:
+        return created_at < before
+    return (created_at, record['id']) < (before, before_id)
+
+
+class MessageArchive:
+    """Escrita e leitura dos segmentos arquivados"""
+
+    def __init__(self):
+        self.directory = None
+        self.retention_days = 365
+        self.room_retention = {}
+        self.segment_messages = 5000
+        self.block_messages = 250
+        self.max_messages_per_run = 50000
+        self.codec = 'zstd' if ZSTD_AVAILABLE else 'gzip'
+        self._blocks = TTLCache('archive_blocks', maxsize=256, ttl=300)
+
+    def configure(self, directory, retention_days=365, room_retention=None, segment_messages=5000,
+                  block_messages=250, max_messages_per_run=50000):
+        self.directory = directory
+        self.retention_days = retention_days
+        self.room_retention = room_retention or {}
+        self.segment_messages = segment_messages
+        self.block_messages = block_messages
+        self.max_messages_per_run = max_messages_per_run
+
+    @property
+    def enabled(self):
+        return bool(self.directory)
+
+    def _full_path(self, relative):
+        return os.path.join(self.directory, relative)
+
+    # ------------------------------------------------------------------
+    # Escrita
+    # ------------------------------------------------------------------
+
+    def retention_for(self, room):
+        """Dias de retenção da sala (None: nunca arquivar)"""
+        return self.room_retention.get(room.slug, self.retention_days)
+
+    def _write_segment(self, room_id, records):
+        """Grava o arquivo do segmento e retorna (caminho relativo, blocos, tamanho)"""
+        first = records[0]
+        relative = os.path.join(
+            str(room_id),
+            f"{_parse(first['created_at']):%Y%m%d%H%M%S}-{first['id']}.ndjson.{'zst' if self.codec == 'zstd' else 'gz'}"
+        )
+        path = self._full_path(relative)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        blocks = []
+        offset = 0
+        with open(path + '.tmp', 'wb') as f:
+            for start in range(0, len(records), self.block_messages):
+                chunk = records[start:start + self.block_messages]
+                payload = ''.join(json.dumps(record, ensure_ascii=False) + '\n' for record in chunk)
+                data = _compress(self.codec, payload.encode())
+                f.write(data)
+                blocks.append([offset, len(data), chunk[0]['created_at'], len(chunk)])
+                offset += len(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(path + '.tmp', path)
+        return relative, blocks, offset
+
+    def archive_room(self, db_session, room, cutoff, limit):
+        """Arquiva até `limit` mensagens da sala anteriores a `cutoff`"""
+        archived = 0
+        while archived < limit:
+            rows = db_session.query(*MESSAGE_COLUMNS).filter(
+                Message.room_id == room.id,
+                Message.created_at < cutoff
+            ).order_by(Message.created_at, Message.id).limit(min(self.segment_messages, limit - archived)).all()
+            if not rows:
+                break
+
+            ids = [row.id for row in rows]
+            attachments = {}
+            for attachment in db_session.query(Attachment).filter(Attachment.message_id.in_(ids)).all():
+                attachments.setdefault(attachment.message_id, []).append({
+                    'filename': attachment.filename,
+                    'file_path': attachment.file_path,
+                    'file_size': attachment.file_size,
+                    'mime_type': attachment.mime_type
+                })
+
+            records = [{
+                'id': row.id,
+                'user_id': row.user_id,
+                'content': row.content,
+                'attachment_path': row.attachment_path,
+                'encrypted_content': row.encrypted_content,
+                'seq': row.seq,
+                'created_at': _iso(row.created_at),
+                'updated_at': _iso(row.updated_at),
+                'attachments': attachments.get(row.id, [])
+            } for row in rows]
+
+            relative, blocks, size = self._write_segment(room.id, records)
+            try:
+                db_session.add(ArchiveSegment(
+                    room_id=room.id,
+                    path=relative,
+                    codec=self.codec,
+                    first_created_at=rows[0].created_at,
+                    last_created_at=rows[-1].created_at,
+                    first_seq=rows[0].seq,
+                    last_seq=rows[-1].seq,
+                    message_count=len(rows),
+                    size_bytes=size,
+                    blocks=json.dumps(blocks)
+                ))
+                db_session.query(Attachment).filter(Attachment.message_id.in_(ids)).delete(synchronize_session=False)
+                db_session.query(Message).filter(
+                    Message.room_id == room.id,
+                    Message.created_at < cutoff,
+                    Message.id.in_(ids)
+                ).delete(synchronize_session=False)
+                db_session.commit()
+            except Exception:
+                db_session.rollback()
+                os.remove(self._full_path(relative))
+                raise
+            archived += len(rows)
+        return archived
+
+    def _try_lock(self, db_session):
+        """Advisory lock do Postgres numa conexão dedicada, mantida durante toda a execução.
+
+        O lock é de sessão do banco: tomado na conexão da Session, ficaria na
+        conexão devolvida ao pool no primeiro commit. Retorna (obtido, conexão).
+        """
+        engine = db_session.get_bind()
+        if engine.dialect.name != 'postgresql':
+            return True, None
+        conn = engine.connect()
+        acquired = bool(conn.execute(text('SELECT pg_try_advisory_lock(:key)'), {'key': ARCHIVE_LOCK_KEY}).scalar())
+        # O lock de sessão sobrevive ao commit; evita a conexão ociosa em transação
+        conn.commit()
+        if not acquired:
+            conn.close()
+            return False, None
+        return True, conn
+
+    def _unlock(self, conn):
+        if conn is None:
+            return
+        try:
+            conn.execute(text('SELECT pg_advisory_unlock(:key)'), {'key': ARCHIVE_LOCK_KEY})
+            conn.commit()
+            conn.close()
+        except Exception as e:
+            print(f"Erro ao liberar o lock do arquivamento: {e}")
+            # Descarta a conexão: o lock termina junto com a sessão do Postgres
+            conn.invalidate()
+
+    def run(self, db_session, now=None):
+        """Arquiva as mensagens vencidas de todas as salas (limitado por execução)"""
+        if not self.enabled:
+            return {}
+        acquired, lock_conn = self._try_lock(db_session)
+        if not acquired:
+            return {}
+
+        now = now or datetime.utcnow()
+        result = {}
+        budget = self.max_messages_per_run
+        try:
+            for room in db_session.query(Room).order_by(Room.id).all():
+                days = self.retention_for(room)
+                if days is None or budget <= 0:
+                    continue
+                count = self.archive_room(db_session, room, now - timedelta(days=days), budget)
+                if count:
+                    result[room.slug] = count
+                    budget -= count
+        finally:
+            self._unlock(lock_conn)
+        if result:
+            print(f"Mensagens arquivadas: {result}")
+        return result
+
+    # ------------------------------------------------------------------
+    # Leitura
+    # ------------------------------------------------------------------
+
+    def _read_block(self, segment, blocks, index):
+        # O caminho inclui a sala e a primeira mensagem; o id do segmento pode ser reutilizado
+        key = (segment.path, index)
+        records = self._blocks.get(key)
+        if records is None:
+            offset, length = blocks[index][:2]
+            with open(self._full_path(segment.path), 'rb') as f:
+                f.seek(offset)
+                data = _decompress(segment.codec, f.read(length))
+            records = [json.loads(line) for line in data.decode().splitlines()]
+            self._blocks.set(key, records)
+        return records
+
+    def _read_segment_before(self, segment, before, limit, before_id=None):
+        """Mensagens do segmento anteriores ao cursor, mais recentes primeiro"""
+        blocks = json.loads(segment.blocks)
+        starts = [_parse(block[2]) for block in blocks]
+        # Último bloco que pode conter mensagens anteriores ao cursor
+        if before is None:
+            index = len(starts) - 1
+        elif before_id is None:
+            index = bisect.bisect_left(starts, before) - 1
+        else:
+            index = bisect.bisect_right(starts, before) - 1
+        found = []
+        while index >= 0 and len(found) < limit:
+            for record in reversed(self._read_block(segment, blocks, index)):
+                if _precedes(record, before, before_id):
+                    found.append(record)
+                    if len(found) >= limit:
+                        break
+            index -= 1
+        return found
+
+    def read_before(self, db_session, room_id, before, limit, before_id=None):
+        """Até `limit` mensagens arquivadas anteriores ao cursor (created_at, id), mais recentes primeiro"""
+        if not self.enabled or limit <= 0:
+            return []
+        query = db_session.query(ArchiveSegment).filter(ArchiveSegment.room_id == room_id)
+        if before is not None:
+            query = query.filter(ArchiveSegment.first_created_at <= before if before_id is not None
+                                 else ArchiveSegment.first_created_at < before)
+        found = []
+        for segment in query.order_by(ArchiveSegment.last_created_at.desc(), ArchiveSegment.id.desc()):
+            try:
+                found.extend(self._read_segment_before(segment, before, limit - len(found), before_id))
+            except OSError as e:
+                print(f"Erro ao ler segmento arquivado {segment.path}: {e}")
+            if len(found) >= limit:
+                break
+        return found
+
+    def iter_room(self, db_session, room_id):
+        """Blocos arquivados da sala em ordem cronológica, um por vez (sem cache)"""
+        if not self.enabled:
+            return
+        segments = db_session.query(ArchiveSegment.path, ArchiveSegment.codec, ArchiveSegment.blocks).filter(
+            ArchiveSegment.room_id == room_id
+        ).order_by(ArchiveSegment.first_created_at).all()
+        for path, codec, blocks in segments:
+            with open(self._full_path(path), 'rb') as f:
+                for offset, length in (block[:2] for block in json.loads(blocks)):
+                    f.seek(offset)
+                    data = _decompress(codec, f.read(length))
+                    yield [json.loads(line) for line in data.decode().splitlines()]
+
+    def format_records(self, db_session, records):
+        """Mensagens arquivadas no formato de format_message_for_socket"""
+        user_ids = {record['user_id'] for record in records}
+        users = {user.id: user for user in db_session.query(User.id, User.username, User.email).filter(
+            User.id.in_(user_ids)
+        ).all()} if user_ids else {}
+
+        formatted = []
+        for record in records:
+            user = users.get(record['user_id'])
+            attachment_data = None
+            if record['attachment_path']:
+                attachment_data = {
+                    'filename': os.path.basename(record['attachment_path']),
+                    'file_path': record['attachment_path']
+                }
+            formatted.append({
+                'id': record['id'],
+                'content': record['content'],
+                'user': {
+                    'id': record['user_id'],
+                    'username': user.username if user else None,
+                    'email': user.email if user else None
+                },
+                'created_at': record['created_at'],
+                'seq': record['seq'],
+                'attachment': attachment_data,
+                'archived': True
+            })
+        return formatted
+
+    # ------------------------------------------------------------------
+    # Exclusão de sala
+    # ------------------------------------------------------------------
+
+    def forget_room(self, db_session, room_id):
+        """Remove os segmentos da sala (na transação atual); retorna os arquivos a apagar"""
+        segments = db_session.query(ArchiveSegment).filter(ArchiveSegment.room_id == room_id).all()
+        paths = [segment.path for segment in segments]
+        db_session.query(ArchiveSegment).filter(ArchiveSegment.room_id == room_id).delete(synchronize_session=False)
+        return paths
+
+    def remove_files(self, paths):
+        """Apaga os arquivos após o commit"""
+        for path in paths:
+            try:
+                os.remove(self._full_path(path))
+            except OSError:
+                pass
+
+
+message_archive = MessageArchive()
+
+
+def init_archive(app, socketio):
+    """Configura o arquivo e, se habilitado, o job periódico"""
+    message_archive.configure(
+        app.config.get('ARCHIVE_DIR'),
+        retention_days=app.config.get('ARCHIVE_RETENTION_DAYS', 365),
+        room_retention=app.config.get('ARCHIVE_ROOM_RETENTION_DAYS'),
+        segment_messages=app.config.get('ARCHIVE_SEGMENT_MESSAGES', 5000),
+        block_messages=app.config.get('ARCHIVE_BLOCK_MESSAGES', 250),
+        max_messages_per_run=app.config.get('ARCHIVE_MAX_MESSAGES_PER_RUN', 50000)
+    )
+    if message_archive.enabled and app.config.get('ARCHIVE_ENABLED'):
+        start_periodic_task(
+            app, socketio, app.config.get('ARCHIVE_INTERVAL_SECONDS', 6 * 3600),
+            message_archive.run, 'arquivar mensagens antigas'
+        )
+
+
+def main(argv=None):
+    from sqlalchemy import create_engine
+    from sqlalchemy.orm import Session
+
+    parser = argparse.ArgumentParser(description='Arquivamento de mensagens antigas')
+    parser.add_argument('command', choices=('run',))
+    parser.add_argument('--database', required=True, help='URL SQLAlchemy')
+    parser.add_argument('--dir', required=True, help='diretório dos segmentos (ARCHIVE_DIR)')
+    parser.add_argument('--retention-days', type=int, default=365)
+    parser.add_argument('--room-retention', action='append', default=[], metavar='SLUG=DIAS',
+                        help='retenção de uma sala (DIAS vazio: nunca arquivar)')
+    parser.add_argument('--max-messages', type=int, default=1000000)
+    args = parser.parse_args(argv)
+
+    room_retention = {}
+    for item in args.room_retention:
+        slug, _, days = item.partition('=')
+        room_retention[slug] = int(days) if days else None
+
+    message_archive.configure(args.dir, args.retention_days, room_retention,
+                              max_messages_per_run=args.max_messages)
+    with Session(create_engine(args.database)) as db_session:
+        result = message_archive.run(db_session)
+    print(f"Total arquivado: {sum(result.values())} mensagens em {len(result)} salas")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
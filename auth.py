@@ -1,4 +1,4 @@
-from passlib.hash import argon2
+from passwords import password_hasher, PasswordHasherBusy
 from flask_login import login_user, logout_user, login_required, current_user
 from flask import flash, redirect, url_for, request
 from urllib.parse import urlparse
@@ -11,11 +11,11 @@ from datetime import datetime
 
 def hash_password(password):
     """Gera hash da senha usando Argon2"""
-    return argon2.hash(password)
+    return password_hasher.hash(password)
 
 def verify_password(password, password_hash):
     """Verifica se a senha está correta"""
-    return argon2.verify(password, password_hash)
+    return password_hasher.verify(password, password_hash)
 
 def is_valid_email(email):
     """Valida formato de email"""
@@ -85,12 +85,23 @@ def handle_login(db_session, form):
     try:
         user = db_session.query(User).filter_by(email=form.email.data).first()
         
-        if user and argon2.verify(form.password.data, user.password_hash):
+        if user:
+            valid, new_hash = password_hasher.verify_and_update(form.password.data, user.password_hash)
+        else:
+            valid, new_hash = False, None
+        
+        if valid:
+            # Parâmetros do Argon2 mudaram: atualizar o hash armazenado
+            if new_hash:
+                user.password_hash = new_hash
+                db_session.commit()
             login_user(user, remember=form.remember_me.data)
             return {'success': True, 'user': user}
         else:
             return {'success': False, 'message': 'Email ou senha inválidos'}
             
+    except PasswordHasherBusy:
+        return {'success': False, 'busy': True, 'message': 'Muitos logins em andamento. Tente novamente em instantes.'}
     except Exception as e:
         return {'success': False, 'message': f'Erro interno: {str(e)}'}
 
@@ -108,7 +119,7 @@ def handle_registration(db_session, form):
             return {'success': False, 'message': 'Este nome de usuário já está em uso'}
         
         # Criar hash da senha
-        password_hash = argon2.hash(form.password.data)
+        password_hash = hash_password(form.password.data)
         
         # Criar usuário
         user = User(
@@ -125,6 +136,9 @@ def handle_registration(db_session, form):
         
         return {'success': True, 'user': user}
         
+    except PasswordHasherBusy:
+        db_session.rollback()
+        return {'success': False, 'message': 'Muitos cadastros em andamento. Tente novamente em instantes.'}
     except Exception as e:
         db_session.rollback()
         return {'success': False, 'message': f'Erro interno: {str(e)}'}
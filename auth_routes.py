@@ -2,9 +2,16 @@ from flask import Blueprint, render_template, request, flash, redirect, url_for
 from flask_login import login_required, current_user
 from forms import LoginForm, RegistrationForm, ChangePasswordForm
 from auth import handle_login, handle_registration, change_password_handler
+from login_guard import login_guard
 
 auth_bp = Blueprint('auth', __name__, url_prefix='/auth')
 
+LOGIN_REJECTED_MESSAGES = {
+    'account': 'Muitas tentativas incorretas para esta conta. Tente novamente mais tarde.',
+    'ip': 'Muitas tentativas de login a partir deste endereço. Aguarde alguns minutos.',
+    'busy': 'Servidor ocupado. Tente novamente em instantes.'
+}
+
 @auth_bp.route('/login', methods=['GET', 'POST'])
 def login():
     if current_user.is_authenticated:
@@ -13,12 +20,24 @@ def login():
     form = LoginForm()
     if request.method == 'POST':
         if form.validate_on_submit():
+            # Admissão antes do Argon2: respostas baratas para tentativas acima do limite
+            # (remote_addr é o IP do cliente: ProxyFix aplica o X-Forwarded-For do nginx)
+            decision = login_guard.admit(request.remote_addr, form.email.data)
+            if not decision:
+                flash(LOGIN_REJECTED_MESSAGES[decision.reason], 'error')
+                return render_template('auth/login.html', title='Login', form=form), 429, {
+                    'Retry-After': str(decision.retry_after)
+                }
+            
             from flask import current_app
             result = handle_login(current_app.extensions['sqlalchemy'].session, form)
             if result['success']:
+                login_guard.record_success(form.email.data)
                 flash('Login realizado com sucesso!', 'success')
                 return redirect(url_for('rooms.index'))
             else:
+                if not result.get('busy'):
+                    login_guard.record_failure(request.remote_addr, form.email.data)
                 flash(result['message'], 'error')
         else:
             flash('Por favor, corrija os erros no formulário.', 'error')
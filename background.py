@@ -0,0 +1,26 @@
+#!/usr/bin/env python3
+"""
+Tarefas periódicas em segundo plano.
+"""
+
+
+def start_periodic_task(app, socketio, interval, func, description):
+    """Executa `func(db_session)` a cada `interval` segundos em contexto da aplicação.
+
+    A sessão é liberada ao fim de cada execução; erros são registrados e a
+    tarefa continua na próxima rodada.
+    """
+
+    def loop():
+        while True:
+            socketio.sleep(interval)
+            with app.app_context():
+                db = app.extensions['sqlalchemy']
+                try:
+                    func(db.session)
+                except Exception as e:
+                    print(f"Erro ao {description}: {e}")
+                finally:
+                    db.session.remove()
+
+    return socketio.start_background_task(loop)
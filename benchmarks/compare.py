@@ -0,0 +1,53 @@
+#!/usr/bin/env python3
+"""
+Compara dois resultados JSON do pytest-benchmark e aponta regressões.
+
+Uso:
+    python -m pytest benchmarks --benchmark-json=base.json      # antes
+    python -m pytest benchmarks --benchmark-json=atual.json     # depois
+    python benchmarks/compare.py base.json atual.json --threshold 0.10
+
+Retorna código 1 se algum benchmark ficar mais lento que o limite.
+"""
+
+import argparse
+import json
+import sys
+
+
+def load(path, stat):
+    with open(path) as f:
+        data = json.load(f)
+    return {bench['fullname']: bench['stats'][stat] for bench in data['benchmarks']}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Compara resultados de benchmarks')
+    parser.add_argument('baseline')
+    parser.add_argument('current')
+    parser.add_argument('--threshold', type=float, default=0.10, help='piora relativa tolerada (0.10 = 10%%)')
+    parser.add_argument('--stat', default='median', choices=('min', 'median', 'mean', 'max'))
+    args = parser.parse_args(argv)
+
+    baseline = load(args.baseline, args.stat)
+    current = load(args.current, args.stat)
+
+    regressions = 0
+    for name in sorted(set(baseline) | set(current)):
+        before, after = baseline.get(name), current.get(name)
+        if before is None or after is None:
+            print(f"   {name}: {'novo' if before is None else 'removido'}")
+            continue
+        change = (after - before) / before
+        slower = change > args.threshold
+        regressions += slower
+        print(f"{'❌' if slower else '✅'} {name}: {before * 1e6:.1f}µs -> {after * 1e6:.1f}µs ({change:+.1%})")
+
+    if regressions:
+        print(f"\n{regressions} regressão(ões) acima de {args.threshold:.0%}")
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
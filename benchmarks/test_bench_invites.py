@@ -0,0 +1,30 @@
+"""
+Benchmarks de validação e uso de convites.
+"""
+
+import itertools
+from invites import InviteGenerator
+from models import User
+
+_new_users = itertools.count()
+
+
+def test_validate_invite(benchmark, db_session, invite_code):
+    generator = InviteGenerator(db_session)
+    invite, error = benchmark(generator.validate_invite, invite_code)
+    assert invite is not None and error is None
+
+
+def test_redeem_invite(benchmark, db_session, invite_code):
+    generator = InviteGenerator(db_session)
+
+    def new_user():
+        # Cada rodada precisa de um usuário que ainda não é membro
+        index = next(_new_users)
+        user = User(username=f'invitee_{index}', email=f'invitee_{index}@example.com', password_hash='x')
+        db_session.add(user)
+        db_session.commit()
+        return (invite_code, user.id), {}
+
+    result = benchmark.pedantic(generator.use_invite, setup=new_user, rounds=50)
+    assert result['success']
@@ -0,0 +1,52 @@
+"""
+Benchmarks de criação, formatação, criptografia e leitura de mensagens.
+"""
+
+from cryptography.fernet import Fernet
+from messages import MessageHandler, MessageEncryption, format_message_for_socket, get_history_page
+from models import Message
+
+TEXT = 'Olá! Esta é uma mensagem típica de chat com alguns acentos: ação, coração, não. ' * 2
+ROOM_KEY = Fernet.generate_key()
+
+
+def test_create_message(benchmark, db_session, main_room, author):
+    handler = MessageHandler(db_session)
+    message = benchmark(handler.create_message, main_room.id, author.id, TEXT)
+    assert message.seq is not None
+
+
+def test_format_message(benchmark, db_session, main_room, author):
+    message = db_session.query(Message).filter_by(room_id=main_room.id).first()
+    result = benchmark(format_message_for_socket, message, author)
+    assert result['id'] == message.id
+
+
+def test_encrypt_message(benchmark):
+    encryption = MessageEncryption(ROOM_KEY)
+    assert benchmark(encryption.encrypt_message, TEXT)
+
+
+def test_decrypt_message(benchmark):
+    encryption = MessageEncryption(ROOM_KEY)
+    encrypted = encryption.encrypt_message(TEXT)
+    assert benchmark(encryption.decrypt_message, encrypted) == TEXT
+
+
+def test_history_first_page(benchmark, db_session, main_room):
+    messages, has_more = benchmark(get_history_page, db_session, main_room.id, 1, 50)
+    assert len(messages) == 50 and has_more
+
+
+def test_history_deep_page(benchmark, db_session, main_room):
+    messages, _ = benchmark(get_history_page, db_session, main_room.id, 80, 50)
+    assert len(messages) == 50
+
+
+def test_history_deep_page_cursor(benchmark, db_session, main_room):
+    # Mesma profundidade do teste anterior, pelo cursor `before` em vez do deslocamento
+    created_at, message_id = db_session.query(Message.created_at, Message.id).filter_by(room_id=main_room.id)\
+        .order_by(Message.created_at.desc(), Message.id.desc()).offset(79 * 50).limit(1).one()
+    messages, _ = benchmark(get_history_page, db_session, main_room.id, before=created_at,
+                            since=main_room.created_at, before_id=message_id)
+    assert len(messages) == 50
@@ -0,0 +1,29 @@
+"""
+Benchmarks da listagem de salas públicas.
+"""
+
+from room_directory import get_directory_page, invalidate_directory
+
+
+def test_directory_page_cold(benchmark, db_session):
+    def run():
+        invalidate_directory()
+        return get_directory_page(db_session, user_id=1)
+
+    directory = benchmark(run)
+    assert directory['rooms']
+
+
+def test_directory_page_cached(benchmark, db_session):
+    get_directory_page(db_session, user_id=1)
+    directory = benchmark(get_directory_page, db_session, 1)
+    assert directory['rooms']
+
+
+def test_directory_search(benchmark, db_session):
+    def run():
+        invalidate_directory()
+        return get_directory_page(db_session, user_id=1, search='sala 01', sort='name')
+
+    directory = benchmark(run)
+    assert directory['total'] > 0
@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+"""
+Cache em memória com expiração (TTL) e tamanho máximo.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from metrics import cache_requests
+
+
+class TTLCache:
+    """Cache LRU limitado com expiração por tempo.
+
+    Cada processo (worker) mantém a sua própria cópia; o TTL limita por
+    quanto tempo um worker pode servir dados desatualizados quando a
+    invalidação acontece em outro processo.
+    """
+
+    def __init__(self, name, maxsize=1024, ttl=60):
+        self.name = name
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        """Retorna o valor em cache ou `default` se ausente/expirado"""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None and entry[0] > now:
+                self._data.move_to_end(key)
+                self.hits += 1
+                cache_requests.labels(self.name, 'hit').inc()
+                return entry[1]
+            if entry is not None:
+                del self._data[key]
+            self.misses += 1
+            cache_requests.labels(self.name, 'miss').inc()
+            return default
+
+    def set(self, key, value, ttl=None):
+        """Armazena um valor, descartando o menos usado se cheio"""
+        expires_at = time.monotonic() + (ttl if ttl is not None else self.ttl)
+        with self._lock:
+            self._data[key] = (expires_at, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def get_or_set(self, key, factory, ttl=None):
+        """Retorna o valor em cache ou calcula com `factory()` e armazena"""
+        sentinel = object()
+        value = self.get(key, sentinel)
+        if value is sentinel:
+            value = factory()
+            self.set(key, value, ttl)
+        return value
+
+    def delete(self, key):
+        """Remove uma chave do cache"""
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        """Remove todas as entradas"""
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
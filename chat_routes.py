@@ -8,9 +8,20 @@ from flask_login import login_required, current_user
 from flask_socketio import emit, join_room, leave_room
 from models import User, Room, RoomMember, RoomInvite, Message, Attachment, AccessRequest, Advertisement, AdminMessage
 from forms import MessageForm, InviteForm, AccessRequestForm, AdvertisementForm
-from messages import MessageHandler, MessageEncryption, format_message_for_socket
+from messages import MessageHandler, MessageEncryption, format_message_for_socket, get_history_page
 from invites import InviteGenerator, InviteEmailService
+from unread import read_pointers, push_new_message
+from dashboard_live import live_dashboard
+from notifications import notify_user
+from ad_schedule import ad_schedule
+from ad_metrics import ad_counters, hourly_stats, totals_by_ad
+from metrics import message_send_seconds, record_upload
+from db_pool import socket_db_session
+from db_routing import read_replica
+from room_export import EXPORT_FORMATS, export_response
+from sqlalchemy import exc
 import os
+import time
 from werkzeug.utils import secure_filename
 from datetime import datetime, timezone
 
@@ -26,6 +37,7 @@ def allowed_file(filename):
 
 @chat_bp.route('/<slug>')
 @login_required
+@read_replica
 def room(slug):
     """Página principal do chat"""
     db = current_app.extensions['sqlalchemy']
@@ -45,26 +57,21 @@ def room(slug):
     messages = db.session.query(Message).filter_by(room_id=room.id)\
         .order_by(Message.created_at.desc()).limit(50).all()
     
+    # Abrir a sala marca todas as mensagens como lidas
+    read_pointers.mark_read(current_user.id, room.id, room.message_seq)
+    
     # Buscar convites ativos (apenas para criadores/admins)
     invites = []
     if member.role in ['creator', 'admin']:
         invites = db.session.query(RoomInvite).filter_by(room_id=room.id, is_active=True).all()
     
-    # Buscar anúncios ativos da sala
-    now = datetime.utcnow()
-    active_advertisements = db.session.query(Advertisement).filter(
-        Advertisement.room_id == room.id,
-        Advertisement.is_active == True,
-        Advertisement.start_date <= now,
-        Advertisement.end_date >= now
-    ).order_by(Advertisement.priority.desc(), Advertisement.created_at.desc()).all()
+    # Anúncios e mensagens do administrador ativos vêm da agenda em memória
+    ad_schedule.ensure_loaded(db.session)
+    active_advertisements = ad_schedule.active_advertisements(room.id)
+    active_admin_messages = ad_schedule.active_admin_messages()
     
-    # Buscar mensagens do administrador ativas (globais)
-    active_admin_messages = db.session.query(AdminMessage).filter(
-        AdminMessage.is_active == True,
-        AdminMessage.start_date <= now,
-        AdminMessage.end_date >= now
-    ).order_by(AdminMessage.priority.desc(), AdminMessage.created_at.desc()).all()
+    # Impressões são acumuladas em memória e gravadas em lote
+    ad_counters.record_impressions([ad.id for ad in active_advertisements])
     
     return render_template('chat/room.html', 
                          room=room, 
@@ -75,6 +82,7 @@ def room(slug):
 
 @chat_bp.route('/<slug>/messages')
 @login_required
+@read_replica
 def get_messages(slug):
     """API para buscar mensagens da sala"""
     db = current_app.extensions['sqlalchemy']
@@ -89,30 +97,55 @@ def get_messages(slug):
     if not member:
         return jsonify({'error': 'Acesso negado'}), 403
     
-    # Buscar mensagens
+    # Buscar mensagens (cursor `before`/`before_id` = created_at ISO e id da mensagem mais antiga exibida)
     page = request.args.get('page', 1, type=int)
     per_page = 50
+    before = None
+    before_id = request.args.get('before_id', type=int)
+    if request.args.get('before'):
+        try:
+            before = datetime.fromisoformat(request.args['before'])
+        except ValueError:
+            return jsonify({'error': 'Cursor inválido'}), 400
     
-    messages = db.session.query(Message).filter_by(room_id=room.id)\
-        .order_by(Message.created_at.desc())\
-        .offset((page - 1) * per_page).limit(per_page).all()
-    
-    # Formatar mensagens
-    message_handler = MessageHandler(db.session)
-    formatted_messages = []
-    
-    for msg in messages:
-        # Buscar usuário da mensagem
-        user = db.session.query(User).get(msg.user_id)
-        if user:
-            formatted_msg = format_message_for_socket(msg, user)
-            formatted_messages.append(formatted_msg)
+    formatted_messages, has_more = get_history_page(
+        db.session, room.id, page, per_page, before=before, since=room.created_at, before_id=before_id
+    )
     
+    oldest = formatted_messages[-1] if formatted_messages else None
     return jsonify({
         'messages': formatted_messages,
-        'has_more': len(messages) == per_page
+        'has_more': has_more,
+        'next_before': oldest['created_at'] if oldest else None,
+        'next_before_id': oldest['id'] if oldest else None
     })
 
+@chat_bp.route('/<slug>/export')
+@login_required
+def export_room(slug):
+    """Exportar o histórico da sala (?format=ndjson|csv, ?gzip=1) em fluxo"""
+    db = current_app.extensions['sqlalchemy']
+    room = db.session.query(Room).filter_by(slug=slug).first_or_404()
+    
+    # Apenas criadores e administradores da sala (ou administradores do site)
+    member = db.session.query(RoomMember).filter_by(
+        room_id=room.id, 
+        user_id=current_user.id
+    ).first()
+    
+    if not current_user.is_admin and (not member or member.role not in ['creator', 'admin']):
+        return jsonify({'error': 'Acesso negado'}), 403
+    
+    fmt = request.args.get('format', 'ndjson')
+    if fmt not in EXPORT_FORMATS:
+        return jsonify({'error': 'Formato inválido (use ndjson ou csv)'}), 400
+    compress = request.args.get('gzip', '').lower() in ('1', 'true')
+    
+    return export_response(
+        db.session, room, fmt, compress,
+        batch_size=current_app.config.get('EXPORT_BATCH_SIZE', 1000)
+    )
+
 @chat_bp.route('/<slug>/send', methods=['POST'])
 @login_required
 def send_message(slug):
@@ -158,6 +191,9 @@ def send_message(slug):
             attachment_path = f"uploads/{filename}"
             file_path = os.path.join(upload_dir, filename)
             attachment.save(file_path)
+            record_upload('attachment', file_path)
+        
+        send_started = time.perf_counter()
         
         # Criar mensagem
         message_handler = MessageHandler(db.session)
@@ -175,6 +211,11 @@ def send_message(slug):
         from flask_socketio import emit
         emit('message', formatted_message, room=slug, namespace='/')
         
+        # Atualizar indicadores de não lidas dos demais membros
+        push_new_message(db.session, room, message)
+        live_dashboard.record_message(room.slug)
+        message_send_seconds.labels('http').observe(time.perf_counter() - send_started)
+        
         # Retornar mensagem formatada para o cliente
         return jsonify({'success': True, 'message': formatted_message})
         
@@ -285,6 +326,7 @@ def delete_invite(slug, invite_id):
 
 @chat_bp.route('/<slug>/access-requests')
 @login_required
+@read_replica
 def manage_access_requests(slug):
     """Gerenciar solicitações de acesso da sala"""
     db = current_app.extensions['sqlalchemy']
@@ -361,6 +403,11 @@ def approve_access_request(slug, request_id):
         except Exception as e:
             print(f"Erro ao enviar email de aprovação: {e}")
         
+        try:
+            notify_user(access_request.user_id, 'access_approved', room=room.slug, room_name=room.name)
+        except Exception as e:
+            print(f"Erro ao notificar aprovação: {e}")
+        
         return jsonify({'success': True, 'message': 'Acesso aprovado com sucesso!'})
         
     except Exception as e:
@@ -404,6 +451,11 @@ def reject_access_request(slug, request_id):
         except Exception as e:
             print(f"Erro ao enviar email de rejeição: {e}")
         
+        try:
+            notify_user(access_request.user_id, 'access_rejected', room=room.slug, room_name=room.name)
+        except Exception as e:
+            print(f"Erro ao notificar rejeição: {e}")
+        
         return jsonify({'success': True, 'message': 'Solicitação rejeitada com sucesso!'})
         
     except Exception as e:
@@ -590,10 +642,14 @@ def manage_advertisements(slug):
         
         form = AdvertisementForm()
         
+        # Totais de impressões/cliques a partir dos agregados horários
+        ad_stats = totals_by_ad(db.session, [ad.id for ad in advertisements])
+        
         return render_template('chat/advertisements.html', 
                              room=room, 
                              member=member, 
                              advertisements=advertisements,
+                             ad_stats=ad_stats,
                              form=form)
         
     except Exception as e:
@@ -679,6 +735,7 @@ def create_advertisement(slug):
                     
                     # Salvar arquivo
                     file.save(os.path.join(current_app.static_folder, file_path))
+                    record_upload('advertisement', os.path.join(current_app.static_folder, file_path))
                     image_path = file_path
             
             # Criar anúncio
@@ -697,6 +754,7 @@ def create_advertisement(slug):
             
             db.session.add(advertisement)
             db.session.commit()
+            ad_schedule.upsert_advertisement(advertisement, room.slug)
             
             flash('Anúncio criado com sucesso!', 'success')
             return redirect(url_for('chat.manage_advertisements', slug=slug))
@@ -806,6 +864,7 @@ def edit_advertisement(slug, advertisement_id):
                     
                     # Salvar arquivo
                     file.save(os.path.join(current_app.static_folder, file_path))
+                    record_upload('advertisement', os.path.join(current_app.static_folder, file_path))
                     advertisement.image_path = file_path
             
             # Atualizar anúncio
@@ -818,6 +877,7 @@ def edit_advertisement(slug, advertisement_id):
             advertisement.is_active = form.is_active.data
             
             db.session.commit()
+            ad_schedule.upsert_advertisement(advertisement, room.slug)
             
             flash('Anúncio atualizado com sucesso!', 'success')
             return redirect(url_for('chat.manage_advertisements', slug=slug))
@@ -875,6 +935,7 @@ def delete_advertisement(slug, advertisement_id):
         # Deletar anúncio
         db.session.delete(advertisement)
         db.session.commit()
+        ad_schedule.remove_advertisement(advertisement_id)
         
         return jsonify({'success': True, 'message': 'Anúncio deletado com sucesso'})
         
@@ -918,6 +979,7 @@ def toggle_advertisement(slug, advertisement_id):
         # Alternar status
         advertisement.is_active = not advertisement.is_active
         db.session.commit()
+        ad_schedule.upsert_advertisement(advertisement, room.slug)
         
         status = 'ativado' if advertisement.is_active else 'desativado'
         return jsonify({
@@ -990,6 +1052,77 @@ def get_advertisement(slug, advertisement_id):
         return jsonify({'success': False, 'error': 'Erro interno do servidor'}), 500
 
 
+@chat_bp.route('/<slug>/advertisements/<int:advertisement_id>/click')
+@login_required
+def advertisement_click(slug, advertisement_id):
+    """Registra o clique e redireciona para o link do anúncio"""
+    link = None
+    item = ad_schedule.get_advertisement(advertisement_id)
+    if item and item.room_slug == slug:
+        link = item.link
+    else:
+        db = current_app.extensions['sqlalchemy']
+        advertisement = db.session.query(Advertisement).join(Room).filter(
+            Advertisement.id == advertisement_id,
+            Room.slug == slug
+        ).first()
+        if not advertisement:
+            flash('Anúncio não encontrado', 'error')
+            return redirect(url_for('chat.room', slug=slug))
+        link = advertisement.link
+    
+    ad_counters.record_click(advertisement_id)
+    
+    if not link:
+        return redirect(url_for('chat.room', slug=slug))
+    return redirect(link)
+
+
+@chat_bp.route('/<slug>/advertisements/<int:advertisement_id>/stats')
+@login_required
+def advertisement_stats(slug, advertisement_id):
+    """API com a série horária de impressões e cliques (gráficos de desempenho)"""
+    try:
+        db = current_app.extensions['sqlalchemy']
+        
+        # Buscar sala
+        room = db.session.query(Room).filter_by(slug=slug).first()
+        if not room:
+            return jsonify({'success': False, 'error': 'Sala não encontrada'}), 404
+        
+        # Verificar se é admin ou creator
+        member = db.session.query(RoomMember).filter_by(
+            room_id=room.id,
+            user_id=current_user.id
+        ).first()
+        if not member or member.role not in ['creator', 'admin']:
+            return jsonify({'success': False, 'error': 'Acesso negado'}), 403
+        
+        advertisement = db.session.query(Advertisement).filter_by(
+            id=advertisement_id,
+            room_id=room.id
+        ).first()
+        if not advertisement:
+            return jsonify({'success': False, 'error': 'Anúncio não encontrado'}), 404
+        
+        hours = min(max(request.args.get('hours', 168, type=int), 1), 24 * 90)
+        series = hourly_stats(db.session, advertisement.id, hours)
+        
+        return jsonify({
+            'success': True,
+            'advertisement_id': advertisement.id,
+            'hours': hours,
+            'series': series,
+            'totals': totals_by_ad(db.session, [advertisement.id]).get(
+                advertisement.id, {'impressions': 0, 'clicks': 0, 'ctr': 0.0}
+            )
+        })
+        
+    except Exception as e:
+        print(f"Erro ao buscar estatísticas do anúncio: {e}")
+        return jsonify({'success': False, 'error': 'Erro interno do servidor'}), 500
+
+
 # ============================================================================
 # EVENTOS SOCKET.IO
 # ============================================================================
@@ -998,28 +1131,34 @@ def register_socket_events(socketio):
     """Registra eventos do Socket.IO"""
     
     @socketio.on('join')
+    @socket_db_session
     def on_join(data):
         """Usuário entra na sala"""
         room_slug = data.get('room')
         if room_slug:
             join_room(room_slug)
-            emit('status', {'msg': f'{current_user.username} entrou na sala.'}, room=room_slug)
+            username = current_user.username if current_user.is_authenticated else 'Anônimo'
+            emit('status', {'msg': f'{username} entrou na sala.'}, room=room_slug)
     
     @socketio.on('leave')
+    @socket_db_session
     def on_leave(data):
         """Usuário sai da sala"""
         room_slug = data.get('room')
         if room_slug:
             leave_room(room_slug)
-            emit('status', {'msg': f'{current_user.username} saiu da sala.'}, room=room_slug)
+            username = current_user.username if current_user.is_authenticated else 'Anônimo'
+            emit('status', {'msg': f'{username} saiu da sala.'}, room=room_slug)
     
     @socketio.on('message')
+    @socket_db_session
     def on_message(data):
         """Nova mensagem"""
         room_slug = data.get('room')
-        content = data.get('content', '').strip()
+        # `message` é o campo usado pelos antigos handlers de app_simple/app_production
+        content = (data.get('content') or data.get('message') or '').strip()
         
-        if not room_slug or not content:
+        if not room_slug or not content or not current_user.is_authenticated:
             return
         
         # Verificar se o usuário é membro da sala
@@ -1038,6 +1177,8 @@ def register_socket_events(socketio):
             return
         
         try:
+            send_started = time.perf_counter()
+            
             # Criar mensagem
             message_handler = MessageHandler(db.session)
             message = message_handler.create_message(
@@ -1051,17 +1192,24 @@ def register_socket_events(socketio):
             
             # Emitir para todos na sala
             emit('message', formatted_message, room=room_slug)
+            push_new_message(db.session, room, message, socketio)
+            live_dashboard.record_message(room_slug)
+            message_send_seconds.labels('socket').observe(time.perf_counter() - send_started)
             
+        except exc.TimeoutError:
+            # Banco ocupado: socket_db_session responde com `db_busy`
+            raise
         except Exception as e:
             print(f"Erro ao processar mensagem: {e}")
     
     @socketio.on('typing')
+    @socket_db_session
     def on_typing(data):
         """Usuário está digitando"""
         room_slug = data.get('room')
         is_typing = data.get('is_typing', False)
         
-        if room_slug:
+        if room_slug and current_user.is_authenticated:
             emit('typing', {
                 'user': current_user.username,
                 'is_typing': is_typing
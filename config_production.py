@@ -14,9 +14,14 @@ class ProductionConfig:
     SQLALCHEMY_TRACK_MODIFICATIONS = False
     SQLALCHEMY_ENGINE_OPTIONS = {
         'pool_size': 10,
+        # Picos: conexões extras além de pool_size; depois disso, espera limitada (s)
+        'max_overflow': int(os.environ.get('DB_MAX_OVERFLOW') or 10),
+        'pool_timeout': float(os.environ.get('DB_POOL_TIMEOUT') or 3),
         'pool_recycle': 3600,
         'pool_pre_ping': True
     }
+    # psycopg2 cooperativo no eventlet (wait callback): consultas não travam o hub
+    DB_GREEN_PSYCOPG2 = os.environ.get('DB_GREEN_PSYCOPG2', 'true').lower() in ['true', 'on', '1']
     
     # Redis para cache e sessões
     REDIS_URL = os.environ.get('REDIS_URL', 'redis://:chatliver1404_redis_password@redis:6379/0')
@@ -47,6 +52,7 @@ class ProductionConfig:
     SOCKETIO_ASYNC_MODE = 'eventlet'
     SOCKETIO_PING_TIMEOUT = 60
     SOCKETIO_PING_INTERVAL = 25
+    SOCKETIO_MESSAGE_QUEUE = os.environ.get('SOCKETIO_MESSAGE_QUEUE', REDIS_URL)
     
     # Configurações de logging
     LOG_LEVEL = 'INFO'
@@ -61,6 +67,98 @@ class ProductionConfig:
     CACHE_REDIS_URL = REDIS_URL
     CACHE_DEFAULT_TIMEOUT = 300
     
+    # Diretório de salas públicas
+    ROOM_DIRECTORY_PER_PAGE = 20
+    
+    # Ponteiros de leitura (mensagens não lidas)
+    READ_POINTER_FLUSH_SECONDS = 2
+    
+    # Agenda de anúncios: ressincronização completa (cobre alterações de outros processos)
+    AD_SCHEDULE_RESYNC_SECONDS = 600
+    
+    # Impressões e cliques de anúncios: intervalo de gravação em lote
+    AD_STATS_FLUSH_SECONDS = 5
+    
+    # Agregados do dashboard: intervalo de gravação em lote
+    ROLLUP_FLUSH_SECONDS = 5
+    
+    # Dashboard ao vivo: intervalo entre amostras enviadas aos administradores
+    DASHBOARD_SAMPLE_SECONDS = 2
+    
+    # Instrumentação SQL: consultas lentas (com EXPLAIN) e detector de N+1
+    SLOW_QUERY_SECONDS = float(os.environ.get('SLOW_QUERY_SECONDS') or 0.5)
+    SLOW_QUERY_EXPLAIN = True
+    # None: detector ativo apenas em modo debug
+    QUERY_DETECT_N_PLUS_ONE = os.environ.get('QUERY_DETECT_N_PLUS_ONE', '').lower() in ['true', 'on', '1'] or None
+    QUERY_REPEAT_THRESHOLD = 5
+    
+    # Argon2: parâmetros (None = padrão do passlib; hashes antigos são refeitos no login)
+    ARGON2_TIME_COST = int(os.environ.get('ARGON2_TIME_COST') or 0) or None
+    ARGON2_MEMORY_COST = int(os.environ.get('ARGON2_MEMORY_COST') or 0) or None  # KiB
+    ARGON2_PARALLELISM = int(os.environ.get('ARGON2_PARALLELISM') or 0) or None
+    # Verificações simultâneas por worker e espera máxima por uma vaga (segundos)
+    ARGON2_MAX_CONCURRENT = int(os.environ.get('ARGON2_MAX_CONCURRENT') or 4)
+    ARGON2_WAIT_SECONDS = 5
+    
+    # Proxies reversos confiáveis à frente da aplicação (nginx): quantos saltos do
+    # X-Forwarded-For/-Proto aplicar a remote_addr e ao esquema (0: acesso direto)
+    PROXY_FIX_X_FOR = int(os.environ.get('PROXY_FIX_X_FOR') or 1)
+    
+    # Admissão do login (antes do Argon2): janelas de falhas por IP e por conta, orçamento global/s
+    LOGIN_IP_LIMIT = 20
+    LOGIN_IP_WINDOW = 300
+    LOGIN_ACCOUNT_LIMIT = 5
+    LOGIN_ACCOUNT_WINDOW = 900
+    LOGIN_VERIFY_BUDGET = int(os.environ.get('LOGIN_VERIFY_BUDGET') or 20)
+    
+    # Cache do usuário autenticado (user_loader)
+    USER_CACHE_SIZE = 10000
+    USER_CACHE_TTL = 60
+    
+    # Particionamento mensal de messages (após `python partitioning.py convert`):
+    # meses futuros mantidos criados e intervalo da verificação (s)
+    MESSAGE_PARTITION_MONTHS_AHEAD = 3
+    MESSAGE_PARTITION_CHECK_SECONDS = 6 * 3600
+    
+    # Arquivamento de mensagens antigas (archive.py): segmentos comprimidos em ARCHIVE_DIR
+    ARCHIVE_ENABLED = os.environ.get('ARCHIVE_ENABLED', 'false').lower() == 'true'
+    ARCHIVE_DIR = os.environ.get('ARCHIVE_DIR') or '/app/archive'
+    ARCHIVE_RETENTION_DAYS = int(os.environ.get('ARCHIVE_RETENTION_DAYS') or 365)
+    # Retenção por sala {slug: dias}; None nunca arquiva a sala
+    ARCHIVE_ROOM_RETENTION_DAYS = {}
+    ARCHIVE_SEGMENT_MESSAGES = 5000
+    ARCHIVE_BLOCK_MESSAGES = 250
+    ARCHIVE_MAX_MESSAGES_PER_RUN = 50000
+    ARCHIVE_INTERVAL_SECONDS = 6 * 3600
+    
+    # Exportação de salas: mensagens por lote do cursor no servidor
+    EXPORT_BATCH_SIZE = 1000
+    
+    # Réplicas de leitura (URLs separadas por vírgula) para rotas @read_replica
+    SQLALCHEMY_REPLICA_URLS = os.environ.get('SQLALCHEMY_REPLICA_URLS', '')
+    REPLICA_MAX_LAG_SECONDS = 5
+    REPLICA_LAG_CHECK_SECONDS = 2
+    # Após escrever, o usuário lê do primário por este tempo
+    REPLICA_STICKY_SECONDS = 10
+    
+    # Pool Redis compartilhado (por processo): tamanho, espera por conexão livre e timeouts (s)
+    REDIS_MAX_CONNECTIONS = int(os.environ.get('REDIS_MAX_CONNECTIONS') or 50)
+    REDIS_POOL_TIMEOUT = 1
+    REDIS_SOCKET_TIMEOUT = 1
+    REDIS_CONNECT_TIMEOUT = 1
+    REDIS_HEALTH_CHECK_INTERVAL = 30
+    
+    # Sondas: intervalo do verificador de dependências e idade máxima do resultado (s)
+    HEALTH_CHECK_SECONDS = 5
+    HEALTH_STALE_SECONDS = 15
+    
+    # Sessões: 'cookie' (assinada no cliente) ou 'redis' (no servidor, revogáveis).
+    # Trocar para 'redis' invalida as sessões em cookie existentes (todos fazem login de novo)
+    SESSION_STORE = os.environ.get('SESSION_STORE', 'cookie')
+    # Outro servidor Redis só para sessões (vazio: pool compartilhado de REDIS_URL)
+    SESSION_REDIS_URL = os.environ.get('SESSION_REDIS_URL')
+    SESSION_REDIS_MAX_CONNECTIONS = 20
+    
     # Configurações de rate limiting
     RATELIMIT_STORAGE_URL = REDIS_URL
     RATELIMIT_DEFAULT = "200 per day;50 per hour;10 per minute"
@@ -0,0 +1,264 @@
+#!/usr/bin/env python3
+"""
+Métricas ao vivo do dashboard do administrador.
+
+Cada processo coleta, a cada poucos segundos, suas mensagens por sala,
+conexões abertas, filas de gravação pendentes e uso do pool do banco.
+
+Com Redis, as contagens de cada worker são somadas no Redis (mensagens e
+salas como contadores, o restante como o último relatório de cada worker)
+e apenas o dono da posse `leader:dashboard` agrega tudo e envia uma única
+amostra ao canal `admin:dashboard`. Sem Redis o próprio processo é o
+amostrador. Todos os dashboards abertos recebem a mesma amostra; nenhum
+visitante dispara consultas próprias.
+"""
+
+import json
+import os
+import socket
+import threading
+import time
+from collections import Counter
+from flask import request
+from flask_login import current_user
+from flask_socketio import emit, join_room, leave_room
+from background import start_periodic_task
+from unread import read_pointers
+from ad_metrics import ad_counters
+from rollups import rollup_buffer
+from metrics import outbox_depth as outbox_depth_gauge
+from db_pool import socket_db_session
+from redis_pool import LeaderLock, get_redis
+
+DASHBOARD_CHANNEL = 'admin:dashboard'
+
+# Chaves no Redis: contadores acumulados entre amostras e relatórios por worker
+MESSAGES_KEY = 'dashboard:messages'
+ROOMS_KEY = 'dashboard:rooms'
+WORKERS_KEY = 'dashboard:workers'
+LAST_SAMPLE_KEY = 'dashboard:last_sample'
+
+# Salas mais ativas enviadas em cada amostra
+TOP_ROOMS = 10
+
+
+def pool_usage(engine):
+    """Uso do pool de conexões (campos ausentes em pools sem limite)"""
+    pool = engine.pool
+    usage = {'class': type(pool).__name__}
+    for name in ('size', 'checkedout', 'checkedin', 'overflow'):
+        method = getattr(pool, name, None)
+        if callable(method):
+            try:
+                usage[name] = method()
+            except Exception:
+                pass
+    return usage
+
+
+def _sum_fields(reports, field):
+    """Soma os campos numéricos de um dicionário presente em cada relatório"""
+    total = {}
+    for report in reports:
+        for name, value in report.get(field, {}).items():
+            if isinstance(value, (int, float)) and not isinstance(value, bool):
+                total[name] = total.get(name, 0) + value
+            else:
+                total.setdefault(name, value)
+    return total
+
+
+class LiveDashboard:
+    """Acumula eventos entre amostras e publica as variações (agregadas entre workers)"""
+
+    def __init__(self):
+        self.socketio = None
+        self.redis = None
+        self.leader = LeaderLock('dashboard')
+        self.interval = 2
+        self.connected = 0
+        self.last_sample = None
+        self._room_messages = Counter()
+        self._last_rooms = {}
+        self._last_time = time.monotonic()
+        self._last_emit = None
+        self._lock = threading.Lock()
+
+    def socket_connected(self):
+        with self._lock:
+            self.connected += 1
+
+    def socket_disconnected(self):
+        with self._lock:
+            self.connected = max(0, self.connected - 1)
+
+    def record_message(self, room_slug):
+        """Conta uma mensagem enviada na sala"""
+        with self._lock:
+            self._room_messages[room_slug] += 1
+
+    def outbox_depth(self):
+        """Itens aguardando gravação nos buffers em segundo plano"""
+        return {
+            'read_pointers': len(read_pointers),
+            'ad_counters': len(ad_counters),
+            'rollups': len(rollup_buffer)
+        }
+
+    def _collect(self, db_session):
+        """Contagens do processo desde a coleta anterior e o estado atual"""
+        now = time.monotonic()
+        with self._lock:
+            rooms, self._room_messages = self._room_messages, Counter()
+            elapsed = max(now - self._last_time, 1e-6)
+            self._last_time = now
+            connected = self.connected
+
+        outbox = self.outbox_depth()
+        for buffer, depth in outbox.items():
+            outbox_depth_gauge.labels(buffer).set(depth)
+
+        return rooms, elapsed, {
+            'timestamp': time.time(),
+            'connected_sockets': connected,
+            'outbox': outbox,
+            'db_pool': pool_usage(db_session.get_bind())
+        }
+
+    def _publish(self, rooms, report):
+        """Soma as contagens do worker no Redis e registra seu relatório"""
+        ttl = max(int(self.interval * 10), 30)
+        pipe = self.redis.pipeline()
+        messages = sum(rooms.values())
+        if messages:
+            pipe.incrby(MESSAGES_KEY, messages)
+            for slug, count in rooms.items():
+                pipe.zincrby(ROOMS_KEY, count, slug)
+            pipe.expire(MESSAGES_KEY, ttl)
+            pipe.expire(ROOMS_KEY, ttl)
+        # pid lido a cada envio: o módulo pode ter sido importado antes do fork
+        pipe.hset(WORKERS_KEY, f'{socket.gethostname()}:{os.getpid()}', json.dumps(report))
+        pipe.expire(WORKERS_KEY, ttl)
+        pipe.execute()
+
+    def _drain(self):
+        """Lê e zera os contadores de todos os workers; relatórios recentes de cada um"""
+        pipe = self.redis.pipeline()  # MULTI/EXEC: nada é perdido entre a leitura e a limpeza
+        pipe.get(MESSAGES_KEY)
+        pipe.zrevrange(ROOMS_KEY, 0, -1, withscores=True)
+        pipe.delete(MESSAGES_KEY, ROOMS_KEY)
+        pipe.hgetall(WORKERS_KEY)
+        messages, rooms, _, workers = pipe.execute()
+
+        # Workers sem relatório recente (encerrados) saem da soma
+        cutoff = time.time() - self.interval * 3
+        reports, stale = [], []
+        for worker, data in workers.items():
+            report = json.loads(data)
+            if report['timestamp'] >= cutoff:
+                reports.append(report)
+            else:
+                stale.append(worker)
+        if stale:
+            self.redis.hdel(WORKERS_KEY, *stale)
+
+        rooms = Counter({(slug.decode() if isinstance(slug, bytes) else slug): int(count) for slug, count in rooms})
+        return int(messages or 0), rooms, reports
+
+    def sample(self, db_session):
+        """Coleta a amostra do processo e, no dono da posse, envia a agregada aos administradores"""
+        rooms, elapsed, report = self._collect(db_session)
+
+        if self.redis is None:
+            messages, reports = sum(rooms.values()), [report]
+        else:
+            try:
+                self._publish(rooms, report)
+                if not self.leader.acquire():
+                    return None
+                messages, rooms, reports = self._drain()
+            except Exception as e:
+                print(f"Erro ao agregar métricas do dashboard no Redis: {e}")
+                return None
+            # Os contadores acumulam desde a última amostra enviada (por este ou outro dono)
+            now = time.monotonic()
+            if self._last_emit is not None and now - self._last_emit < self.interval * 3:
+                elapsed = max(now - self._last_emit, 1e-6)
+            self._last_emit = now
+
+        top = dict(rooms.most_common(TOP_ROOMS))
+
+        # Apenas salas cuja atividade mudou desde a amostra anterior
+        room_deltas = {slug: count for slug, count in top.items()
+                       if self._last_rooms.get(slug) != count}
+        room_deltas.update({slug: 0 for slug in self._last_rooms if slug not in top})
+        self._last_rooms = top
+
+        self.last_sample = {
+            'workers': len(reports),
+            'timestamp': time.time(),
+            'interval': round(elapsed, 3),
+            'messages': messages,
+            'messages_per_second': round(messages / elapsed, 2),
+            'connected_sockets': sum(report['connected_sockets'] for report in reports),
+            'rooms': room_deltas,
+            'outbox': _sum_fields(reports, 'outbox'),
+            'db_pool': _sum_fields(reports, 'db_pool')
+        }
+
+        if self.redis is not None:
+            try:
+                self.redis.set(LAST_SAMPLE_KEY, json.dumps(self.last_sample), ex=max(int(self.interval * 10), 30))
+            except Exception as e:
+                print(f"Erro ao guardar amostra do dashboard: {e}")
+
+        if self.socketio:
+            self.socketio.emit('dashboard_metrics', self.last_sample,
+                               to=DASHBOARD_CHANNEL, namespace='/')
+        return self.last_sample
+
+    def latest(self):
+        """Última amostra agregada (de qualquer worker)"""
+        if self.redis is not None:
+            try:
+                data = self.redis.get(LAST_SAMPLE_KEY)
+                if data:
+                    return json.loads(data)
+            except Exception as e:
+                print(f"Erro ao ler amostra do dashboard: {e}")
+        return self.last_sample
+
+
+live_dashboard = LiveDashboard()
+
+
+def init_live_dashboard(app, socketio):
+    """Inicia o amostrador do processo (a agregação fica com o dono da posse)"""
+    live_dashboard.socketio = socketio
+    live_dashboard.interval = app.config.get('DASHBOARD_SAMPLE_SECONDS', 2)
+    live_dashboard.redis = get_redis(app)
+    live_dashboard.leader.redis = live_dashboard.redis
+    live_dashboard.leader.ttl = max(live_dashboard.interval * 3, 5)
+    start_periodic_task(
+        app, socketio, live_dashboard.interval,
+        live_dashboard.sample, 'amostrar métricas do dashboard'
+    )
+
+
+def register_dashboard_events(socketio):
+    """Registra os eventos Socket.IO do dashboard ao vivo"""
+
+    @socketio.on('dashboard_subscribe')
+    @socket_db_session
+    def on_dashboard_subscribe(data=None):
+        """Administrador passa a receber as amostras"""
+        if not current_user.is_authenticated or not current_user.is_admin:
+            return
+        join_room(DASHBOARD_CHANNEL)
+        sample = live_dashboard.latest()
+        if sample:
+            emit('dashboard_metrics', sample, to=request.sid)
+
+    @socketio.on('dashboard_unsubscribe')
+    def on_dashboard_unsubscribe(data=None):
+        leave_room(DASHBOARD_CHANNEL)
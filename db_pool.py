@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+"""
+Sessão do banco por evento Socket.IO e contrapressão do pool de conexões.
+
+Cada handler decorado com `socket_db_session` devolve a conexão ao pool
+assim que termina (rollback em caso de erro), em vez de depender do fim
+do contexto da requisição do Flask-SocketIO.
+
+A espera por uma conexão é limitada por `pool_timeout`; quando o pool está
+esgotado o cliente recebe um evento `error` com código `db_busy` (ou 503
+nas requisições HTTP) em vez de o greenlet ficar preso. Espera, ocupação
+e recusas do pool são exportadas em `chat_db_pool_wait_seconds`,
+`chat_db_pool_connections{state}` e `chat_db_pool_timeouts_total`.
+"""
+
+import time
+from functools import wraps
+from flask import current_app, jsonify
+from flask_socketio import emit
+from sqlalchemy import exc
+from sqlalchemy.pool import QueuePool
+from metrics import db_pool_connections, db_pool_wait_seconds, db_pool_timeouts
+
+BUSY_MESSAGE = 'Servidor ocupado, tente novamente em instantes.'
+
+
+class InstrumentedQueuePool(QueuePool):
+    """QueuePool que mede a espera por conexão e a ocupação"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.waiting = 0
+
+    def _update_gauges(self):
+        db_pool_connections.labels('checked_out').set(self.checkedout())
+        db_pool_connections.labels('idle').set(self.checkedin())
+        db_pool_connections.labels('waiting').set(self.waiting)
+        db_pool_connections.labels('max').set(self.size() + max(self._max_overflow, 0))
+
+    def _do_get(self):
+        start = time.perf_counter()
+        self.waiting += 1
+        try:
+            return super()._do_get()
+        except exc.TimeoutError:
+            db_pool_timeouts.inc()
+            raise
+        finally:
+            self.waiting -= 1
+            # Inclui o tempo de abrir a conexão quando não havia uma livre no pool
+            db_pool_wait_seconds.observe(time.perf_counter() - start)
+            self._update_gauges()
+
+    def _do_return_conn(self, record):
+        super()._do_return_conn(record)
+        self._update_gauges()
+
+
+def pool_engine_options(app):
+    """Opções padrão do engine (a configuração SQLALCHEMY_ENGINE_OPTIONS prevalece)"""
+    uri = app.config.get('SQLALCHEMY_DATABASE_URI', '')
+    if uri.startswith('sqlite'):
+        # SQLite em memória usa pools próprios do dialeto
+        return {}
+    return {'poolclass': InstrumentedQueuePool}
+
+
+def socket_db_session(func):
+    """Libera a sessão do banco ao fim do handler Socket.IO.
+
+    Pool esgotado (após `pool_timeout`) vira um evento `error` para o
+    cliente; outros erros desfazem a transação e seguem para o
+    tratamento de erros do Flask-SocketIO.
+    """
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        db = current_app.extensions['sqlalchemy']
+        try:
+            return func(*args, **kwargs)
+        except exc.TimeoutError:
+            db.session.rollback()
+            print(f"Pool de conexões esgotado no evento {func.__name__}")
+            emit('error', {'msg': BUSY_MESSAGE, 'code': 'db_busy'})
+        except Exception:
+            db.session.rollback()
+            raise
+        finally:
+            db.session.remove()
+    return wrapper
+
+
+def init_db_pool(app):
+    """Requisições HTTP com pool esgotado respondem 503 com Retry-After"""
+
+    @app.errorhandler(exc.TimeoutError)
+    def pool_exhausted(error):
+        print(f"Pool de conexões esgotado: {error}")
+        response = jsonify({'success': False, 'error': BUSY_MESSAGE})
+        response.status_code = 503
+        response.headers['Retry-After'] = '1'
+        return response
@@ -0,0 +1,238 @@
+#!/usr/bin/env python3
+"""
+Divisão de leituras e escritas entre o Postgres primário e réplicas.
+
+Com SQLALCHEMY_REPLICA_URLS configurado, rotas marcadas com
+`@read_replica` (histórico, diretório de salas, dashboards, listas de
+solicitações) executam suas consultas SELECT numa réplica. Todo o resto,
+incluindo qualquer escrita e as leituras feitas depois dela na mesma
+sessão, continua no primário.
+
+* Leia o que escreveu: depois de um commit com escritas, o usuário fica
+  preso ao primário por REPLICA_STICKY_SECONDS (no Redis compartilhado,
+  se houver, para valer em todos os workers).
+* Atraso de replicação: um verificador em segundo plano mede o atraso de
+  cada réplica; acima de REPLICA_MAX_LAG_SECONDS ela sai do rodízio e, sem
+  réplicas saudáveis, as leituras voltam ao primário.
+
+Para testar localmente basta um segundo Postgres (réplica de streaming) ou
+apontar SQLALCHEMY_REPLICA_URLS para qualquer banco com o mesmo esquema
+(réplica simulada). `replica_router.simulate_lag(0, 30)` força o atraso de
+uma réplica para exercitar o retorno ao primário.
+"""
+
+import itertools
+from functools import wraps
+from flask import g, has_app_context, has_request_context
+from flask_login import current_user
+from flask_sqlalchemy.session import Session as FlaskSession
+from sqlalchemy import create_engine, event, text
+from sqlalchemy.sql import Select
+from cache import TTLCache
+from metrics import db_replica_lag_seconds, db_reads_routed
+from redis_pool import get_redis
+
+LAG_QUERY = text(
+    "SELECT CASE WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0 "
+    "ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0) END"
+)
+
+
+class Replica:
+    """Engine de uma réplica e seu último atraso medido"""
+
+    def __init__(self, index, engine):
+        self.index = index
+        self.engine = engine
+        self.lag = 0.0
+        self.healthy = True
+        self.simulated_lag = None
+
+
+class ReplicaRouter:
+    """Escolhe a réplica de cada sessão e mantém o estado de atraso e fixação"""
+
+    def __init__(self):
+        self.replicas = []
+        self.max_lag = 5
+        self.sticky_seconds = 10
+        self.redis = None
+        self._sticky_local = TTLCache('db_sticky', maxsize=10000, ttl=10)
+        self._cycle = itertools.cycle(())
+
+    def configure(self, engines, max_lag=5, sticky_seconds=10, redis_client=None):
+        self.replicas = [Replica(index, engine) for index, engine in enumerate(engines)]
+        self.max_lag = max_lag
+        self.sticky_seconds = sticky_seconds
+        self.redis = redis_client
+        self._sticky_local.ttl = sticky_seconds
+        self._cycle = itertools.cycle(self.replicas)
+
+    @property
+    def enabled(self):
+        return bool(self.replicas)
+
+    def choose(self):
+        """Próxima réplica saudável (None: usar o primário)"""
+        for _ in range(len(self.replicas)):
+            replica = next(self._cycle)
+            if replica.healthy:
+                return replica
+        return None
+
+    # ------------------------------------------------------------------
+    # Atraso de replicação
+    # ------------------------------------------------------------------
+
+    def simulate_lag(self, index, seconds):
+        """Força o atraso medido de uma réplica (None volta à medição real)"""
+        self.replicas[index].simulated_lag = seconds
+        self.check_lag()
+
+    def measure_lag(self, replica):
+        if replica.simulated_lag is not None:
+            return replica.simulated_lag
+        if replica.engine.dialect.name != 'postgresql':
+            return 0.0
+        with replica.engine.connect() as conn:
+            return float(conn.execute(LAG_QUERY).scalar() or 0)
+
+    def check_lag(self):
+        for replica in self.replicas:
+            try:
+                replica.lag = self.measure_lag(replica)
+                replica.healthy = replica.lag <= self.max_lag
+            except Exception as e:
+                print(f"Erro ao medir atraso da réplica {replica.index}: {e}")
+                replica.healthy = False
+            db_replica_lag_seconds.labels(str(replica.index)).set(replica.lag)
+
+    def run(self, socketio, interval):
+        while True:
+            self.check_lag()
+            socketio.sleep(interval)
+
+    # ------------------------------------------------------------------
+    # Leia o que escreveu
+    # ------------------------------------------------------------------
+
+    def mark_wrote(self, user_id):
+        self._sticky_local.set(user_id, True)
+        if self.redis is not None:
+            try:
+                self.redis.setex(f'db_primary:{user_id}', self.sticky_seconds, 1)
+            except Exception as e:
+                print(f"Erro ao registrar fixação no primário: {e}")
+
+    def is_sticky(self, user_id):
+        if self._sticky_local.get(user_id):
+            return True
+        if self.redis is not None:
+            try:
+                return bool(self.redis.exists(f'db_primary:{user_id}'))
+            except Exception:
+                # Sem como saber: o primário é sempre correto
+                return True
+        return False
+
+
+replica_router = ReplicaRouter()
+
+
+def _replica_requested():
+    return has_app_context() and g.get('db_read_replica', False)
+
+
+class RoutingSession(FlaskSession):
+    """Sessão que envia SELECTs de rotas somente leitura para uma réplica"""
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if (
+            bind is None
+            and replica_router.enabled
+            and not self._flushing
+            and not self.info.get('db_wrote')
+            and (clause is None or (isinstance(clause, Select) and clause._for_update_arg is None))
+            and _replica_requested()
+        ):
+            replica = self.info.get('db_replica')
+            if replica is None or not replica.healthy:
+                replica = replica_router.choose()
+                self.info['db_replica'] = replica
+            if replica is not None:
+                db_reads_routed.labels('replica').inc()
+                return replica.engine
+            # Nenhuma réplica dentro do limite de atraso
+            db_reads_routed.labels('primary').inc()
+        if clause is not None and not isinstance(clause, Select):
+            self.info['db_wrote'] = True
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+def _flag_write(session, flush_context):
+    session.info['db_wrote'] = True
+
+
+def _stick_after_commit(session):
+    wrote = session.info.pop('db_wrote', False)
+    session.info.pop('db_replica', None)
+    if not wrote or not replica_router.enabled or not has_request_context():
+        return
+    # O restante desta requisição também lê do primário
+    g.db_read_replica = False
+    if current_user.is_authenticated:
+        replica_router.mark_wrote(current_user.id)
+
+
+def _reset_after_rollback(session):
+    session.info.pop('db_wrote', None)
+    session.info.pop('db_replica', None)
+
+
+def read_replica(f):
+    """Rota somente leitura: SELECTs vão para uma réplica saudável"""
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        if replica_router.enabled:
+            sticky = current_user.is_authenticated and replica_router.is_sticky(current_user.id)
+            g.db_read_replica = not sticky
+        return f(*args, **kwargs)
+    return decorated_function
+
+
+def routing_session_options():
+    """session_options do Flask-SQLAlchemy com a sessão roteadora"""
+    return {'class_': RoutingSession}
+
+
+_listeners_installed = False
+
+
+def init_db_routing(app, socketio):
+    """Cria os engines das réplicas e inicia o verificador de atraso"""
+    global _listeners_installed
+    urls = app.config.get('SQLALCHEMY_REPLICA_URLS') or []
+    if isinstance(urls, str):
+        urls = [url.strip() for url in urls.split(',') if url.strip()]
+    if not urls:
+        return False
+
+    options = dict(app.config.get('SQLALCHEMY_REPLICA_ENGINE_OPTIONS')
+                   or app.config.get('SQLALCHEMY_ENGINE_OPTIONS') or {})
+    replica_router.configure(
+        [create_engine(url, **options) for url in urls],
+        max_lag=app.config.get('REPLICA_MAX_LAG_SECONDS', 5),
+        sticky_seconds=app.config.get('REPLICA_STICKY_SECONDS', 10),
+        redis_client=get_redis(app)
+    )
+
+    if not _listeners_installed:
+        event.listen(RoutingSession, 'after_flush', _flag_write)
+        event.listen(RoutingSession, 'after_commit', _stick_after_commit)
+        event.listen(RoutingSession, 'after_rollback', _reset_after_rollback)
+        _listeners_installed = True
+
+    socketio.start_background_task(
+        replica_router.run, socketio, app.config.get('REPLICA_LAG_CHECK_SECONDS', 2)
+    )
+    return True
@@ -0,0 +1,30 @@
+#!/usr/bin/env python3
+"""
+Utilitários de banco de dados compartilhados.
+"""
+
+
+def upsert_increment(executor, table, rows, key_columns, counter_columns):
+    """Insere linhas ou soma os contadores às já existentes (executemany).
+
+    `executor` pode ser uma sessão ou uma conexão. Usa
+    INSERT ... ON CONFLICT DO UPDATE no PostgreSQL e no SQLite.
+    """
+    if not rows:
+        return
+
+    dialect = getattr(executor, 'dialect', None) or executor.get_bind().dialect
+    dialect = dialect.name
+    if dialect == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert
+    elif dialect == 'sqlite':
+        from sqlalchemy.dialects.sqlite import insert
+    else:
+        raise NotImplementedError(f'upsert não suportado para {dialect}')
+
+    stmt = insert(table)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=key_columns,
+        set_={column: table.c[column] + stmt.excluded[column] for column in counter_columns}
+    )
+    executor.execute(stmt, rows)
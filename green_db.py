@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+"""
+Acesso ao Postgres compatível com o eventlet.
+
+O psycopg2 é uma extensão C: mesmo com `eventlet.monkey_patch()` cada
+consulta bloqueia o hub inteiro (todas as conexões Socket.IO do worker)
+até o banco responder. Com um "wait callback" o psycopg2 passa a operar em
+modo assíncrono e devolve o controle ao eventlet enquanto espera o socket
+do banco, no mesmo esquema do psycogreen.
+
+Consultas continuam sequenciais dentro de cada conexão; a concorrência
+entre greenlets vem do pool do SQLAlchemy (pool_size + max_overflow).
+"""
+
+
+def eventlet_wait_callback(conn, timeout=-1):
+    """Espera o socket do psycopg2 cedendo a vez aos outros greenlets"""
+    from eventlet.hubs import trampoline
+    from psycopg2 import OperationalError, extensions
+
+    while True:
+        state = conn.poll()
+        if state == extensions.POLL_OK:
+            break
+        elif state == extensions.POLL_READ:
+            trampoline(conn.fileno(), read=True)
+        elif state == extensions.POLL_WRITE:
+            trampoline(conn.fileno(), write=True)
+        else:
+            raise OperationalError(f"Resultado inesperado de poll: {state!r}")
+
+
+def make_psycopg2_green():
+    """Instala o wait callback (vale para o processo inteiro)"""
+    from psycopg2 import extensions
+    extensions.set_wait_callback(eventlet_wait_callback)
+
+
+def is_green():
+    """True se o wait callback do eventlet está ativo"""
+    try:
+        from psycopg2 import extensions
+    except ImportError:
+        return False
+    return extensions.get_wait_callback() is eventlet_wait_callback
+
+
+def init_green_db(app, socketio):
+    """Ativa o psycopg2 cooperativo quando o app roda no eventlet com Postgres.
+
+    Deve ser chamado antes da primeira conexão ao banco.
+    """
+    if getattr(socketio, 'async_mode', None) != 'eventlet':
+        return False
+    if not app.config.get('SQLALCHEMY_DATABASE_URI', '').startswith('postgres'):
+        return False
+    if not app.config.get('DB_GREEN_PSYCOPG2', True):
+        return False
+
+    import eventlet.patcher
+    if not eventlet.patcher.is_monkey_patched('socket'):
+        print("Aviso: eventlet.monkey_patch() não foi chamado antes dos imports; "
+              "bibliotecas Python puras (redis, smtplib) ainda bloqueiam o hub")
+
+    try:
+        make_psycopg2_green()
+    except ImportError:
+        return False
+    return True
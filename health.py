@@ -0,0 +1,163 @@
+#!/usr/bin/env python3
+"""
+Sondas de liveness e readiness.
+
+* `/livez` responde sem tocar em dependências: o processo está vivo e
+  atendendo requisições.
+* `/readyz` devolve o último resultado do verificador em segundo plano
+  (banco, Redis, esquema e aquecimento), sem executar consultas na
+  própria sonda. O worker só fica pronto depois da primeira rodada bem
+  sucedida e deixa de estar pronto se as verificações ficarem paradas
+  (resultado mais antigo que HEALTH_STALE_SECONDS).
+* `/health` continua disponível com o mesmo resultado de `/readyz`.
+"""
+
+import time
+from datetime import datetime
+from flask import jsonify
+from sqlalchemy import inspect, text
+from models import Base
+from redis_pool import get_redis
+from upgrade_db import missing_columns
+
+
+class HealthMonitor:
+    """Verificações periódicas de dependências e do estado de aquecimento"""
+
+    def __init__(self):
+        self.checks = {}
+        self.warmups = {}
+        self.results = {}
+        self.interval = 5
+        self.stale_after = 15
+        self.last_run = None
+        self.started_at = time.time()
+
+    def register_check(self, name, func):
+        """`func(app)` lança exceção se a dependência estiver indisponível (pode retornar detalhes)"""
+        self.checks[name] = func
+
+    def register_warmup(self, name, func):
+        """`func()` retorna True quando o componente terminou de carregar"""
+        self.warmups[name] = func
+
+    def run_checks(self, app):
+        """Executa todas as verificações e guarda o resultado"""
+        results = {}
+        with app.app_context():
+            db = app.extensions['sqlalchemy']
+            try:
+                for name, func in self.checks.items():
+                    start = time.perf_counter()
+                    try:
+                        results[name] = {'ok': True, **(func(app) or {})}
+                    except Exception as e:
+                        db.session.rollback()
+                        results[name] = {'ok': False, 'error': str(e)}
+                    results[name]['latency_ms'] = round((time.perf_counter() - start) * 1000, 1)
+            finally:
+                db.session.remove()
+
+        for name, func in self.warmups.items():
+            try:
+                results[name] = {'ok': bool(func())}
+            except Exception as e:
+                results[name] = {'ok': False, 'error': str(e)}
+
+        self.results = results
+        self.last_run = time.time()
+        return results
+
+    def readiness(self):
+        """Estado de prontidão a partir do último resultado (sem consultas)"""
+        age = time.time() - self.last_run if self.last_run else None
+        stale = age is None or age > self.stale_after
+        ready = not stale and all(result['ok'] for result in self.results.values())
+        return {
+            'ready': ready,
+            'checked_seconds_ago': round(age, 1) if age is not None else None,
+            'stale': stale,
+            'checks': self.results
+        }
+
+    def run(self, app, socketio):
+        """Laço do verificador (primeira rodada imediata)"""
+        while True:
+            try:
+                self.run_checks(app)
+            except Exception as e:
+                print(f"Erro ao verificar dependências: {e}")
+            socketio.sleep(self.interval)
+
+
+health_monitor = HealthMonitor()
+
+
+def check_database(app):
+    app.extensions['sqlalchemy'].session.execute(text('SELECT 1'))
+
+
+def check_redis(app):
+    client = get_redis(app)
+    client.ping()
+    stats = getattr(client.connection_pool, 'stats', None)
+    return {'pool': stats()} if stats else None
+
+
+_schema_ok = False
+
+
+def check_schema(app):
+    """Todas as tabelas e colunas dos modelos existem no banco (o app não usa migrações versionadas)"""
+    global _schema_ok
+    if _schema_ok:
+        return None
+    engine = app.extensions['sqlalchemy'].engine
+    existing = set(inspect(engine).get_table_names())
+    missing = sorted(set(Base.metadata.tables) - existing)
+    if missing:
+        raise RuntimeError(f"Tabelas ausentes: {', '.join(missing)}")
+    with engine.connect() as conn:
+        columns = missing_columns(conn)
+    if columns:
+        raise RuntimeError(f"Colunas ausentes (execute upgrade_db.py): "
+                           f"{', '.join(f'{table}.{column}' for table, column in columns)}")
+    _schema_ok = True
+
+
+def init_health(app, socketio):
+    """Registra /livez, /readyz e /health e inicia o verificador em segundo plano"""
+    health_monitor.interval = app.config.get('HEALTH_CHECK_SECONDS', 5)
+    health_monitor.stale_after = app.config.get('HEALTH_STALE_SECONDS') or health_monitor.interval * 3
+
+    health_monitor.register_check('database', check_database)
+    health_monitor.register_check('schema', check_schema)
+    if get_redis(app) is not None:
+        health_monitor.register_check('redis', check_redis)
+
+    from ad_schedule import ad_schedule
+    health_monitor.register_warmup('ad_schedule', lambda: ad_schedule.loaded)
+
+    @app.route('/livez')
+    def livez():
+        """Liveness: não consulta dependências"""
+        return jsonify({'status': 'alive', 'uptime_seconds': round(time.time() - health_monitor.started_at)}), 200
+
+    @app.route('/readyz')
+    def readyz():
+        """Readiness: último resultado do verificador em segundo plano"""
+        state = health_monitor.readiness()
+        state['timestamp'] = datetime.utcnow().isoformat()
+        return jsonify(state), 200 if state['ready'] else 503
+
+    @app.route('/health')
+    def health_check():
+        """Health check para monitoramento (mesmo resultado de /readyz)"""
+        state = health_monitor.readiness()
+        return jsonify({
+            'status': 'healthy' if state['ready'] else 'unhealthy',
+            'timestamp': datetime.utcnow().isoformat(),
+            'checks': state['checks']
+        }), 200 if state['ready'] else 503
+
+    socketio.start_background_task(health_monitor.run, app, socketio)
@@ -0,0 +1,403 @@
+#!/usr/bin/env python3
+"""
+Teste de carga ponta a ponta do chat (HTTP + Socket.IO).
+
+Simula N usuários autenticados distribuídos em M salas usando clientes
+`python-socketio`, misturando envio de mensagens, indicadores de digitação
+e reconexões. Mede a latência de entrega (envio -> recebimento em cada
+membro conectado), a vazão e as taxas de erro, e grava o resultado em JSON
+para comparação entre execuções.
+
+Uso:
+    # 1. Criar usuários/salas de teste no banco usado pelo servidor local
+    python loadtest.py seed --database sqlite:///instance/chat.db --users 50 --rooms 5
+
+    # 2. Iniciar o servidor (python app_simple.py) e executar a carga
+    python loadtest.py run --url http://localhost:5000 --users 50 --rooms 5 \\
+        --duration 60 --output resultados.json
+
+    # 3. Comparar com uma execução anterior
+    python loadtest.py compare base.json resultados.json
+
+Dependências (apenas para o teste de carga):
+    pip install "python-socketio[client]" requests
+"""
+
+import argparse
+import json
+import math
+import random
+import re
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from datetime import datetime
+
+LOAD_PASSWORD = 'loadtest-password'
+MARKER = re.compile(r'\[lt:([0-9a-f]{32}):(\d+\.\d+)\]')
+CSRF_FIELD = re.compile(r'name="csrf_token"[^>]*value="([^"]+)"')
+
+
+def load_user(index):
+    return f'loadtest_{index}', f'loadtest_{index}@example.com'
+
+
+def load_room(index):
+    return f'loadtest-room-{index}'
+
+
+def percentile(values, pct):
+    """Percentil por interpolação linear (0 <= pct <= 100)"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    position = (len(ordered) - 1) * pct / 100
+    lower = math.floor(position)
+    upper = math.ceil(position)
+    if lower == upper:
+        return ordered[lower]
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (position - lower)
+
+
+def summarize(values):
+    """Resumo de latências em milissegundos"""
+    return {
+        'count': len(values),
+        'mean': round(sum(values) / len(values) * 1000, 2) if values else None,
+        'p50': _ms(percentile(values, 50)),
+        'p90': _ms(percentile(values, 90)),
+        'p95': _ms(percentile(values, 95)),
+        'p99': _ms(percentile(values, 99)),
+        'max': _ms(max(values)) if values else None
+    }
+
+
+def _ms(seconds):
+    return round(seconds * 1000, 2) if seconds is not None else None
+
+
+# ============================================================================
+# PREPARAÇÃO DO BANCO
+# ============================================================================
+
+def seed(database_url, users, rooms):
+    """Cria (ou reaproveita) usuários e salas de teste com membros distribuídos"""
+    from sqlalchemy import create_engine
+    from sqlalchemy.orm import Session
+    from passlib.hash import argon2
+    from models import Base, User, Room, RoomMember
+
+    engine = create_engine(database_url)
+    Base.metadata.create_all(engine)
+    password_hash = argon2.hash(LOAD_PASSWORD)
+
+    with Session(engine) as session:
+        user_ids = []
+        for index in range(users):
+            username, email = load_user(index)
+            user = session.query(User).filter_by(email=email).first()
+            if not user:
+                user = User(username=username, email=email, password_hash=password_hash)
+                session.add(user)
+                session.flush()
+            user_ids.append(user.id)
+
+        for index in range(rooms):
+            slug = load_room(index)
+            room = session.query(Room).filter_by(slug=slug).first()
+            if not room:
+                room = Room(name=f'Load test {index}', slug=slug, creator_id=user_ids[0])
+                session.add(room)
+                session.flush()
+
+            existing = {user_id for (user_id,) in session.query(RoomMember.user_id).filter_by(room_id=room.id)}
+            for position, user_id in enumerate(user_ids):
+                if position % rooms == index and user_id not in existing:
+                    session.add(RoomMember(room_id=room.id, user_id=user_id, role='member'))
+
+        session.commit()
+
+    print(f"✅ {users} usuários e {rooms} salas de teste prontos (senha: {LOAD_PASSWORD})")
+
+
+# ============================================================================
+# CLIENTE VIRTUAL
+# ============================================================================
+
+class Stats:
+    """Resultados compartilhados entre os clientes"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.send_latency = []
+        self.delivery_latency = []
+        self.events = Counter()
+        self.errors = Counter()
+
+    def count(self, name, amount=1):
+        with self.lock:
+            self.events[name] += amount
+
+    def error(self, kind):
+        with self.lock:
+            self.errors[kind] += 1
+
+    def add(self, series, value):
+        with self.lock:
+            getattr(self, series).append(value)
+
+
+class VirtualUser:
+    """Usuário simulado: sessão HTTP autenticada + conexão Socket.IO"""
+
+    def __init__(self, index, args, stats, stop):
+        import requests
+        self.index = index
+        self.args = args
+        self.stats = stats
+        self.stop = stop
+        self.room = load_room(index % args.rooms)
+        self.http = requests.Session()
+        self.sio = None
+        self.rng = random.Random(args.seed + index)
+
+    def login(self):
+        _, email = load_user(self.index)
+        page = self.http.get(f'{self.args.url}/auth/login', timeout=self.args.timeout)
+        match = CSRF_FIELD.search(page.text)
+        data = {'email': email, 'password': LOAD_PASSWORD}
+        if match:
+            data['csrf_token'] = match.group(1)
+        response = self.http.post(f'{self.args.url}/auth/login', data=data,
+                                  timeout=self.args.timeout, allow_redirects=False)
+        if response.status_code != 302 or 'session' not in self.http.cookies:
+            raise RuntimeError(f'login falhou para {email} (HTTP {response.status_code})')
+
+    def connect(self):
+        import socketio
+        sio = socketio.Client(http_session=self.http, reconnection=False)
+        sio.on('message', self.on_message)
+        sio.connect(self.args.url, transports=['websocket'], wait_timeout=self.args.timeout)
+        sio.emit('join', {'room': self.room})
+        self.sio = sio
+        self.stats.count('connects')
+
+    def on_message(self, data):
+        received = time.time()
+        match = MARKER.search((data or {}).get('content') or '')
+        if not match:
+            return
+        self.stats.add('delivery_latency', received - float(match.group(2)))
+        self.stats.count('delivered')
+
+    def send(self):
+        content = f'mensagem de carga [lt:{uuid.uuid4().hex}:{time.time():.6f}]'
+        started = time.perf_counter()
+        try:
+            if self.args.send_via == 'socket':
+                # Cobre as duas assinaturas de evento usadas pelos apps
+                self.sio.emit('message', {'room': self.room, 'content': content, 'message': content})
+            else:
+                response = self.http.post(f'{self.args.url}/chat/{self.room}/send',
+                                          data={'content': content}, timeout=self.args.timeout)
+                if response.status_code != 200:
+                    self.stats.error(f'send_http_{response.status_code}')
+                    return
+            self.stats.add('send_latency', time.perf_counter() - started)
+            self.stats.count('sent')
+        except Exception as e:
+            self.stats.error(f'send_{type(e).__name__}')
+
+    def typing(self):
+        try:
+            self.sio.emit('typing', {'room': self.room, 'is_typing': True})
+            self.stats.count('typing')
+        except Exception as e:
+            self.stats.error(f'typing_{type(e).__name__}')
+
+    def reconnect(self):
+        try:
+            self.sio.disconnect()
+            self.connect()
+            self.stats.count('reconnects')
+        except Exception as e:
+            self.stats.error(f'reconnect_{type(e).__name__}')
+
+    def run(self, ready):
+        try:
+            self.login()
+            self.connect()
+        except Exception as e:
+            self.stats.error(f'setup_{type(e).__name__}')
+            return
+        finally:
+            ready.release()
+
+        # Ações em intervalos exponenciais (processo de Poisson por usuário)
+        actions = ('send', 'typing', 'reconnect')
+        weights = (1.0, self.args.typing_ratio, self.args.reconnect_ratio)
+        rate = self.args.rate * sum(weights)
+        while not self.stop.is_set():
+            if self.stop.wait(self.rng.expovariate(rate)):
+                break
+            getattr(self, self.rng.choices(actions, weights)[0])()
+
+        try:
+            self.sio.disconnect()
+        except Exception:
+            pass
+
+
+def run(args):
+    """Executa a carga e retorna o resultado"""
+    stats = Stats()
+    stop = threading.Event()
+    ready = threading.Semaphore(0)
+    users = [VirtualUser(index, args, stats, stop) for index in range(args.users)]
+    threads = [threading.Thread(target=user.run, args=(ready,), daemon=True) for user in users]
+
+    print(f"🚀 Conectando {args.users} usuários em {args.rooms} salas...")
+    for thread in threads:
+        thread.start()
+        # Rampa de subida para não concentrar logins (argon2) no mesmo instante
+        time.sleep(args.ramp_up / max(args.users, 1))
+    for _ in threads:
+        ready.acquire()
+
+    print(f"⏱️  Carga por {args.duration}s...")
+    started = time.monotonic()
+    time.sleep(args.duration)
+    stop.set()
+    elapsed = time.monotonic() - started
+    for thread in threads:
+        thread.join(timeout=args.timeout)
+
+    sent = stats.events['sent']
+    total_errors = sum(stats.errors.values())
+    attempts = sent + total_errors
+    return {
+        'timestamp': datetime.utcnow().isoformat(),
+        'config': {
+            'url': args.url, 'users': args.users, 'rooms': args.rooms,
+            'duration': args.duration, 'rate': args.rate, 'send_via': args.send_via,
+            'typing_ratio': args.typing_ratio, 'reconnect_ratio': args.reconnect_ratio,
+            'seed': args.seed
+        },
+        'elapsed_seconds': round(elapsed, 2),
+        'throughput': {
+            'sent_per_second': round(sent / elapsed, 2),
+            'delivered_per_second': round(stats.events['delivered'] / elapsed, 2)
+        },
+        'send_latency_ms': summarize(stats.send_latency),
+        'delivery_latency_ms': summarize(stats.delivery_latency),
+        'events': dict(stats.events),
+        'errors': dict(stats.errors),
+        'error_rate': round(total_errors / attempts, 4) if attempts else 0.0
+    }
+
+
+def print_report(result):
+    print("=" * 50)
+    print(f"Enviadas/s: {result['throughput']['sent_per_second']}  "
+          f"Entregues/s: {result['throughput']['delivered_per_second']}")
+    for title, key in (('Envio', 'send_latency_ms'), ('Entrega', 'delivery_latency_ms')):
+        summary = result[key]
+        print(f"{title} (ms): p50={summary['p50']} p95={summary['p95']} "
+              f"p99={summary['p99']} max={summary['max']} (n={summary['count']})")
+    print(f"Eventos: {result['events']}")
+    print(f"Erros: {result['errors'] or 'nenhum'} (taxa {result['error_rate']:.2%})")
+    print("=" * 50)
+
+
+# ============================================================================
+# COMPARAÇÃO
+# ============================================================================
+
+COMPARED = (
+    ('throughput', 'sent_per_second', True),
+    ('throughput', 'delivered_per_second', True),
+    ('send_latency_ms', 'p50', False),
+    ('send_latency_ms', 'p95', False),
+    ('send_latency_ms', 'p99', False),
+    ('delivery_latency_ms', 'p50', False),
+    ('delivery_latency_ms', 'p95', False),
+    ('delivery_latency_ms', 'p99', False),
+)
+
+
+def compare(baseline_path, current_path, tolerance):
+    """Compara duas execuções; retorna 1 se alguma métrica piorar além da tolerância"""
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+    with open(current_path) as f:
+        current = json.load(f)
+
+    regressions = 0
+    for section, key, higher_is_better in COMPARED:
+        before = baseline.get(section, {}).get(key)
+        after = current.get(section, {}).get(key)
+        if not before or after is None:
+            continue
+        change = (after - before) / before
+        worse = -change if higher_is_better else change
+        flag = '❌' if worse > tolerance else '✅'
+        regressions += worse > tolerance
+        print(f"{flag} {section}.{key}: {before} -> {after} ({change:+.1%})")
+
+    before, after = baseline.get('error_rate', 0), current.get('error_rate', 0)
+    flag = '❌' if after > before + tolerance / 10 else '✅'
+    regressions += after > before + tolerance / 10
+    print(f"{flag} error_rate: {before:.2%} -> {after:.2%}")
+    return 1 if regressions else 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Teste de carga do chat')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    seed_parser = commands.add_parser('seed', help='cria usuários e salas de teste')
+    seed_parser.add_argument('--database', required=True, help='URL SQLAlchemy do banco do servidor')
+    seed_parser.add_argument('--users', type=int, default=50)
+    seed_parser.add_argument('--rooms', type=int, default=5)
+
+    run_parser = commands.add_parser('run', help='executa a carga')
+    run_parser.add_argument('--url', default='http://localhost:5000')
+    run_parser.add_argument('--users', type=int, default=50)
+    run_parser.add_argument('--rooms', type=int, default=5)
+    run_parser.add_argument('--duration', type=float, default=60)
+    run_parser.add_argument('--rate', type=float, default=0.5, help='mensagens/s por usuário')
+    run_parser.add_argument('--typing-ratio', type=float, default=2.0, help='eventos de digitação por mensagem')
+    run_parser.add_argument('--reconnect-ratio', type=float, default=0.02, help='reconexões por mensagem')
+    run_parser.add_argument('--send-via', choices=('http', 'socket'), default='http')
+    run_parser.add_argument('--ramp-up', type=float, default=10, help='segundos para conectar todos')
+    run_parser.add_argument('--timeout', type=float, default=10)
+    run_parser.add_argument('--seed', type=int, default=1404)
+    run_parser.add_argument('--output', help='arquivo JSON com o resultado')
+
+    compare_parser = commands.add_parser('compare', help='compara duas execuções')
+    compare_parser.add_argument('baseline')
+    compare_parser.add_argument('current')
+    compare_parser.add_argument('--tolerance', type=float, default=0.10)
+
+    args = parser.parse_args(argv)
+
+    if args.command == 'seed':
+        seed(args.database, args.users, args.rooms)
+        return 0
+
+    if args.command == 'compare':
+        return compare(args.baseline, args.current, args.tolerance)
+
+    result = run(args)
+    print_report(result)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(result, f, indent=2)
+        print(f"💾 Resultado salvo em {args.output}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
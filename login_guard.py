@@ -0,0 +1,211 @@
+#!/usr/bin/env python3
+"""
+Controle de admissão do login.
+
+Antes de qualquer verificação Argon2 cada tentativa passa por três
+barreiras baratas:
+
+* janela deslizante por IP (falhas, inclusive para contas inexistentes);
+* janela deslizante por conta (falhas), zerada após login bem-sucedido;
+* orçamento global de verificações por segundo, compartilhado por todos
+  os workers.
+
+Os contadores ficam no Redis (pool compartilhado de REDIS_URL) para valerem
+entre processos; se o Redis não estiver configurado ou falhar, cada worker
+usa contadores em memória.
+"""
+
+import hashlib
+import threading
+import time
+from redis_pool import shared_pool_for
+
+
+class Decision:
+    """Resultado da admissão"""
+
+    __slots__ = ('allowed', 'reason', 'retry_after')
+
+    def __init__(self, allowed, reason=None, retry_after=0):
+        self.allowed = allowed
+        self.reason = reason
+        self.retry_after = retry_after
+
+    def __bool__(self):
+        return self.allowed
+
+
+ALLOWED = Decision(True)
+
+
+class MemoryCounterStore:
+    """Contadores por janela fixa no próprio processo"""
+
+    def __init__(self):
+        self._counts = {}
+        self._lock = threading.Lock()
+        self._last_purge = time.monotonic()
+
+    def incr(self, key, ttl):
+        now = time.time()
+        with self._lock:
+            count, expires_at = self._counts.get(key, (0, 0))
+            if expires_at <= now:
+                count = 0
+            self._counts[key] = (count + 1, now + ttl)
+            self._purge(now)
+            return count + 1
+
+    def get_many(self, keys):
+        now = time.time()
+        with self._lock:
+            values = []
+            for key in keys:
+                count, expires_at = self._counts.get(key, (0, 0))
+                values.append(count if expires_at > now else 0)
+            return values
+
+    def delete(self, keys):
+        with self._lock:
+            for key in keys:
+                self._counts.pop(key, None)
+
+    def _purge(self, now):
+        if time.monotonic() - self._last_purge < 60:
+            return
+        self._last_purge = time.monotonic()
+        for key in [key for key, (_, expires_at) in self._counts.items() if expires_at <= now]:
+            del self._counts[key]
+
+
+class RedisCounterStore:
+    """Contadores por janela fixa no Redis (compartilhados entre workers)"""
+
+    def __init__(self, client, prefix='login_guard'):
+        self.client = client
+        self.prefix = prefix
+
+    def _key(self, key):
+        return f'{self.prefix}:{key}'
+
+    def incr(self, key, ttl):
+        pipe = self.client.pipeline()
+        pipe.incr(self._key(key))
+        pipe.expire(self._key(key), int(ttl) + 1)
+        return pipe.execute()[0]
+
+    def get_many(self, keys):
+        return [int(value or 0) for value in self.client.mget([self._key(key) for key in keys])]
+
+    def delete(self, keys):
+        self.client.delete(*[self._key(key) for key in keys])
+
+
+class LoginGuard:
+    """Janelas deslizantes (aproximadas por duas janelas fixas) e orçamento global"""
+
+    def __init__(self):
+        self.store = None
+        self.fallback = MemoryCounterStore()
+        self.ip_limit = 20
+        self.ip_window = 300
+        self.account_limit = 5
+        self.account_window = 900
+        self.budget_per_second = 20
+
+    def configure(self, store=None, ip_limit=20, ip_window=300, account_limit=5,
+                  account_window=900, budget_per_second=20):
+        self.store = store
+        self.ip_limit = ip_limit
+        self.ip_window = ip_window
+        self.account_limit = account_limit
+        self.account_window = account_window
+        self.budget_per_second = budget_per_second
+
+    def _call(self, method, *args):
+        """Usa o Redis; em caso de falha, os contadores locais do worker"""
+        if self.store is not None:
+            try:
+                return getattr(self.store, method)(*args)
+            except Exception as e:
+                print(f"Erro no controle de login (Redis), usando contadores locais: {e}")
+        return getattr(self.fallback, method)(*args)
+
+    @staticmethod
+    def _account(email):
+        return hashlib.sha256((email or '').strip().lower().encode()).hexdigest()[:32]
+
+    @staticmethod
+    def _buckets(name, window, now):
+        current = int(now // window)
+        return f'{name}:{current}', f'{name}:{current - 1}', (now % window) / window
+
+    def _sliding(self, current_count, previous_count, elapsed_fraction):
+        """Estimativa da janela deslizante a partir das janelas fixas atual e anterior"""
+        return current_count + previous_count * (1 - elapsed_fraction)
+
+    def admit(self, ip, email):
+        """Decide se a tentativa pode seguir para a verificação da senha"""
+        now = time.time()
+
+        # Falhas recentes da conta (não incrementa: apenas falhas contam)
+        account = self._account(email)
+        current, previous, fraction = self._buckets(f'account:{account}', self.account_window, now)
+        current_count, previous_count = self._call('get_many', [current, previous])
+        if self._sliding(current_count, previous_count, fraction) >= self.account_limit:
+            return Decision(False, 'account', int(self.account_window * (1 - fraction)) + 1)
+
+        # Falhas recentes do IP (logins corretos não contam)
+        current, previous, fraction = self._buckets(f'ip:{ip}', self.ip_window, now)
+        current_count, previous_count = self._call('get_many', [current, previous])
+        if self._sliding(current_count, previous_count, fraction) >= self.ip_limit:
+            return Decision(False, 'ip', int(self.ip_window * (1 - fraction)) + 1)
+
+        # Orçamento global de verificações no segundo corrente
+        if self.budget_per_second:
+            second = int(now)
+            if self._call('incr', f'budget:{second}', 2) > self.budget_per_second:
+                return Decision(False, 'busy', 1)
+
+        return ALLOWED
+
+    def record_failure(self, ip, email):
+        """Conta uma falha de login (senha errada ou conta inexistente) para o IP e a conta"""
+        now = time.time()
+        current, _, _ = self._buckets(f'ip:{ip}', self.ip_window, now)
+        self._call('incr', current, self.ip_window * 2)
+        current, _, _ = self._buckets(f'account:{self._account(email)}', self.account_window, now)
+        self._call('incr', current, self.account_window * 2)
+
+    def record_success(self, email):
+        """Login correto: zera as falhas da conta"""
+        current, previous, _ = self._buckets(f'account:{self._account(email)}', self.account_window, time.time())
+        self._call('delete', [current, previous])
+
+
+login_guard = LoginGuard()
+
+
+def init_login_guard(app):
+    """Configura limites e o armazenamento compartilhado (Redis, se disponível)"""
+    store = None
+    redis_url = app.config.get('LOGIN_GUARD_REDIS_URL') or app.config.get('REDIS_URL')
+    pool = shared_pool_for(app, redis_url)
+    if pool is not None:
+        import redis
+        store = RedisCounterStore(redis.Redis(connection_pool=pool))
+    elif redis_url:
+        try:
+            import redis
+            store = RedisCounterStore(redis.from_url(redis_url, socket_timeout=0.5))
+        except ImportError:
+            print("Pacote redis não instalado; controle de login usará contadores locais")
+
+    login_guard.configure(
+        store=store,
+        ip_limit=app.config.get('LOGIN_IP_LIMIT', 20),
+        ip_window=app.config.get('LOGIN_IP_WINDOW', 300),
+        account_limit=app.config.get('LOGIN_ACCOUNT_LIMIT', 5),
+        account_window=app.config.get('LOGIN_ACCOUNT_WINDOW', 900),
+        budget_per_second=app.config.get('LOGIN_VERIFY_BUDGET', 20)
+    )
@@ -11,7 +11,9 @@ from cryptography.fernet import Fernet
 from cryptography.hazmat.primitives import hashes
 from cryptography.hazmat.primitives.kdf.pbkdf2 import PBKDF2HMAC
 from models import Message, Attachment, User, Room
+from archive import message_archive
 from flask import current_app
+from sqlalchemy import or_
 from flask_login import current_user
 
 class MessageEncryption:
@@ -66,13 +68,24 @@ class MessageHandler:
             else:
                 encrypted_content = content
             
+            created_at = datetime.utcnow()
+            
+            # Avançar a sequência da sala (cabeça) e a atividade; o UPDATE bloqueia
+            # a linha da sala até o commit, então a sequência lida é exclusiva
+            self.db.query(Room).filter(Room.id == room_id).update(
+                {Room.message_seq: Room.message_seq + 1, Room.last_message_at: created_at},
+                synchronize_session=False
+            )
+            seq = self.db.query(Room.message_seq).filter(Room.id == room_id).scalar()
+            
             message = Message(
                 room_id=room_id,
                 user_id=user_id,
                 content=content,  # Conteúdo original para exibição
                 encrypted_content=encrypted_content,  # Conteúdo criptografado
                 attachment_path=attachment_path,
-                created_at=datetime.utcnow()
+                seq=seq,
+                created_at=created_at
             )
             
             self.db.add(message)
@@ -230,5 +243,43 @@ def format_message_for_socket(message, user):
             'email': user.email
         },
         'created_at': message.created_at.isoformat(),
+        'seq': message.seq,
         'attachment': attachment_data
     }
+
+def get_history_page(db_session, room_id, page=1, per_page=50, before=None, since=None, before_id=None):
+    """Página do histórico (mais recentes primeiro) já formatada para o cliente.
+    
+    O cursor (`before`, `before_id`) é o par (created_at, id) da mensagem mais
+    antiga já exibida e substitui o deslocamento por página; o id desempata
+    mensagens com o mesmo horário (sem ele, vale apenas created_at < before).
+    `since` (criação da sala) é o limite inferior. Com `messages`
+    particionada por mês, os limites restringem a consulta às partições do
+    intervalo. Quando a tabela acaba, a página é completada com mensagens
+    arquivadas (archive.py), marcadas com `archived`.
+    """
+    query = db_session.query(Message, User).join(User, User.id == Message.user_id)\
+        .filter(Message.room_id == room_id)
+    if since is not None:
+        query = query.filter(Message.created_at >= since)
+    if before is not None and before_id is not None:
+        # (created_at, id) < (before, before_id); o `<=` mantém o limite das partições
+        query = query.filter(Message.created_at <= before,
+                             or_(Message.created_at < before, Message.id < before_id))
+    elif before is not None:
+        query = query.filter(Message.created_at < before)
+    query = query.order_by(Message.created_at.desc(), Message.id.desc())
+    if before is None:
+        query = query.offset((page - 1) * per_page)
+    rows = query.limit(per_page).all()
+    
+    formatted_messages = [format_message_for_socket(message, user) for message, user in rows]
+    
+    # Paginação por deslocamento só alcança o arquivo a partir da primeira página
+    if len(rows) < per_page and message_archive.enabled and (before is not None or page == 1):
+        if rows:
+            before, before_id = rows[-1][0].created_at, rows[-1][0].id
+        records = message_archive.read_before(db_session, room_id, before, per_page - len(rows), before_id)
+        formatted_messages.extend(message_archive.format_records(db_session, records))
+    
+    return formatted_messages, len(formatted_messages) == per_page
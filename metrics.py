@@ -0,0 +1,211 @@
+#!/usr/bin/env python3
+"""
+Métricas Prometheus dos caminhos críticos.
+
+Se `prometheus_client` não estiver instalado as métricas viram objetos
+vazios e a aplicação funciona normalmente.
+
+Com vários workers, defina PROMETHEUS_MULTIPROC_DIR (diretório vazio a
+cada inicialização) antes de iniciar os processos: cada worker grava seus
+valores em arquivos e qualquer um deles expõe a soma em /metrics.
+"""
+
+import os
+from contextlib import nullcontext
+from flask import Response
+
+try:
+    from prometheus_client import (
+        CollectorRegistry, Counter, Gauge, Histogram, REGISTRY,
+        CONTENT_TYPE_LATEST, generate_latest, start_http_server
+    )
+    from prometheus_client import multiprocess
+    PROMETHEUS_AVAILABLE = True
+except ImportError:
+    PROMETHEUS_AVAILABLE = False
+
+MULTIPROCESS = PROMETHEUS_AVAILABLE and bool(os.environ.get('PROMETHEUS_MULTIPROC_DIR'))
+
+
+class _NoopMetric:
+    """Substituto quando prometheus_client não está disponível"""
+
+    def labels(self, *args, **kwargs):
+        return self
+
+    def inc(self, amount=1):
+        pass
+
+    def dec(self, amount=1):
+        pass
+
+    def set(self, value):
+        pass
+
+    def observe(self, value):
+        pass
+
+    def time(self):
+        return nullcontext()
+
+
+def _histogram(name, documentation, labelnames=(), buckets=None):
+    if not PROMETHEUS_AVAILABLE:
+        return _NoopMetric()
+    if buckets:
+        return Histogram(name, documentation, labelnames, buckets=buckets)
+    return Histogram(name, documentation, labelnames)
+
+
+def _counter(name, documentation, labelnames=()):
+    if not PROMETHEUS_AVAILABLE:
+        return _NoopMetric()
+    return Counter(name, documentation, labelnames)
+
+
+def _gauge(name, documentation, labelnames=(), multiprocess_mode='livesum'):
+    if not PROMETHEUS_AVAILABLE:
+        return _NoopMetric()
+    return Gauge(name, documentation, labelnames, multiprocess_mode=multiprocess_mode)
+
+
+message_send_seconds = _histogram(
+    'chat_message_send_seconds',
+    'Tempo para gravar e distribuir uma mensagem',
+    ['transport'],
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5)
+)
+
+room_fanout_members = _histogram(
+    'chat_room_fanout_members',
+    'Membros notificados por mensagem enviada',
+    buckets=(1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500)
+)
+
+# 'liveall' mantém um valor por worker (rótulo pid) apenas para processos vivos
+socket_connections = _gauge(
+    'chat_socket_connections',
+    'Conexões Socket.IO abertas no worker',
+    multiprocess_mode='liveall'
+)
+
+db_query_seconds = _histogram(
+    'chat_db_query_seconds',
+    'Latência das consultas ao banco por rota (medida em query_profiler)',
+    ['endpoint'],
+    buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5)
+)
+
+db_queries_per_context = _histogram(
+    'chat_db_queries_per_context',
+    'Consultas por requisição HTTP ou evento Socket.IO',
+    ['endpoint'],
+    buckets=(0, 1, 2, 5, 10, 20, 50, 100, 250)
+)
+
+cache_requests = _counter(
+    'chat_cache_requests_total',
+    'Consultas aos caches em memória',
+    ['cache', 'result']
+)
+
+outbox_depth = _gauge(
+    'chat_outbox_depth',
+    'Itens aguardando gravação em segundo plano',
+    ['buffer']
+)
+
+upload_bytes = _counter(
+    'chat_upload_bytes_total',
+    'Bytes recebidos em uploads',
+    ['kind']
+)
+
+db_pool_connections = _gauge(
+    'chat_db_pool_connections',
+    'Conexões do pool do banco',
+    ['state']
+)
+
+db_pool_wait_seconds = _histogram(
+    'chat_db_pool_wait_seconds',
+    'Espera por uma conexão livre no pool do banco',
+    buckets=(0.0005, 0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5)
+)
+
+db_pool_timeouts = _counter(
+    'chat_db_pool_timeouts_total',
+    'Pedidos de conexão ao banco recusados por pool esgotado'
+)
+
+db_replica_lag_seconds = _gauge(
+    'chat_db_replica_lag_seconds',
+    'Atraso de replicação medido em cada réplica',
+    ['replica'],
+    multiprocess_mode='max'
+)
+
+db_reads_routed = _counter(
+    'chat_db_reads_routed_total',
+    'Consultas de rotas somente leitura por destino (primary = sem réplica saudável)',
+    ['target']
+)
+
+redis_pool_connections = _gauge(
+    'chat_redis_pool_connections',
+    'Conexões do pool Redis compartilhado',
+    ['state']
+)
+
+redis_pool_wait_seconds = _histogram(
+    'chat_redis_pool_wait_seconds',
+    'Espera por uma conexão livre no pool Redis',
+    buckets=(0.0005, 0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5)
+)
+
+redis_pool_timeouts = _counter(
+    'chat_redis_pool_timeouts_total',
+    'Pedidos de conexão Redis recusados por pool esgotado'
+)
+
+
+def record_upload(kind, file_path):
+    """Contabiliza o tamanho de um arquivo recebido"""
+    try:
+        upload_bytes.labels(kind).inc(os.path.getsize(file_path))
+    except OSError:
+        pass
+
+
+def _registry():
+    """Registro a expor: agregado de todos os workers em modo multiprocesso"""
+    if MULTIPROCESS:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return registry
+    return REGISTRY
+
+
+def mark_worker_dead(pid):
+    """Descarta as séries 'live' de um worker encerrado (hook do gerenciador de processos)"""
+    if MULTIPROCESS:
+        multiprocess.mark_process_dead(pid)
+
+
+def init_metrics(app):
+    """Registra /metrics e, se configurado, o servidor dedicado em METRICS_PORT"""
+    if not app.config.get('ENABLE_METRICS') or not PROMETHEUS_AVAILABLE:
+        return
+
+    @app.route('/metrics')
+    def metrics():
+        """Métricas no formato de exposição do Prometheus"""
+        return Response(generate_latest(_registry()), mimetype=CONTENT_TYPE_LATEST)
+
+    port = app.config.get('METRICS_PORT')
+    if port:
+        try:
+            start_http_server(int(port), registry=_registry())
+        except OSError:
+            # Outro worker já atende nesta porta; em modo multiprocesso ele expõe todos
+            pass
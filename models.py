@@ -1,7 +1,7 @@
 from datetime import datetime
 from sqlalchemy import (
-    Column, Integer, String, DateTime, Boolean, ForeignKey, Text, LargeBinary,
-    UniqueConstraint, Index
+    Column, Integer, String, DateTime, Date, BigInteger, Boolean, ForeignKey, Text, LargeBinary,
+    UniqueConstraint, Index, func
 )
 from sqlalchemy.orm import declarative_base, relationship
 from flask_login import UserMixin
@@ -17,7 +17,7 @@ class User(Base, UserMixin):
     password_hash = Column(String(255), nullable=False)
     is_admin = Column(Boolean, default=False)  # Campo para identificar administradores
     created_at = Column(DateTime, default=datetime.utcnow)
-    last_seen = Column(DateTime, default=datetime.utcnow)
+    last_seen = Column(DateTime, default=datetime.utcnow, index=True)
     is_active = Column(Boolean, default=True)
     
     # Relacionamentos
@@ -42,11 +42,20 @@ class Room(Base):
     allow_videos = Column(Boolean, default=True)
     created_at = Column(DateTime, default=datetime.utcnow)
     creator_id = Column(Integer, ForeignKey('users.id'), nullable=False)
+    last_message_at = Column(DateTime, nullable=True)  # Atualizado a cada nova mensagem
+    message_seq = Column(Integer, default=0, nullable=False)  # Sequência da última mensagem (cabeça)
+    
+    __table_args__ = (
+        Index('ix_rooms_private_last_message', 'is_private', 'last_message_at'),
+        Index('ix_rooms_name_lower', func.lower(name)),
+    )
     
     # Relacionamentos
     creator = relationship('User', back_populates='rooms_created')
     members = relationship('RoomMember', back_populates='room', cascade='all, delete-orphan')
-    messages = relationship('Message', back_populates='room', cascade='all, delete-orphan')
+    # passive_deletes: a exclusão da sala remove as mensagens em massa (rooms_routes.delete)
+    # em vez de carregá-las de todas as partições
+    messages = relationship('Message', back_populates='room', cascade='all, delete-orphan', passive_deletes=True)
     invites = relationship('RoomInvite', back_populates='room', cascade='all, delete-orphan')
     access_requests = relationship('AccessRequest', back_populates='room', cascade='all, delete-orphan')
     advertisements = relationship('Advertisement', back_populates='room', cascade='all, delete-orphan')
@@ -59,6 +68,12 @@ class RoomMember(Base):
     user_id = Column(Integer, ForeignKey('users.id'), nullable=False)
     role = Column(String(20), default='member')  # creator, admin, member
     joined_at = Column(DateTime, default=datetime.utcnow)
+    last_read_seq = Column(Integer, default=0, nullable=False)  # Última mensagem lida
+    
+    __table_args__ = (
+        Index('ix_room_members_user_room', 'user_id', 'room_id'),
+        Index('ix_room_members_room', 'room_id'),
+    )
     
     # Relacionamentos
     room = relationship('Room', back_populates='members')
@@ -90,9 +105,14 @@ class Message(Base):
     content = Column(Text, nullable=False)
     attachment_path = Column(String(255))
     encrypted_content = Column(Text)
+    seq = Column(Integer)  # Sequência da mensagem dentro da sala
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
+    __table_args__ = (
+        Index('ix_messages_room_created', 'room_id', 'created_at'),
+    )
+    
     # Relacionamentos
     room = relationship('Room', back_populates='messages')
     user = relationship('User', back_populates='messages')
@@ -125,6 +145,10 @@ class AccessRequest(Base):
     processed_by = Column(Integer, ForeignKey('users.id'), nullable=True)
     notes = Column(Text, nullable=True)
     
+    __table_args__ = (
+        Index('ix_access_requests_user_status_room', 'user_id', 'status', 'room_id'),
+    )
+    
     # Relacionamentos
     room = relationship('Room', back_populates='access_requests')
     user = relationship('User', foreign_keys=[user_id], back_populates='access_requests')
@@ -161,6 +185,8 @@ class Advertisement(Base):
     
     room = relationship('Room', back_populates='advertisements')
     creator = relationship('User', back_populates='created_advertisements')
+    stats = relationship('AdStatHourly', back_populates='advertisement',
+                         cascade='all, delete-orphan', passive_deletes=True)
     
     @property
     def is_expired(self):
@@ -184,6 +210,17 @@ class Advertisement(Base):
         return max(0, delta.days)
 
 
+class AdStatHourly(Base):
+    """Impressões e cliques de anúncios agregados por hora"""
+    __tablename__ = 'ad_stats_hourly'
+    ad_id = Column(Integer, ForeignKey('advertisements.id', ondelete='CASCADE'), primary_key=True)
+    hour = Column(DateTime, primary_key=True)  # Início da hora (UTC)
+    impressions = Column(Integer, default=0, nullable=False)
+    clicks = Column(Integer, default=0, nullable=False)
+    
+    advertisement = relationship('Advertisement', back_populates='stats')
+
+
 class AdminMessage(Base):
     """Mensagens globais do administrador exibidas em todas as salas"""
     __tablename__ = 'admin_messages'
@@ -221,3 +258,51 @@ class AdminMessage(Base):
             return 0
         delta = self.end_date - datetime.utcnow()
         return max(0, delta.days)
+
+
+class StatCounter(Base):
+    """Totais mantidos incrementalmente (ex.: total de mensagens, mensagens por sala)"""
+    __tablename__ = 'stat_counters'
+    scope = Column(String(40), primary_key=True)  # users, rooms, messages, room_messages, user_messages...
+    scope_id = Column(Integer, primary_key=True, default=0)  # 0 para totais globais
+    value = Column(BigInteger, default=0, nullable=False)
+    
+    __table_args__ = (
+        Index('ix_stat_counters_scope_value', 'scope', 'value'),
+    )
+
+
+class DailyStat(Base):
+    """Contagens diárias mantidas incrementalmente (por sala, por usuário e globais)"""
+    __tablename__ = 'daily_stats'
+    scope = Column(String(40), primary_key=True)  # messages, room_messages, user_messages
+    scope_id = Column(Integer, primary_key=True, default=0)
+    day = Column(Date, primary_key=True)
+    value = Column(BigInteger, default=0, nullable=False)
+
+
+class ArchiveSegment(Base):
+    """Segmento de mensagens antigas arquivadas fora da tabela messages.
+    
+    O arquivo (NDJSON comprimido em blocos independentes) guarda as mensagens
+    da sala em ordem cronológica; `blocks` indexa cada bloco para leitura
+    direta: [[offset, tamanho, created_at do primeiro item, quantidade], ...].
+    """
+    __tablename__ = 'archive_segments'
+    
+    id = Column(Integer, primary_key=True)
+    room_id = Column(Integer, ForeignKey('rooms.id'), nullable=False)
+    path = Column(String(255), nullable=False)  # relativo a ARCHIVE_DIR
+    codec = Column(String(10), nullable=False)  # zstd ou gzip
+    first_created_at = Column(DateTime, nullable=False)
+    last_created_at = Column(DateTime, nullable=False)
+    first_seq = Column(Integer)
+    last_seq = Column(Integer)
+    message_count = Column(Integer, nullable=False)
+    size_bytes = Column(BigInteger, nullable=False)
+    blocks = Column(Text, nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    
+    __table_args__ = (
+        Index('ix_archive_segments_room_last', 'room_id', 'last_created_at'),
+    )
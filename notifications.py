@@ -0,0 +1,41 @@
+#!/usr/bin/env python3
+"""
+Notificações em tempo real por usuário.
+
+Toda conexão autenticada entra no canal `user:<id>`; o servidor envia
+eventos compactos para todos os dispositivos do usuário. Com uma fila de
+mensagens configurada (SOCKETIO_MESSAGE_QUEUE) os eventos chegam às
+conexões de qualquer worker.
+"""
+
+from flask import current_app
+from flask_login import current_user
+from flask_socketio import join_room
+
+
+def user_channel(user_id):
+    """Nome do canal Socket.IO exclusivo do usuário"""
+    return f'user:{user_id}'
+
+
+def join_user_channel():
+    """Inscreve a conexão atual no canal do usuário autenticado"""
+    if current_user.is_authenticated:
+        join_room(user_channel(current_user.id))
+
+
+def emit_to_user(user_id, event, payload, socketio=None, skip_sid=None):
+    """Emite um evento para todas as conexões de um usuário"""
+    socketio = socketio or current_app.extensions['socketio']
+    socketio.emit(event, payload, to=user_channel(user_id), namespace='/', skip_sid=skip_sid)
+
+
+def notify_user(user_id, kind, socketio=None, **data):
+    """Envia uma notificação compacta (`{'type': kind, ...}`) a um usuário"""
+    emit_to_user(user_id, 'notification', dict(data, type=kind), socketio=socketio)
+
+
+def notify_users(user_ids, kind, socketio=None, **data):
+    """Envia a mesma notificação a vários usuários"""
+    for user_id in user_ids:
+        notify_user(user_id, kind, socketio=socketio, **data)
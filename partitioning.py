@@ -0,0 +1,237 @@
+#!/usr/bin/env python3
+"""
+Particionamento mensal da tabela `messages` no Postgres (opcional).
+
+Usa o particionamento declarativo do Postgres (`PARTITION BY RANGE
+(created_at)`), uma partição por mês: `messages_y2026m10` guarda
+[2026-10-01, 2026-11-01). O modelo ORM não muda; a conversão é feita uma
+vez pelo comando abaixo e, a partir daí, a aplicação cria as partições dos
+próximos meses em segundo plano.
+
+Consultas com limites em `created_at` (histórico paginado por cursor,
+exclusão de sala a partir da data de criação) só tocam as partições do
+intervalo. Um mês antigo sai da tabela em tempo constante com
+`DETACH PARTITION` e vira uma tabela comum, pronta para arquivamento.
+
+Restrições do particionamento declarativo:
+* a chave primária passa a ser (id, created_at);
+* `attachments.message_id` deixa de ter FOREIGN KEY no banco (o Postgres
+  exige que a chave referenciada inclua a coluna de partição). A exclusão
+  de uma sala remove os anexos explicitamente antes das mensagens
+  (rooms_routes.delete); as FOREIGN KEYs de `room_id` e `user_id`, que o
+  `CREATE TABLE ... (LIKE ...)` não copia, são recriadas na conversão.
+
+Uso:
+    python partitioning.py convert --database postgresql://...   # uma vez
+    python partitioning.py ensure  --database postgresql://... --months-ahead 3
+    python partitioning.py list    --database postgresql://...
+    python partitioning.py detach  --database postgresql://... --month 2025-01
+"""
+
+import argparse
+import sys
+from datetime import date, datetime
+from sqlalchemy import create_engine, text
+from background import start_periodic_task
+
+TABLE = 'messages'
+DEFAULT_PARTITION = 'messages_default'
+
+
+def month_start(value):
+    return date(value.year, value.month, 1)
+
+
+def add_months(value, months):
+    index = value.year * 12 + value.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def partition_name(month):
+    return f'{TABLE}_y{month.year}m{month.month:02d}'
+
+
+def is_partitioned(conn):
+    """True se `messages` já é uma tabela particionada"""
+    if conn.dialect.name != 'postgresql':
+        return False
+    return bool(conn.execute(text(
+        "SELECT 1 FROM pg_partitioned_table p JOIN pg_class c ON c.oid = p.partrelid "
+        "WHERE c.relname = :table AND pg_table_is_visible(c.oid)"
+    ), {'table': TABLE}).scalar())
+
+
+def list_partitions(conn):
+    """Partições mensais anexadas: [(nome, início, fim)] em ordem cronológica"""
+    rows = conn.execute(text(
+        "SELECT c.relname, pg_get_expr(c.relpartbound, c.oid) FROM pg_inherits i "
+        "JOIN pg_class c ON c.oid = i.inhrelid JOIN pg_class p ON p.oid = i.inhparent "
+        "WHERE p.relname = :table AND pg_table_is_visible(p.oid) ORDER BY c.relname"
+    ), {'table': TABLE}).all()
+    partitions = []
+    for name, bound in rows:
+        if name == DEFAULT_PARTITION:
+            continue
+        # FOR VALUES FROM ('2026-10-01 00:00:00') TO ('2026-11-01 00:00:00')
+        start, end = [part.split("'")[1][:10] for part in bound.split(' TO ')]
+        partitions.append((name, date.fromisoformat(start), date.fromisoformat(end)))
+    return partitions
+
+
+def create_partition(conn, month):
+    """Cria a partição do mês (sem efeito se já existir)"""
+    conn.execute(text(
+        f"CREATE TABLE IF NOT EXISTS {partition_name(month)} PARTITION OF {TABLE} "
+        f"FOR VALUES FROM ('{month.isoformat()}') TO ('{add_months(month, 1).isoformat()}')"
+    ))
+
+
+def ensure_partitions(conn, months_ahead=3, today=None):
+    """Garante as partições do mês corrente e dos próximos `months_ahead` meses"""
+    current = month_start(today or datetime.utcnow())
+    for offset in range(months_ahead + 1):
+        create_partition(conn, add_months(current, offset))
+
+
+def convert(conn, months_ahead=3):
+    """Converte `messages` em tabela particionada, copiando os dados existentes.
+
+    Executa em uma única transação (a tabela fica bloqueada durante a cópia).
+    """
+    if is_partitioned(conn):
+        print("messages já está particionada")
+        return False
+
+    conn.execute(text(f"LOCK TABLE {TABLE} IN ACCESS EXCLUSIVE MODE"))
+    conn.execute(text("ALTER TABLE attachments DROP CONSTRAINT IF EXISTS attachments_message_id_fkey"))
+    conn.execute(text(f"ALTER TABLE {TABLE} RENAME TO {TABLE}_unpartitioned"))
+    conn.execute(text("ALTER INDEX IF EXISTS ix_messages_room_created RENAME TO ix_messages_room_created_old"))
+
+    conn.execute(text(
+        f"CREATE TABLE {TABLE} (LIKE {TABLE}_unpartitioned INCLUDING DEFAULTS) "
+        f"PARTITION BY RANGE (created_at)"
+    ))
+    conn.execute(text(f"ALTER TABLE {TABLE} ALTER COLUMN created_at SET NOT NULL"))
+    conn.execute(text(f"ALTER TABLE {TABLE} ADD PRIMARY KEY (id, created_at)"))
+    conn.execute(text(f"CREATE INDEX ix_messages_room_created ON {TABLE} (room_id, created_at)"))
+    # LIKE não copia FOREIGN KEYs; as de saída são aceitas em tabelas particionadas (Postgres 12+)
+    conn.execute(text(f"ALTER TABLE {TABLE} ADD CONSTRAINT messages_room_id_fkey "
+                      f"FOREIGN KEY (room_id) REFERENCES rooms (id)"))
+    conn.execute(text(f"ALTER TABLE {TABLE} ADD CONSTRAINT messages_user_id_fkey "
+                      f"FOREIGN KEY (user_id) REFERENCES users (id)"))
+    conn.execute(text(f"CREATE TABLE {DEFAULT_PARTITION} PARTITION OF {TABLE} DEFAULT"))
+
+    # Partições do mês mais antigo até os próximos meses
+    oldest = conn.execute(text(f"SELECT min(created_at) FROM {TABLE}_unpartitioned")).scalar()
+    current = month_start(datetime.utcnow())
+    month = month_start(oldest) if oldest else current
+    while month <= add_months(current, months_ahead):
+        create_partition(conn, month)
+        month = add_months(month, 1)
+
+    # created_at nulo (linhas antigas) não tem partição: usa updated_at ou agora
+    conn.execute(text(
+        f"INSERT INTO {TABLE} (id, room_id, user_id, content, attachment_path, encrypted_content, "
+        f"seq, created_at, updated_at) "
+        f"SELECT id, room_id, user_id, content, attachment_path, encrypted_content, "
+        f"seq, COALESCE(created_at, updated_at, now()), updated_at FROM {TABLE}_unpartitioned"
+    ))
+
+    # A sequência do id passa a pertencer à nova tabela
+    sequence = conn.execute(text("SELECT pg_get_serial_sequence(:table, 'id')"),
+                            {'table': f'{TABLE}_unpartitioned'}).scalar()
+    if sequence:
+        conn.execute(text(f"ALTER SEQUENCE {sequence} OWNED BY {TABLE}.id"))
+    conn.execute(text(f"DROP TABLE {TABLE}_unpartitioned"))
+    conn.execute(text(f"ANALYZE {TABLE}"))
+    return True
+
+
+def detach_partition(conn, month, concurrently=False):
+    """Desanexa a partição do mês (tempo constante) e retorna o nome da tabela.
+
+    A tabela continua no banco com os dados; depois de arquivada pode ser
+    removida com DROP TABLE.
+    """
+    name = partition_name(month_start(month))
+    # CONCURRENTLY (Postgres 14+) não bloqueia leituras, mas não roda dentro de transação
+    suffix = ' CONCURRENTLY' if concurrently else ''
+    conn.execute(text(f"ALTER TABLE {TABLE} DETACH PARTITION {name}{suffix}"))
+    return name
+
+
+class PartitionMaintainer:
+    """Cria as partições futuras periodicamente"""
+
+    def __init__(self, months_ahead=3):
+        self.months_ahead = months_ahead
+        self.enabled = False
+
+    def maintain(self, db_session):
+        if not self.enabled:
+            return
+        ensure_partitions(db_session.connection(), self.months_ahead)
+        db_session.commit()
+
+
+partition_maintainer = PartitionMaintainer()
+
+
+def init_partitioning(app, socketio):
+    """Mantém as partições futuras quando `messages` estiver particionada"""
+    partition_maintainer.months_ahead = app.config.get('MESSAGE_PARTITION_MONTHS_AHEAD', 3)
+    with app.app_context():
+        db = app.extensions['sqlalchemy']
+        try:
+            partition_maintainer.enabled = is_partitioned(db.session.connection())
+            partition_maintainer.maintain(db.session)
+        except Exception as e:
+            print(f"Erro ao verificar partições de mensagens: {e}")
+        finally:
+            db.session.remove()
+
+    if partition_maintainer.enabled:
+        start_periodic_task(
+            app, socketio, app.config.get('MESSAGE_PARTITION_CHECK_SECONDS', 6 * 3600),
+            partition_maintainer.maintain, 'criar partições de mensagens'
+        )
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Particionamento mensal de messages (Postgres)')
+    parser.add_argument('command', choices=('convert', 'ensure', 'list', 'detach'))
+    parser.add_argument('--database', required=True, help='URL postgresql://')
+    parser.add_argument('--months-ahead', type=int, default=3)
+    parser.add_argument('--month', help='mês a desanexar (AAAA-MM)')
+    parser.add_argument('--concurrently', action='store_true', help='DETACH ... CONCURRENTLY (Postgres 14+)')
+    args = parser.parse_args(argv)
+
+    engine = create_engine(args.database)
+    if engine.dialect.name != 'postgresql':
+        parser.error('particionamento disponível apenas no Postgres')
+
+    if args.command == 'detach':
+        if not args.month:
+            parser.error('informe --month AAAA-MM')
+        month = date.fromisoformat(f'{args.month}-01')
+        if args.concurrently:
+            with engine.connect().execution_options(isolation_level='AUTOCOMMIT') as conn:
+                print(f"Desanexada: {detach_partition(conn, month, concurrently=True)}")
+        else:
+            with engine.begin() as conn:
+                print(f"Desanexada: {detach_partition(conn, month)}")
+        return 0
+
+    with engine.begin() as conn:
+        if args.command == 'convert':
+            if convert(conn, args.months_ahead):
+                print("messages convertida para particionamento mensal")
+        elif args.command == 'ensure':
+            ensure_partitions(conn, args.months_ahead)
+        for name, start, end in list_partitions(conn):
+            print(f"{name}: {start} -> {end}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+"""
+Hash e verificação de senhas com Argon2 fora do loop de eventos.
+
+Cada operação Argon2 consome dezenas de milissegundos de CPU; executada
+direto no hub do eventlet ela congela todas as conexões do worker. Aqui
+as chamadas vão para o pool de threads nativas (`eventlet.tpool`) e um
+semáforo limita quantas rodam ao mesmo tempo, de modo que uma enxurrada
+de logins espera (ou é recusada) sem atrasar a entrega do chat.
+"""
+
+import threading
+from passlib.hash import argon2
+
+
+class PasswordHasherBusy(Exception):
+    """Limite de verificações simultâneas atingido"""
+
+
+class PasswordHasher:
+    """Argon2 com parâmetros configuráveis, execução delegada e concorrência limitada"""
+
+    def __init__(self):
+        self._hasher = argon2
+        self._offload = None
+        self._slots = threading.BoundedSemaphore(4)
+        self.wait_seconds = 5
+
+    def configure(self, time_cost=None, memory_cost=None, parallelism=None,
+                  max_concurrent=4, wait_seconds=5, offload=None, semaphore_class=None):
+        """Define os parâmetros do Argon2 e a política de execução"""
+        params = {name: value for name, value in (
+            ('time_cost', time_cost), ('memory_cost', memory_cost), ('parallelism', parallelism)
+        ) if value}
+        self._hasher = argon2.using(**params) if params else argon2
+        self._slots = (semaphore_class or threading.BoundedSemaphore)(max_concurrent)
+        self.wait_seconds = wait_seconds
+        self._offload = offload
+
+    def _run(self, func, *args):
+        if not self._slots.acquire(timeout=self.wait_seconds):
+            raise PasswordHasherBusy()
+        try:
+            if self._offload:
+                return self._offload(func, *args)
+            return func(*args)
+        finally:
+            self._slots.release()
+
+    def hash(self, password):
+        """Gera o hash com os parâmetros atuais"""
+        return self._run(self._hasher.hash, password)
+
+    def verify(self, password, password_hash):
+        """Verifica a senha"""
+        return self._run(self._hasher.verify, password, password_hash)
+
+    def verify_and_update(self, password, password_hash):
+        """Verifica a senha e retorna (válida, novo_hash).
+
+        `novo_hash` só é gerado quando o hash armazenado usa parâmetros
+        diferentes dos atuais (rehash transparente no login).
+        """
+        def verify_and_rehash():
+            if not self._hasher.verify(password, password_hash):
+                return False, None
+            if self._hasher.needs_update(password_hash):
+                return True, self._hasher.hash(password)
+            return True, None
+
+        return self._run(verify_and_rehash)
+
+
+password_hasher = PasswordHasher()
+
+
+def init_passwords(app, socketio):
+    """Aplica a configuração Argon2 e, no eventlet, delega ao pool de threads nativas"""
+    offload = None
+    semaphore_class = None
+    if app.config.get('ARGON2_OFFLOAD', True) and getattr(socketio, 'async_mode', None) == 'eventlet':
+        from eventlet import tpool
+        from eventlet.semaphore import BoundedSemaphore
+        offload = tpool.execute
+        # A espera pelo semáforo também não pode bloquear o hub
+        semaphore_class = BoundedSemaphore
+
+    password_hasher.configure(
+        time_cost=app.config.get('ARGON2_TIME_COST'),
+        memory_cost=app.config.get('ARGON2_MEMORY_COST'),
+        parallelism=app.config.get('ARGON2_PARALLELISM'),
+        max_concurrent=app.config.get('ARGON2_MAX_CONCURRENT', 4),
+        wait_seconds=app.config.get('ARGON2_WAIT_SECONDS', 5),
+        offload=offload,
+        semaphore_class=semaphore_class
+    )
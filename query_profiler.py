@@ -0,0 +1,171 @@
+#!/usr/bin/env python3
+"""
+Instrumentação das consultas SQL.
+
+Conta consultas e tempo de banco por requisição HTTP e por evento
+Socket.IO (cada um roda no seu próprio contexto da aplicação), registra
+consultas lentas com o plano de execução e, em modo debug, aponta
+consultas de mesmo formato repetidas na mesma requisição (padrão N+1).
+"""
+
+import logging
+import time
+from collections import Counter
+from flask import g, has_app_context, has_request_context, request
+from sqlalchemy import event
+from metrics import db_query_seconds, db_queries_per_context
+
+logger = logging.getLogger('chat.sql')
+
+
+class QueryStats:
+    """Consultas executadas no contexto atual"""
+
+    __slots__ = ('count', 'seconds', 'shapes')
+
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+        self.shapes = Counter()
+
+
+def context_label():
+    """Rota HTTP, evento Socket.IO ou 'background'"""
+    if not has_request_context():
+        return 'background'
+    if request.endpoint:
+        return request.endpoint
+    socket_event = getattr(request, 'event', None)
+    if socket_event:
+        return f"socket:{socket_event.get('message')}"
+    return 'socketio'
+
+
+def current_stats():
+    """Estatísticas do contexto atual (None fora de um contexto da aplicação)"""
+    if not has_app_context():
+        return None
+    stats = g.get('query_stats')
+    if stats is None:
+        stats = g.query_stats = QueryStats()
+    return stats
+
+
+def _explain(conn, cursor, statement, parameters):
+    """Plano de execução da consulta (SQLite e PostgreSQL)"""
+    if conn.dialect.name == 'sqlite':
+        prefix = 'EXPLAIN QUERY PLAN '
+    elif conn.dialect.name == 'postgresql':
+        prefix = 'EXPLAIN '
+    else:
+        return None
+
+    explain_cursor = cursor.connection.cursor()
+    try:
+        explain_cursor.execute(prefix + statement, parameters)
+        return '\n'.join(' '.join(str(column) for column in row) for row in explain_cursor.fetchall())
+    finally:
+        explain_cursor.close()
+
+
+class QueryProfiler:
+    """Ouvintes do engine e relatório ao fim de cada contexto"""
+
+    def __init__(self, slow_seconds=0.5, explain=True, detect_n_plus_one=False, repeat_threshold=5):
+        self.slow_seconds = slow_seconds
+        self.explain = explain
+        self.detect_n_plus_one = detect_n_plus_one
+        self.repeat_threshold = repeat_threshold
+
+    def install(self, engine):
+        event.listen(engine, 'before_cursor_execute', self.before_cursor_execute)
+        event.listen(engine, 'after_cursor_execute', self.after_cursor_execute)
+
+    def before_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault('query_start', []).append(time.perf_counter())
+
+    def after_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        starts = conn.info.get('query_start')
+        if not starts:
+            return
+        elapsed = time.perf_counter() - starts.pop()
+        label = context_label()
+        db_query_seconds.labels(label).observe(elapsed)
+
+        stats = current_stats()
+        if stats is not None:
+            stats.count += 1
+            stats.seconds += elapsed
+            if self.detect_n_plus_one:
+                # Parâmetros ficam fora do texto: mesmo texto = mesmo formato
+                stats.shapes[statement] += 1
+
+        if self.slow_seconds and elapsed >= self.slow_seconds:
+            self.log_slow_query(conn, cursor, statement, parameters, executemany, elapsed, label)
+
+    def log_slow_query(self, conn, cursor, statement, parameters, executemany, elapsed, label):
+        plan = None
+        if self.explain and not executemany and statement.lstrip().upper().startswith('SELECT'):
+            try:
+                plan = _explain(conn, cursor, statement, parameters)
+            except Exception as e:
+                plan = f'(EXPLAIN falhou: {e})'
+
+        logger.warning(
+            "Consulta lenta (%.1f ms) em %s\n%s\nparâmetros: %r%s",
+            elapsed * 1000, label, statement, parameters,
+            f"\nplano:\n{plan}" if plan else ''
+        )
+
+    def report(self, exc=None):
+        """Registra o total do contexto encerrado e aponta consultas repetidas"""
+        stats = g.pop('query_stats', None)
+        if stats is None:
+            return
+
+        label = context_label()
+        db_queries_per_context.labels(label).observe(stats.count)
+        logger.debug("%s: %d consultas, %.1f ms", label, stats.count, stats.seconds * 1000)
+
+        if self.detect_n_plus_one:
+            repeated = [(statement, count) for statement, count in stats.shapes.most_common()
+                        if count >= self.repeat_threshold]
+            for statement, count in repeated:
+                logger.warning(
+                    "Possível N+1 em %s: consulta repetida %d vezes (%d consultas, %.1f ms no total)\n%s",
+                    label, count, stats.count, stats.seconds * 1000, statement
+                )
+
+
+def init_query_profiler(app):
+    """Instala a instrumentação no engine da aplicação"""
+    detect_n_plus_one = app.config.get('QUERY_DETECT_N_PLUS_ONE')
+    if detect_n_plus_one is None:
+        detect_n_plus_one = app.debug
+
+    profiler = QueryProfiler(
+        slow_seconds=app.config.get('SLOW_QUERY_SECONDS', 0.5),
+        explain=app.config.get('SLOW_QUERY_EXPLAIN', True),
+        detect_n_plus_one=detect_n_plus_one,
+        repeat_threshold=app.config.get('QUERY_REPEAT_THRESHOLD', 5)
+    )
+
+    with app.app_context():
+        profiler.install(app.extensions['sqlalchemy'].engine)
+
+    @app.after_request
+    def add_query_timing(response):
+        """Resumo do banco no cabeçalho Server-Timing"""
+        stats = g.get('query_stats')
+        if stats is not None and stats.count:
+            response.headers.add(
+                'Server-Timing',
+                f'db;dur={stats.seconds * 1000:.1f};desc="{stats.count} queries"'
+            )
+        return response
+
+    # Requisições e eventos Socket.IO encerram no teardown_request (o rótulo
+    # ainda está disponível); tarefas em segundo plano, no teardown_appcontext
+    app.teardown_request(profiler.report)
+    app.teardown_appcontext(profiler.report)
+    return profiler
@@ -0,0 +1,207 @@
+#!/usr/bin/env python3
+"""
+Pool de conexões Redis compartilhado pela aplicação.
+
+Cada processo mantém um único `BlockingConnectionPool` (REDIS_URL) usado
+pelo health check, rate limiter, sessões, controle de login e pela
+publicação na fila do Socket.IO. O tamanho é fixo (REDIS_MAX_CONNECTIONS):
+quando todas as conexões estão ocupadas o pedido espera até
+REDIS_POOL_TIMEOUT segundos em vez de abrir uma conexão nova.
+
+Ocupação, espera e recusas do pool são exportadas em
+`chat_redis_pool_connections{state}`, `chat_redis_pool_wait_seconds` e
+`chat_redis_pool_timeouts_total`.
+"""
+
+import threading
+import time
+import uuid
+from flask import current_app
+from metrics import redis_pool_connections, redis_pool_wait_seconds, redis_pool_timeouts
+
+try:
+    import redis
+    REDIS_AVAILABLE = True
+except ImportError:
+    REDIS_AVAILABLE = False
+
+
+if REDIS_AVAILABLE:
+    class InstrumentedConnectionPool(redis.BlockingConnectionPool):
+        """BlockingConnectionPool que mede ocupação e tempo de espera"""
+
+        def __init__(self, *args, **kwargs):
+            self._stats_lock = threading.Lock()
+            self.in_use = 0
+            super().__init__(*args, **kwargs)
+
+        def reset(self):
+            # Também chamado após fork: as conexões do processo pai não contam
+            super().reset()
+            with self._stats_lock:
+                self.in_use = 0
+            self._update_gauges()
+
+        def _update_gauges(self):
+            created = len(getattr(self, '_connections', ()))
+            redis_pool_connections.labels('in_use').set(self.in_use)
+            redis_pool_connections.labels('idle').set(max(created - self.in_use, 0))
+            redis_pool_connections.labels('max').set(self.max_connections)
+
+        def get_connection(self, *args, **kwargs):
+            start = time.monotonic()
+            try:
+                connection = super().get_connection(*args, **kwargs)
+            except redis.ConnectionError:
+                if self.timeout is not None and time.monotonic() - start >= self.timeout:
+                    redis_pool_timeouts.inc()
+                raise
+            # Inclui o tempo de abrir a conexão quando o pool ainda não tinha uma pronta
+            redis_pool_wait_seconds.observe(time.monotonic() - start)
+            with self._stats_lock:
+                self.in_use += 1
+            self._update_gauges()
+            return connection
+
+        def release(self, connection):
+            super().release(connection)
+            with self._stats_lock:
+                self.in_use = max(self.in_use - 1, 0)
+            self._update_gauges()
+
+        def stats(self):
+            """Ocupação atual do pool"""
+            created = len(getattr(self, '_connections', ()))
+            return {
+                'max': self.max_connections,
+                'in_use': self.in_use,
+                'idle': max(created - self.in_use, 0)
+            }
+
+
+def init_redis(app):
+    """Cria o pool compartilhado a partir de REDIS_URL (None se não configurado)"""
+    url = app.config.get('REDIS_URL')
+    app.extensions['redis'] = None
+    if not url:
+        return None
+    if not REDIS_AVAILABLE:
+        print("Pacote redis não instalado; REDIS_URL ignorado")
+        return None
+
+    pool = InstrumentedConnectionPool.from_url(
+        url,
+        max_connections=app.config.get('REDIS_MAX_CONNECTIONS', 50),
+        timeout=app.config.get('REDIS_POOL_TIMEOUT', 1),
+        socket_timeout=app.config.get('REDIS_SOCKET_TIMEOUT', 1),
+        socket_connect_timeout=app.config.get('REDIS_CONNECT_TIMEOUT', 1),
+        health_check_interval=app.config.get('REDIS_HEALTH_CHECK_INTERVAL', 30)
+    )
+    client = redis.Redis(connection_pool=pool)
+    app.extensions['redis'] = client
+    return client
+
+
+def get_redis(app=None):
+    """Cliente do pool compartilhado (None sem Redis)"""
+    app = app or current_app
+    return app.extensions.get('redis')
+
+
+def shared_pool_for(app, url=None):
+    """Pool compartilhado, se `url` não foi informada ou aponta para o mesmo Redis"""
+    client = get_redis(app)
+    if client is None:
+        return None
+    if url and url != app.config.get('REDIS_URL'):
+        return None
+    return client.connection_pool
+
+
+def subscriber(app):
+    """PubSub com conexão própria (fora do pool) e sem timeout de leitura"""
+    url = app.config.get('REDIS_URL')
+    if not url or not REDIS_AVAILABLE:
+        return None
+    listener = redis.Redis.from_url(
+        url,
+        socket_timeout=None,
+        socket_connect_timeout=app.config.get('REDIS_CONNECT_TIMEOUT', 1)
+    )
+    return listener.pubsub(ignore_subscribe_messages=True)
+
+
+# Renova a posse se ainda for do processo; senão tenta tomá-la
+LEASE_SCRIPT = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('pexpire', KEYS[1], ARGV[2])
+end
+if redis.call('set', KEYS[1], ARGV[1], 'NX', 'PX', ARGV[2]) then
+    return 1
+end
+return 0
+"""
+
+
+class LeaderLock:
+    """Posse temporária no Redis: um único processo executa a tarefa por vez.
+
+    O dono chama `acquire()` a cada ciclo (bem abaixo de `ttl`) para renovar;
+    se ele parar, outro processo assume quando a posse expira. Sem Redis o
+    próprio processo é sempre o dono; se o Redis falhar, ninguém é.
+    """
+
+    def __init__(self, name, ttl=5):
+        self.key = f'leader:{name}'
+        self.ttl = ttl
+        self.token = uuid.uuid4().hex
+        self.redis = None
+
+    def acquire(self):
+        if self.redis is None:
+            return True
+        try:
+            return bool(self.redis.eval(LEASE_SCRIPT, 1, self.key, self.token, int(self.ttl * 1000)))
+        except Exception as e:
+            print(f"Erro ao renovar posse {self.key} no Redis: {e}")
+            return False
+
+
+def limiter_options(app):
+    """Argumentos do Flask-Limiter: armazenamento no Redis pelo pool compartilhado"""
+    url = app.config.get('RATELIMIT_STORAGE_URL')
+    if not url:
+        return {}
+    options = {'storage_uri': url}
+    pool = shared_pool_for(app, url)
+    if pool is not None:
+        options['storage_options'] = {'connection_pool': pool}
+    return options
+
+
+def socketio_queue_options(app):
+    """Argumentos do SocketIO para a fila entre workers (SOCKETIO_MESSAGE_QUEUE).
+
+    As publicações usam o pool compartilhado. O assinante fica bloqueado
+    lendo o canal indefinidamente, então mantém uma conexão própria sem
+    timeout de leitura, fora do pool.
+    """
+    url = app.config.get('SOCKETIO_MESSAGE_QUEUE')
+    if not url:
+        return {}
+    pool = shared_pool_for(app, url)
+    if pool is None:
+        return {'message_queue': url}
+
+    import socketio
+
+    class SharedPoolRedisManager(socketio.RedisManager):
+        def _redis_connect(self):
+            self.redis = redis.Redis(connection_pool=pool)
+            listener = redis.Redis.from_url(self.redis_url, **{**self.redis_options, 'socket_timeout': None})
+            self.pubsub = listener.pubsub(ignore_subscribe_messages=True)
+            # Como na classe base: sem isso cada publicação reconectaria e
+            # trocaria o pubsub que a thread de escuta ainda está lendo
+            self.connected = True
+
+    return {'client_manager': SharedPoolRedisManager(url, channel='flask-socketio')}
@@ -0,0 +1,266 @@
+#!/usr/bin/env python3
+"""
+Sessões no servidor (Redis) compartilhadas entre workers.
+
+O cookie carrega apenas um identificador assinado; os dados ficam em
+`session:<sid>`. A sessão é lida do Redis somente quando acessada e gravada
+somente quando modificada, então requisições que não usam a sessão não
+custam nada além do cookie pequeno. Requisições que a leem apenas renovam
+a validade (EXPIRE), então usuários ativos não expiram em hora fixa.
+
+Cada sessão autenticada é registrada em `user_sessions:<user_id>`, o que
+permite encerrar todas as sessões de um usuário em qualquer worker.
+"""
+
+import secrets
+from datetime import timedelta
+from flask import session as flask_session
+from flask.json.tag import TaggedJSONSerializer
+from flask.sessions import SessionInterface, SessionMixin
+from flask_login import user_logged_in
+from itsdangerous import BadSignature, Signer
+from redis_pool import shared_pool_for
+
+# Chave usada pelo Flask-Login para o id do usuário na sessão
+USER_ID_KEY = '_user_id'
+
+
+class RedisSession(SessionMixin):
+    """Sessão carregada sob demanda"""
+
+    def __init__(self, interface, sid, new=False):
+        self.sid = sid
+        self.new = new
+        self.modified = False
+        self.accessed = False
+        self._interface = interface
+        self._data = {} if new else None
+
+    @property
+    def loaded(self):
+        return self._data is not None
+
+    def _mapping(self):
+        self.accessed = True
+        if self._data is None:
+            self._data = self._interface.load(self.sid)
+            if self._data is None:
+                # Sessão expirada ou revogada: recomeça com outro identificador
+                self._data = {}
+                self.sid = self._interface.generate_sid()
+                self.new = True
+        return self._data
+
+    def __getitem__(self, key):
+        return self._mapping()[key]
+
+    def __setitem__(self, key, value):
+        self._mapping()[key] = value
+        self.modified = True
+
+    def __delitem__(self, key):
+        del self._mapping()[key]
+        self.modified = True
+
+    def __iter__(self):
+        return iter(self._mapping())
+
+    def __len__(self):
+        return len(self._mapping())
+
+    def clear(self):
+        self._mapping().clear()
+        self.modified = True
+
+    def regenerate(self):
+        """Troca o identificador mantendo os dados (evita fixação de sessão no login)"""
+        data = dict(self._mapping())
+        if not self.new:
+            self._interface.delete(self.sid, previous=data)
+        self.sid = self._interface.generate_sid()
+        self.new = True
+        self.modified = True
+
+
+class RedisSessionInterface(SessionInterface):
+    """Armazena as sessões no Redis com carga preguiçosa"""
+
+    serializer = TaggedJSONSerializer()
+
+    def __init__(self, client, prefix='session:'):
+        self.client = client
+        self.prefix = prefix
+
+    def generate_sid(self):
+        return secrets.token_urlsafe(32)
+
+    def _signer(self, app):
+        return Signer(app.secret_key, salt='redis-session')
+
+    def _key(self, sid):
+        return f'{self.prefix}{sid}'
+
+    @staticmethod
+    def _user_key(user_id):
+        return f'user_sessions:{user_id}'
+
+    @staticmethod
+    def _revoked_key(user_id):
+        return f'sessions_revoked:{user_id}'
+
+    def _ttl(self, app):
+        lifetime = app.permanent_session_lifetime
+        return int(lifetime.total_seconds()) if isinstance(lifetime, timedelta) else int(lifetime)
+
+    def load(self, sid):
+        """Dados da sessão (None se não existir)"""
+        raw = self.client.get(self._key(sid))
+        if raw is None:
+            return None
+        try:
+            return self.serializer.loads(raw.decode() if isinstance(raw, bytes) else raw)
+        except Exception:
+            return None
+
+    def open_session(self, app, request):
+        cookie = request.cookies.get(self.get_cookie_name(app))
+        if cookie:
+            try:
+                sid = self._signer(app).unsign(cookie).decode()
+                return RedisSession(self, sid)
+            except BadSignature:
+                pass
+        return RedisSession(self, self.generate_sid(), new=True)
+
+    def save_session(self, app, session, response):
+        name = self.get_cookie_name(app)
+        domain = self.get_cookie_domain(app)
+        path = self.get_cookie_path(app)
+
+        if not session.modified:
+            # Sessão usada na requisição: renova a validade (como
+            # SESSION_REFRESH_EACH_REQUEST faz com o cookie); nada lido, nenhuma ida ao Redis
+            if session.accessed and session.loaded and not session.new and len(session) \
+                    and app.config.get('SESSION_REFRESH_EACH_REQUEST', True):
+                self._refresh(app, session, response)
+            return
+
+        if not session.loaded or not len(session):
+            if not session.new:
+                self.delete(session.sid, previous=session._data)
+                response.delete_cookie(name, domain=domain, path=path)
+            return
+
+        ttl = self._ttl(app)
+        data = dict(session)
+        pipe = self.client.pipeline()
+        pipe.setex(self._key(session.sid), ttl, self.serializer.dumps(data))
+        user_id = data.get(USER_ID_KEY)
+        if user_id is not None:
+            pipe.sadd(self._user_key(user_id), session.sid)
+            pipe.expire(self._user_key(user_id), ttl)
+        pipe.execute()
+        self._set_cookie(app, session, response)
+
+    def _refresh(self, app, session, response):
+        """Renova o TTL da sessão (e do índice do usuário) sem regravar os dados"""
+        ttl = self._ttl(app)
+        pipe = self.client.pipeline()
+        pipe.expire(self._key(session.sid), ttl)
+        user_id = session.get(USER_ID_KEY)
+        if user_id is not None:
+            pipe.expire(self._user_key(user_id), ttl)
+        pipe.execute()
+        # Cookie de sessão do navegador (não permanente) não tem validade a renovar
+        if session.permanent:
+            self._set_cookie(app, session, response)
+
+    def _set_cookie(self, app, session, response):
+        response.set_cookie(
+            self.get_cookie_name(app),
+            self._signer(app).sign(session.sid.encode()).decode(),
+            expires=self.get_expiration_time(app, session),
+            httponly=self.get_cookie_httponly(app),
+            domain=self.get_cookie_domain(app),
+            path=self.get_cookie_path(app),
+            secure=self.get_cookie_secure(app),
+            samesite=self.get_cookie_samesite(app)
+        )
+
+    def delete(self, sid, previous=None):
+        self.client.delete(self._key(sid))
+        user_id = (previous or {}).get(USER_ID_KEY)
+        if user_id is not None:
+            self.client.srem(self._user_key(user_id), sid)
+
+    # ------------------------------------------------------------------
+    # Revogação
+    # ------------------------------------------------------------------
+
+    def revoke_user_sessions(self, user_id, remember_seconds=None):
+        """Encerra todas as sessões do usuário em todos os workers.
+
+        Também bloqueia a restauração pelo cookie "lembrar de mim" até o
+        próximo login com senha.
+        """
+        sids = self.client.smembers(self._user_key(user_id))
+        pipe = self.client.pipeline()
+        for sid in sids:
+            pipe.delete(self._key(sid.decode() if isinstance(sid, bytes) else sid))
+        pipe.delete(self._user_key(user_id))
+        if remember_seconds:
+            pipe.setex(self._revoked_key(user_id), remember_seconds, 1)
+        else:
+            pipe.set(self._revoked_key(user_id), 1)
+        pipe.execute()
+        return len(sids)
+
+    def is_revoked(self, user_id):
+        return bool(self.client.exists(self._revoked_key(user_id)))
+
+    def clear_revocation(self, user_id):
+        self.client.delete(self._revoked_key(user_id))
+
+
+def revoke_user_sessions(app, user_id):
+    """Encerra as sessões do usuário (retorna quantas foram removidas, ou None sem Redis)"""
+    interface = app.session_interface
+    if not isinstance(interface, RedisSessionInterface):
+        return None
+    remember = app.config.get('REMEMBER_COOKIE_DURATION', timedelta(days=365))
+    return interface.revoke_user_sessions(user_id, int(remember.total_seconds()))
+
+
+def init_redis_sessions(app, login_manager):
+    """Ativa as sessões no Redis quando SESSION_STORE == 'redis'"""
+    if app.config.get('SESSION_STORE', 'cookie') != 'redis':
+        return None
+
+    import redis
+    # Mesmo servidor do REDIS_URL: usa o pool compartilhado do processo
+    pool = shared_pool_for(app, app.config.get('SESSION_REDIS_URL'))
+    if pool is None:
+        pool = redis.BlockingConnectionPool.from_url(
+            app.config.get('SESSION_REDIS_URL') or app.config.get('REDIS_URL') or 'redis://localhost:6379/0',
+            max_connections=app.config.get('SESSION_REDIS_MAX_CONNECTIONS', 20),
+            timeout=app.config.get('SESSION_REDIS_POOL_TIMEOUT', 2)
+        )
+    interface = RedisSessionInterface(redis.Redis(connection_pool=pool))
+    app.session_interface = interface
+
+    # Cookie "lembrar de mim" de usuário com sessões revogadas não restaura o login
+    load_user = login_manager._user_callback
+
+    @login_manager.user_loader
+    def load_user_unless_revoked(user_id):
+        if getattr(flask_session, 'new', False) and interface.is_revoked(user_id):
+            return None
+        return load_user(user_id)
+
+    @user_logged_in.connect_via(app)
+    def on_login(sender, user, **extra):
+        interface.clear_revocation(user.get_id())
+        if hasattr(flask_session, 'regenerate'):
+            flask_session.regenerate()
+
+    return interface
@@ -0,0 +1,282 @@
+#!/usr/bin/env python3
+"""
+Agregados incrementais para o dashboard do administrador.
+
+Cada flush da sessão registra as variações (novos usuários, salas,
+mensagens...) em `session.info`; após o commit elas entram em um buffer
+do processo que é somado periodicamente a `stat_counters` e `daily_stats`.
+O dashboard lê apenas esses agregados, com custo independente do tamanho
+do histórico.
+
+Uso (reconstrução completa a partir das tabelas de origem):
+    python rollups.py --rebuild
+"""
+
+import sys
+import threading
+from collections import Counter
+from datetime import datetime, timedelta
+from sqlalchemy import event, func
+from sqlalchemy.orm import Session
+from models import (
+    User, Room, Message, Advertisement, AdminMessage, StatCounter, DailyStat
+)
+from db_utils import upsert_increment
+from background import start_periodic_task
+from archive import message_archive
+
+# Entidades com total global em stat_counters
+TOTAL_SCOPES = {
+    User: 'users',
+    Room: 'rooms',
+    Message: 'messages',
+    Advertisement: 'advertisements',
+    AdminMessage: 'admin_messages',
+}
+
+
+def _message_deltas(message, sign, counters, daily):
+    """Variações causadas por uma mensagem criada (+1) ou excluída (-1)"""
+    day = (message.created_at or datetime.utcnow()).date()
+    counters[('room_messages', message.room_id)] += sign
+    counters[('user_messages', message.user_id)] += sign
+    daily[('messages', 0, day)] += sign
+    daily[('room_messages', message.room_id, day)] += sign
+    daily[('user_messages', message.user_id, day)] += sign
+
+
+class RollupBuffer:
+    """Acumula variações confirmadas e as grava em lote"""
+
+    def __init__(self):
+        self._counters = Counter()
+        self._daily = Counter()
+        self._lock = threading.Lock()
+
+    def add(self, counters, daily):
+        with self._lock:
+            self._counters.update(counters)
+            self._daily.update(daily)
+
+    def flush(self, db_session):
+        """Soma as variações pendentes aos agregados"""
+        with self._lock:
+            counters, self._counters = self._counters, Counter()
+            daily, self._daily = self._daily, Counter()
+
+        # Variações de salas já excluídas (de qualquer worker) recriariam suas linhas
+        room_ids = {key[1] for key in list(counters) + list(daily) if key[0] == 'room_messages'}
+        if room_ids:
+            existing = {room_id for room_id, in db_session.query(Room.id).filter(Room.id.in_(room_ids))}
+            for buffer in (counters, daily):
+                for key in [key for key in buffer if key[0] == 'room_messages' and key[1] not in existing]:
+                    del buffer[key]
+
+        counter_rows = [{'scope': scope, 'scope_id': scope_id, 'value': value}
+                        for (scope, scope_id), value in counters.items() if value]
+        daily_rows = [{'scope': scope, 'scope_id': scope_id, 'day': day, 'value': value}
+                      for (scope, scope_id, day), value in daily.items() if value]
+        if not counter_rows and not daily_rows:
+            return 0
+
+        try:
+            upsert_increment(db_session, StatCounter.__table__, counter_rows,
+                             ['scope', 'scope_id'], ['value'])
+            upsert_increment(db_session, DailyStat.__table__, daily_rows,
+                             ['scope', 'scope_id', 'day'], ['value'])
+            db_session.commit()
+        except Exception:
+            db_session.rollback()
+            self.add(counters, daily)
+            raise
+
+        return len(counter_rows) + len(daily_rows)
+
+    def __len__(self):
+        return len(self._counters) + len(self._daily)
+
+
+rollup_buffer = RollupBuffer()
+
+
+def _collect(session, flush_context):
+    """after_flush: registra as variações da transação corrente"""
+    counters = session.info.setdefault('rollup_counters', Counter())
+    daily = session.info.setdefault('rollup_daily', Counter())
+
+    for objects, sign in ((session.new, 1), (session.deleted, -1)):
+        for obj in objects:
+            scope = TOTAL_SCOPES.get(type(obj))
+            if not scope:
+                continue
+            counters[(scope, 0)] += sign
+            if isinstance(obj, Message):
+                _message_deltas(obj, sign, counters, daily)
+
+
+def _commit(session):
+    """after_commit: envia as variações confirmadas ao buffer"""
+    counters = session.info.pop('rollup_counters', None)
+    daily = session.info.pop('rollup_daily', None)
+    if counters or daily:
+        rollup_buffer.add(counters or {}, daily or {})
+
+
+def _discard(session):
+    """after_rollback: descarta variações de transações desfeitas"""
+    session.info.pop('rollup_counters', None)
+    session.info.pop('rollup_daily', None)
+
+
+_listeners_installed = False
+
+
+def install_listeners():
+    """Registra os eventos de sessão (uma vez por processo)"""
+    global _listeners_installed
+    if _listeners_installed:
+        return
+    event.listen(Session, 'after_flush', _collect)
+    event.listen(Session, 'after_commit', _commit)
+    event.listen(Session, 'after_rollback', _discard)
+    _listeners_installed = True
+
+
+def init_rollups(app, socketio):
+    """Instala os eventos e inicia a gravação periódica dos agregados"""
+    install_listeners()
+    start_periodic_task(
+        app, socketio, app.config.get('ROLLUP_FLUSH_SECONDS', 5),
+        rollup_buffer.flush, 'gravar agregados do dashboard'
+    )
+
+
+def _room_message_counts(db_session, room_id):
+    """Mensagens da sala por (usuário, dia), incluindo as arquivadas"""
+    counts = Counter()
+    day = func.date(Message.created_at)
+    for user_id, message_day, value in db_session.query(
+        Message.user_id, day, func.count(Message.id)
+    ).filter(Message.room_id == room_id).group_by(Message.user_id, day).all():
+        counts[(user_id, _as_date(message_day))] += value
+    for records in message_archive.iter_room(db_session, room_id):
+        for record in records:
+            created_at = record['created_at']
+            counts[(record['user_id'], datetime.fromisoformat(created_at).date() if created_at else None)] += 1
+    return counts
+
+
+def forget_room(db_session, room_id):
+    """Ajusta os agregados antes da exclusão em massa das mensagens de uma sala.
+
+    A exclusão via `query(...).delete()` não passa pelos eventos da sessão,
+    então o total global, os totais por usuário e as contagens diárias são
+    corrigidos aqui a partir das próprias mensagens (ainda não excluídas).
+    Variações da sala ainda no buffer são descartadas no flush.
+    """
+    counters = Counter()
+    daily = Counter()
+
+    for (user_id, day), value in _room_message_counts(db_session, room_id).items():
+        counters[('messages', 0)] -= value
+        counters[('user_messages', user_id)] -= value
+        if day is not None:
+            daily[('messages', 0, day)] -= value
+            daily[('user_messages', user_id, day)] -= value
+
+    db_session.query(StatCounter).filter_by(scope='room_messages', scope_id=room_id).delete()
+    db_session.query(DailyStat).filter_by(scope='room_messages', scope_id=room_id).delete()
+
+    # Aplicado após o commit, junto com as demais variações da transação
+    session_counters = db_session.info.setdefault('rollup_counters', Counter())
+    session_daily = db_session.info.setdefault('rollup_daily', Counter())
+    session_counters.update(counters)
+    session_daily.update(daily)
+
+
+def get_totals(db_session):
+    """Totais globais em uma única consulta"""
+    rows = db_session.query(StatCounter.scope, StatCounter.value).filter(
+        StatCounter.scope.in_(list(TOTAL_SCOPES.values())),
+        StatCounter.scope_id == 0
+    ).all()
+    totals = {scope: 0 for scope in TOTAL_SCOPES.values()}
+    totals.update({scope: max(0, value) for scope, value in rows})
+    return totals
+
+
+def messages_per_day(db_session, days=7):
+    """Mensagens por dia (globais) dos últimos `days` dias"""
+    since = (datetime.utcnow() - timedelta(days=days)).date()
+    return db_session.query(
+        DailyStat.day.label('date'),
+        DailyStat.value.label('count')
+    ).filter(
+        DailyStat.scope == 'messages',
+        DailyStat.scope_id == 0,
+        DailyStat.day >= since
+    ).order_by(DailyStat.day).all()
+
+
+def top_rooms(db_session, limit=5):
+    """Salas com mais mensagens: lista de (Room, message_count)"""
+    return db_session.query(Room, StatCounter.value.label('message_count')).join(
+        StatCounter, (StatCounter.scope == 'room_messages') & (StatCounter.scope_id == Room.id)
+    ).order_by(StatCounter.value.desc()).limit(limit).all()
+
+
+def top_users(db_session, limit=5):
+    """Usuários com mais mensagens: lista de (User, message_count)"""
+    return db_session.query(User, StatCounter.value.label('message_count')).join(
+        StatCounter, (StatCounter.scope == 'user_messages') & (StatCounter.scope_id == User.id)
+    ).order_by(StatCounter.value.desc()).limit(limit).all()
+
+
+def rebuild_rollups(db_session):
+    """Recalcula todos os agregados a partir das tabelas de origem"""
+    db_session.query(StatCounter).delete()
+    db_session.query(DailyStat).delete()
+
+    counters = []
+    for model, scope in TOTAL_SCOPES.items():
+        counters.append({'scope': scope, 'scope_id': 0, 'value': db_session.query(model).count()})
+
+    for scope, column in (('room_messages', Message.room_id), ('user_messages', Message.user_id)):
+        for scope_id, value in db_session.query(column, func.count(Message.id)).group_by(column).all():
+            counters.append({'scope': scope, 'scope_id': scope_id, 'value': value})
+
+    daily = Counter()
+    day = func.date(Message.created_at)
+    for message_day, value in db_session.query(day, func.count(Message.id)).group_by(day).all():
+        daily[('messages', 0, _as_date(message_day))] += value
+    for scope, column in (('room_messages', Message.room_id), ('user_messages', Message.user_id)):
+        for scope_id, message_day, value in db_session.query(
+            column, day, func.count(Message.id)
+        ).group_by(column, day).all():
+            daily[(scope, scope_id, _as_date(message_day))] += value
+
+    upsert_increment(db_session, StatCounter.__table__, counters, ['scope', 'scope_id'], ['value'])
+    upsert_increment(db_session, DailyStat.__table__, [
+        {'scope': scope, 'scope_id': scope_id, 'day': message_day, 'value': value}
+        for (scope, scope_id, message_day), value in daily.items()
+    ], ['scope', 'scope_id', 'day'], ['value'])
+    db_session.commit()
+
+
+def _as_date(value):
+    """func.date() retorna texto no SQLite e date no PostgreSQL"""
+    if isinstance(value, str):
+        return datetime.strptime(value, '%Y-%m-%d').date()
+    return value
+
+
+if __name__ == '__main__':
+    if len(sys.argv) > 1 and sys.argv[1] == '--rebuild':
+        from app import create_app, db
+        app = create_app()
+        with app.app_context():
+            print("🔄 Recalculando agregados do dashboard...")
+            rebuild_rollups(db.session)
+            print("✅ Agregados recalculados com sucesso!")
+    else:
+        print("Uso: python rollups.py --rebuild")
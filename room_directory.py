@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+"""
+Diretório paginado de salas públicas.
+"""
+
+from sqlalchemy import func
+from models import Room, RoomMember, AccessRequest, User
+from cache import TTLCache
+
+SORT_OPTIONS = ('activity', 'name')
+MAX_PER_PAGE = 100
+
+# Páginas do diretório (independentes do usuário), invalidadas ao criar/excluir salas
+directory_cache = TTLCache('room_directory', maxsize=512, ttl=30)
+
+
+def invalidate_directory():
+    """Descarta todas as páginas do diretório em cache"""
+    directory_cache.clear()
+
+
+def _escape_like(text):
+    """Escapa curingas do LIKE para busca por prefixo"""
+    return text.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+
+def _query_page(db_session, search, sort, page, per_page):
+    """Executa a consulta agregada de uma página do diretório"""
+    member_counts = db_session.query(
+        RoomMember.room_id.label('room_id'),
+        func.count(RoomMember.id).label('member_count')
+    ).group_by(RoomMember.room_id).subquery()
+
+    query = db_session.query(
+        Room.id, Room.name, Room.slug, Room.description, Room.created_at,
+        Room.last_message_at, User.id.label('creator_id'), User.username.label('creator_username'),
+        func.coalesce(member_counts.c.member_count, 0).label('member_count')
+    ).join(User, User.id == Room.creator_id)\
+     .outerjoin(member_counts, member_counts.c.room_id == Room.id)\
+     .filter(Room.is_private == False)
+
+    if search:
+        query = query.filter(func.lower(Room.name).like(f'{_escape_like(search.lower())}%', escape='\\'))
+
+    total = query.order_by(None).count()
+
+    if sort == 'name':
+        query = query.order_by(func.lower(Room.name), Room.id)
+    else:
+        query = query.order_by(func.coalesce(Room.last_message_at, Room.created_at).desc(), Room.id.desc())
+
+    rows = query.offset((page - 1) * per_page).limit(per_page).all()
+
+    rooms = [{
+        'id': row.id,
+        'name': row.name,
+        'slug': row.slug,
+        'description': row.description,
+        'created_at': row.created_at,
+        'last_message_at': row.last_message_at,
+        'member_count': row.member_count,
+        'creator': {'id': row.creator_id, 'username': row.creator_username}
+    } for row in rows]
+
+    return {'rooms': rooms, 'total': total}
+
+
+def get_directory_page(db_session, user_id, search='', sort='activity', page=1, per_page=20):
+    """Retorna uma página do diretório com o status do usuário em cada sala.
+
+    A parte comum a todos os usuários vem do cache; o status de membro e
+    solicitações pendentes são resolvidos com duas consultas por página.
+    """
+    search = (search or '').strip()
+    sort = sort if sort in SORT_OPTIONS else 'activity'
+    page = max(1, page)
+    per_page = min(max(1, per_page), MAX_PER_PAGE)
+
+    cache_key = (search.lower(), sort, page, per_page)
+    cached = directory_cache.get_or_set(
+        cache_key, lambda: _query_page(db_session, search, sort, page, per_page)
+    )
+
+    room_ids = [room['id'] for room in cached['rooms']]
+    roles = {}
+    pending = set()
+    if room_ids:
+        roles = dict(db_session.query(RoomMember.room_id, RoomMember.role).filter(
+            RoomMember.user_id == user_id,
+            RoomMember.room_id.in_(room_ids)
+        ).all())
+        pending = {room_id for (room_id,) in db_session.query(AccessRequest.room_id).filter(
+            AccessRequest.user_id == user_id,
+            AccessRequest.status == 'pending',
+            AccessRequest.room_id.in_(room_ids)
+        ).all()}
+
+    rooms_with_status = []
+    for room in cached['rooms']:
+        role = roles.get(room['id'])
+        rooms_with_status.append({
+            'room': room,
+            'status': 'member' if role else 'not_member',
+            'role': role,
+            'creator': room['creator'],
+            'member_count': room['member_count'],
+            'pending_request': room['id'] in pending
+        })
+
+    total = cached['total']
+    return {
+        'rooms': rooms_with_status,
+        'page': page,
+        'per_page': per_page,
+        'total': total,
+        'pages': (total + per_page - 1) // per_page,
+        'sort': sort,
+        'q': search
+    }
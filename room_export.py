@@ -0,0 +1,212 @@
+#!/usr/bin/env python3
+"""
+Exportação do histórico de uma sala em NDJSON ou CSV, em fluxo contínuo.
+
+O histórico nunca é carregado inteiro: as mensagens arquivadas (archive.py)
+são lidas bloco a bloco e as da tabela `messages` em lotes de
+EXPORT_BATCH_SIZE com cursor no servidor (`yield_per`; no Postgres, um
+cursor nomeado). Cada lote é serializado e enviado antes do próximo, então
+o uso de memória não depende do tamanho da sala. A compressão gzip
+opcional também é incremental.
+
+Cada mensagem leva o manifesto dos anexos (nome, caminho, tamanho e tipo);
+no CSV o manifesto vai em JSON na coluna `attachments`.
+
+O texto exportado é a coluna `content`: `encrypted_content` é gerado com
+uma chave aleatória por MessageHandler que não é guardada, então não há o
+que descriptografar.
+
+Uso:
+    python room_export.py --database sqlite:///instance/chat.db --room sala-geral \\
+        --format csv --gzip --output sala-geral.csv.gz --archive-dir instance/archive
+"""
+
+import argparse
+import csv
+import io
+import json
+import os
+import sys
+import zlib
+from datetime import datetime
+from flask import Response, stream_with_context
+from sqlalchemy import select
+from archive import message_archive
+from models import Attachment, Message, Room, User
+
+EXPORT_FORMATS = {
+    'ndjson': 'application/x-ndjson',
+    'csv': 'text/csv'
+}
+CSV_FIELDS = ('id', 'seq', 'created_at', 'updated_at', 'user_id', 'username', 'content', 'attachments', 'archived')
+
+
+def _iso(value):
+    return value.isoformat() if value else None
+
+
+def _legacy_attachment(path):
+    return [{'filename': os.path.basename(path), 'file_path': path}] if path else []
+
+
+def _attachment_manifests(db_session, message_ids):
+    """Manifestos dos anexos de um lote: {message_id: [anexo, ...]}"""
+    manifests = {}
+    if not message_ids:
+        return manifests
+    rows = db_session.execute(select(
+        Attachment.message_id, Attachment.filename, Attachment.file_path,
+        Attachment.file_size, Attachment.mime_type
+    ).where(Attachment.message_id.in_(message_ids)).order_by(Attachment.id))
+    for row in rows:
+        manifests.setdefault(row.message_id, []).append({
+            'filename': row.filename,
+            'file_path': row.file_path,
+            'file_size': row.file_size,
+            'mime_type': row.mime_type
+        })
+    return manifests
+
+
+def _archived_batches(db_session, room_id):
+    """Lotes de mensagens arquivadas (um bloco por vez) no formato da exportação"""
+    for records in message_archive.iter_room(db_session, room_id):
+        user_ids = {record['user_id'] for record in records}
+        usernames = dict(db_session.execute(
+            select(User.id, User.username).where(User.id.in_(user_ids))
+        ).all()) if user_ids else {}
+        yield [{
+            'id': record['id'],
+            'seq': record['seq'],
+            'created_at': record['created_at'],
+            'updated_at': record['updated_at'],
+            'user_id': record['user_id'],
+            'username': usernames.get(record['user_id']),
+            'content': record['content'],
+            'attachments': _legacy_attachment(record['attachment_path']) + record.get('attachments', []),
+            'archived': True
+        } for record in records]
+
+
+def _live_batches(db_session, room_id, batch_size):
+    """Lotes da tabela messages lidos com cursor no servidor"""
+    stmt = select(
+        Message.id, Message.seq, Message.created_at, Message.updated_at, Message.user_id,
+        User.username, Message.content, Message.attachment_path
+    ).outerjoin(User, User.id == Message.user_id)\
+        .where(Message.room_id == room_id)\
+        .order_by(Message.created_at, Message.id)
+
+    result = db_session.execute(stmt, execution_options={'yield_per': batch_size})
+    for rows in result.partitions():
+        manifests = _attachment_manifests(db_session, [row.id for row in rows])
+        yield [{
+            'id': row.id,
+            'seq': row.seq,
+            'created_at': _iso(row.created_at),
+            'updated_at': _iso(row.updated_at),
+            'user_id': row.user_id,
+            'username': row.username,
+            'content': row.content,
+            'attachments': _legacy_attachment(row.attachment_path) + manifests.get(row.id, []),
+            'archived': False
+        } for row in rows]
+
+
+def iter_batches(db_session, room_id, batch_size=1000):
+    """Histórico completo da sala em ordem cronológica: arquivo e depois tabela"""
+    yield from _archived_batches(db_session, room_id)
+    yield from _live_batches(db_session, room_id, batch_size)
+
+
+def _ndjson(batches):
+    for batch in batches:
+        yield ''.join(json.dumps(item, ensure_ascii=False) + '\n' for item in batch)
+
+
+def _csv(batches):
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=CSV_FIELDS)
+    writer.writeheader()
+    for batch in batches:
+        for item in batch:
+            writer.writerow(dict(item, attachments=json.dumps(item['attachments'], ensure_ascii=False)))
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    # Cabeçalho de sala sem mensagens
+    if buffer.tell():
+        yield buffer.getvalue()
+
+
+def _encode(chunks, compress=False):
+    """Texto para bytes, com gzip incremental opcional"""
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31) if compress else None
+    for chunk in chunks:
+        data = chunk.encode('utf-8')
+        if compressor is not None:
+            data = compressor.compress(data)
+        if data:
+            yield data
+    if compressor is not None:
+        yield compressor.flush()
+
+
+def iter_export(db_session, room_id, fmt='ndjson', compress=False, batch_size=1000):
+    """Bytes da exportação, lote a lote"""
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError(f"Formato de exportação inválido: {fmt}")
+    serializer = _csv if fmt == 'csv' else _ndjson
+    return _encode(serializer(iter_batches(db_session, room_id, batch_size)), compress)
+
+
+def export_filename(room, fmt, compress=False):
+    return f"{room.slug}-{datetime.utcnow():%Y%m%d}.{fmt}{'.gz' if compress else ''}"
+
+
+def export_response(db_session, room, fmt='ndjson', compress=False, batch_size=1000):
+    """Resposta HTTP em fluxo; a sessão do banco vive até o fim do download"""
+    mimetype = 'application/gzip' if compress else EXPORT_FORMATS[fmt]
+    response = Response(
+        stream_with_context(iter_export(db_session, room.id, fmt, compress, batch_size)),
+        mimetype=mimetype
+    )
+    response.headers['Content-Disposition'] = f'attachment; filename="{export_filename(room, fmt, compress)}"'
+    # Sem buffer no proxy (nginx) para o fluxo chegar ao cliente aos poucos
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
+
+def main(argv=None):
+    from sqlalchemy import create_engine
+    from sqlalchemy.orm import Session
+
+    parser = argparse.ArgumentParser(description='Exportação do histórico de uma sala')
+    parser.add_argument('--database', required=True, help='URL SQLAlchemy')
+    parser.add_argument('--room', required=True, help='slug da sala')
+    parser.add_argument('--format', choices=tuple(EXPORT_FORMATS), default='ndjson')
+    parser.add_argument('--gzip', action='store_true')
+    parser.add_argument('--output', help='arquivo de saída (padrão: stdout)')
+    parser.add_argument('--archive-dir', help='diretório dos segmentos arquivados (ARCHIVE_DIR)')
+    parser.add_argument('--batch-size', type=int, default=1000)
+    args = parser.parse_args(argv)
+
+    if args.archive_dir:
+        message_archive.configure(args.archive_dir)
+
+    with Session(create_engine(args.database)) as db_session:
+        room = db_session.execute(select(Room).where(Room.slug == args.room)).scalar_one_or_none()
+        if room is None:
+            parser.error(f"sala não encontrada: {args.room}")
+        output = open(args.output, 'wb') if args.output else sys.stdout.buffer
+        try:
+            for chunk in iter_export(db_session, room.id, args.format, args.gzip, args.batch_size):
+                output.write(chunk)
+        finally:
+            if args.output:
+                output.close()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -4,6 +4,13 @@ from models import Room, RoomMember, RoomInvite, AccessRequest, User, Message, A
 from forms import RoomForm
 from auth import create_room_handler
 from invites import InviteEmailService
+from room_directory import get_directory_page, invalidate_directory
+from unread import unread_count
+from notifications import notify_users
+from rollups import forget_room
+from db_routing import read_replica
+from partitioning import partition_maintainer
+from archive import message_archive
 import os
 
 rooms_bp = Blueprint('rooms', __name__)
@@ -14,23 +21,18 @@ def index():
     """Lista as salas do usuário"""
     db = current_app.extensions['sqlalchemy']
     
-    # Buscar salas onde o usuário é membro
-    user_rooms = db.session.query(Room).join(RoomMember).filter(
+    # Buscar salas e a participação do usuário em uma única consulta
+    memberships = db.session.query(Room, RoomMember).join(
+        RoomMember, RoomMember.room_id == Room.id
+    ).filter(
         RoomMember.user_id == current_user.id
     ).all()
     
-    # Para cada sala, buscar informações do membro
-    rooms_with_member = []
-    for room in user_rooms:
-        member = db.session.query(RoomMember).filter_by(
-            room_id=room.id, 
-            user_id=current_user.id
-        ).first()
-        
-        rooms_with_member.append({
-            'room': room,
-            'member': member
-        })
+    rooms_with_member = [{
+        'room': room,
+        'member': member,
+        'unread': unread_count(room, member)
+    } for room, member in memberships]
     
     return render_template('rooms/index.html', rooms=rooms_with_member)
 
@@ -45,6 +47,7 @@ def create():
         result = create_room_handler(db.session, form, current_user.id)
         
         if result['success']:
+            invalidate_directory()
             flash('Sala criada com sucesso!', 'success')
             return redirect(url_for('rooms.view', slug=result['room'].slug))
         else:
@@ -104,12 +107,28 @@ def delete(slug):
         # Excluir convites da sala
         db.session.query(RoomInvite).filter_by(room_id=room.id).delete()
         
-        # Excluir mensagens da sala
-        db.session.query(Message).filter_by(room_id=room.id).delete()
+        # Excluir mensagens da sala (ajustando os agregados do dashboard)
+        forget_room(db.session, room.id)
+        messages = db.session.query(Message).filter(Message.room_id == room.id)
+        if partition_maintainer.enabled and room.created_at:
+            # Limite inferior: só as partições mensais a partir da criação da sala
+            messages = messages.filter(Message.created_at >= room.created_at)
+        
+        # A exclusão em massa não passa pela cascata do ORM (e, com `messages`
+        # particionada, não há FOREIGN KEY em attachments.message_id)
+        db.session.query(Attachment).filter(
+            Attachment.message_id.in_(messages.with_entities(Message.id).scalar_subquery())
+        ).delete(synchronize_session=False)
+        messages.delete(synchronize_session=False)
+        
+        # Segmentos arquivados (os arquivos só saem depois do commit)
+        archived_files = message_archive.forget_room(db.session, room.id)
         
         # Excluir a sala
         db.session.delete(room)
         db.session.commit()
+        message_archive.remove_files(archived_files)
+        invalidate_directory()
         
         flash('Sala excluída com sucesso!', 'success')
         return redirect(url_for('rooms.index'))
@@ -121,38 +140,21 @@ def delete(slug):
 
 @rooms_bp.route('/all')
 @login_required
+@read_replica
 def all_rooms():
-    """Lista todas as salas públicas"""
+    """Lista as salas públicas (paginado, com busca por prefixo do nome)"""
     db = current_app.extensions['sqlalchemy']
-    
-    # Buscar todas as salas públicas
-    public_rooms = db.session.query(Room).filter_by(is_private=False).all()
-    
-    # Para cada sala, verificar se o usuário é membro e preparar dados esperados pelo template
-    rooms_with_status = []
-    for room in public_rooms:
-        member = db.session.query(RoomMember).filter_by(
-            room_id=room.id, 
-            user_id=current_user.id
-        ).first()
-        
-        # Verificar se há solicitação pendente
-        pending_request = db.session.query(AccessRequest).filter_by(
-            room_id=room.id,
-            user_id=current_user.id,
-            status='pending'
-        ).first()
-        
-        rooms_with_status.append({
-            'room': room,
-            # Campos esperados pelo template
-            'status': 'member' if member else 'not_member',
-            'role': (member.role if member else None),
-            'creator': (getattr(room, 'creator', None) or (db.session.query(User).get(room.creator_id) if hasattr(room, 'creator_id') else None)),
-            'pending_request': pending_request is not None
-        })
-    
-    return render_template('rooms/all_rooms.html', rooms=rooms_with_status)
+
+    directory = get_directory_page(
+        db.session,
+        current_user.id,
+        search=request.args.get('q', ''),
+        sort=request.args.get('sort', 'activity'),
+        page=request.args.get('page', 1, type=int),
+        per_page=request.args.get('per_page', current_app.config.get('ROOM_DIRECTORY_PER_PAGE', 20), type=int)
+    )
+
+    return render_template('rooms/all_rooms.html', rooms=directory['rooms'], directory=directory)
 
 @rooms_bp.route('/<slug>/request-access', methods=['POST'])
 @login_required
@@ -197,6 +199,29 @@ def request_access(slug):
         db.session.add(access_request)
         db.session.commit()
         
+        # Notificar criador e administradores da sala em tempo real
+        admin_ids = [user_id for (user_id,) in db.session.query(RoomMember.user_id).filter(
+            RoomMember.room_id == room.id,
+            RoomMember.role.in_(['creator', 'admin'])
+        ).all()]
+        try:
+            notify_users(
+                admin_ids, 'access_request',
+                room=room.slug,
+                room_name=room.name,
+                request_id=access_request.id,
+                user=current_user.username
+            )
+        except Exception as e:
+            print(f"Erro ao notificar solicitação de acesso: {e}")
+        
+        # Enviar email de notificação ao criador
+        try:
+            email_service = InviteEmailService(current_app)
+            email_service.send_access_request_email(current_user, room, room.creator)
+        except Exception as e:
+            print(f"Erro ao enviar email de solicitação: {e}")
+        
         flash('Solicitação de acesso enviada com sucesso!', 'success')
         return redirect(url_for('rooms.all_rooms'))
         
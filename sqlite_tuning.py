@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+"""
+Modo de alta concorrência do SQLite (instalação em um único servidor).
+
+Cada conexão nova recebe os pragmas:
+
+* `journal_mode=WAL`: leitores não bloqueiam o escritor nem o contrário;
+* `synchronous=NORMAL`: fsync só nos checkpoints (seguro com WAL; uma
+  queda de energia pode perder apenas as últimas transações);
+* `busy_timeout`: espera pelo lock em vez de falhar com
+  "database is locked";
+* `mmap_size`, `cache_size` e `temp_store=MEMORY`: leituras sem cópia e
+  cache de páginas maior.
+
+O SQLite aceita um escritor por vez. Em vez de várias conexões do mesmo
+processo disputarem o lock do arquivo (e estourarem o busy_timeout), as
+escritas passam por uma trava de escritor única: a primeira instrução
+INSERT/UPDATE/DELETE de uma transação aguarda a vez na trava e a libera
+depois que o commit/rollback chega ao SQLite (quando o lock do arquivo já
+foi solto). Leituras não usam a trava. Entre processos diferentes a
+serialização fica a cargo do busy_timeout.
+"""
+
+import threading
+import time
+from sqlalchemy import event, exc
+
+WRITE_PREFIXES = ('INSERT', 'UPDATE', 'DELETE', 'REPLACE')
+
+
+def _raw(connection):
+    """Conexão DBAPI por trás do proxy do pool (os hooks recebem um ou outro)"""
+    return getattr(connection, 'dbapi_connection', connection)
+
+
+class SQLiteWriter:
+    """Trava única de escrita do processo, com a conexão DBAPI que a detém"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._owner = None
+        self.timeout = 10
+        self.waited_total = 0.0
+        self.writes = 0
+
+    def acquire(self, dbapi_connection):
+        dbapi_connection = _raw(dbapi_connection)
+        if self._owner is dbapi_connection:
+            return
+        start = time.perf_counter()
+        if not self._lock.acquire(timeout=self.timeout):
+            raise exc.TimeoutError(f"Trava de escrita do SQLite ocupada por mais de {self.timeout}s")
+        self.waited_total += time.perf_counter() - start
+        self.writes += 1
+        self._owner = dbapi_connection
+
+    def release(self, dbapi_connection):
+        dbapi_connection = _raw(dbapi_connection)
+        if dbapi_connection is not None and self._owner is dbapi_connection:
+            self._owner = None
+            self._lock.release()
+
+
+sqlite_writer = SQLiteWriter()
+
+
+def _pragmas(config):
+    return (
+        ('journal_mode', 'WAL'),
+        ('synchronous', 'NORMAL'),
+        ('busy_timeout', int(config.get('SQLITE_BUSY_TIMEOUT_MS', 5000))),
+        ('mmap_size', int(config.get('SQLITE_MMAP_SIZE', 256 * 1024 * 1024))),
+        # Negativo: tamanho em KiB em vez de número de páginas
+        ('cache_size', -int(config.get('SQLITE_CACHE_SIZE_KB', 64 * 1024))),
+        ('temp_store', 'MEMORY'),
+    )
+
+
+def _is_write(statement):
+    return statement.lstrip().upper().startswith(WRITE_PREFIXES)
+
+
+def install(engine, config, serialize_writes=True):
+    """Registra os pragmas e a trava de escrita no engine SQLite"""
+    pragmas = _pragmas(config)
+
+    @event.listens_for(engine, 'connect')
+    def set_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        try:
+            for name, value in pragmas:
+                cursor.execute(f'PRAGMA {name}={value}')
+        finally:
+            cursor.close()
+
+    if not serialize_writes:
+        return
+
+    @event.listens_for(engine, 'before_cursor_execute')
+    def acquire_writer(conn, cursor, statement, parameters, context, executemany):
+        if _is_write(statement):
+            sqlite_writer.acquire(conn.connection)
+
+    # Os eventos 'commit'/'rollback' do engine disparam antes do COMMIT chegar ao
+    # SQLite; a trava só é liberada depois da chamada DBAPI (o pool também
+    # usa do_rollback ao receber uma conexão de volta)
+    dialect = engine.dialect
+    do_commit, do_rollback = dialect.do_commit, dialect.do_rollback
+
+    def commit_and_release(dbapi_connection):
+        try:
+            do_commit(dbapi_connection)
+        finally:
+            sqlite_writer.release(dbapi_connection)
+
+    def rollback_and_release(dbapi_connection):
+        try:
+            do_rollback(dbapi_connection)
+        finally:
+            sqlite_writer.release(dbapi_connection)
+
+    dialect.do_commit = commit_and_release
+    dialect.do_rollback = rollback_and_release
+
+    # Conexão descartada (erro, invalidação) sem commit/rollback
+    @event.listens_for(engine.pool, 'close')
+    def release_on_close(dbapi_connection, connection_record):
+        sqlite_writer.release(dbapi_connection)
+
+
+def init_sqlite_tuning(app):
+    """Ativa o modo de alta concorrência quando o banco é SQLite em arquivo.
+
+    Deve ser chamado antes da primeira conexão ao banco.
+    """
+    uri = app.config.get('SQLALCHEMY_DATABASE_URI', '')
+    if not uri.startswith('sqlite') or ':memory:' in uri or not app.config.get('SQLITE_HIGH_CONCURRENCY', True):
+        return False
+
+    sqlite_writer.timeout = app.config.get('SQLITE_WRITE_LOCK_TIMEOUT', 10)
+    with app.app_context():
+        install(
+            app.extensions['sqlalchemy'].engine,
+            app.config,
+            serialize_writes=app.config.get('SQLITE_SERIALIZE_WRITES', True)
+        )
+    return True
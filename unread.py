@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+"""
+Contadores de mensagens não lidas e ponteiros de leitura.
+
+A contagem de não lidas é `Room.message_seq - RoomMember.last_read_seq`.
+As atualizações de ponteiro enviadas pelos clientes são acumuladas em
+memória e gravadas em lote pelo `flush` periódico.
+"""
+
+import threading
+from flask import current_app, request
+from flask_login import current_user
+from sqlalchemy import bindparam
+from models import Room, RoomMember
+from notifications import emit_to_user
+from background import start_periodic_task
+from metrics import room_fanout_members
+from db_pool import socket_db_session
+
+
+class ReadPointerBuffer:
+    """Acumula ponteiros de leitura e grava apenas o maior por (usuário, sala)"""
+
+    def __init__(self):
+        self._pending = {}
+        self._lock = threading.Lock()
+
+    def mark_read(self, user_id, room_id, seq):
+        """Registra que o usuário leu a sala até `seq`"""
+        if not seq:
+            return
+        key = (user_id, room_id)
+        with self._lock:
+            if seq > self._pending.get(key, 0):
+                self._pending[key] = seq
+
+    def pending_seq(self, user_id, room_id):
+        """Ponteiro ainda não gravado no banco (0 se não houver)"""
+        return self._pending.get((user_id, room_id), 0)
+
+    def flush(self, db_session):
+        """Grava os ponteiros pendentes com um único executemany"""
+        with self._lock:
+            batch, self._pending = self._pending, {}
+
+        if not batch:
+            return 0
+
+        table = RoomMember.__table__
+        stmt = table.update().where(
+            table.c.user_id == bindparam('b_user_id'),
+            table.c.room_id == bindparam('b_room_id'),
+            table.c.last_read_seq < bindparam('b_seq')
+        ).values(last_read_seq=bindparam('b_seq'))
+
+        rows = [
+            {'b_user_id': user_id, 'b_room_id': room_id, 'b_seq': seq}
+            for (user_id, room_id), seq in batch.items()
+        ]
+
+        try:
+            db_session.execute(stmt, rows)
+            db_session.commit()
+        except Exception:
+            db_session.rollback()
+            # Devolver ao buffer para a próxima tentativa
+            for (user_id, room_id), seq in batch.items():
+                self.mark_read(user_id, room_id, seq)
+            raise
+
+        return len(rows)
+
+    def __len__(self):
+        return len(self._pending)
+
+
+read_pointers = ReadPointerBuffer()
+
+
+def unread_count(room, member):
+    """Mensagens não lidas considerando ponteiros ainda não gravados"""
+    last_read = max(member.last_read_seq or 0, read_pointers.pending_seq(member.user_id, room.id))
+    return max(0, (room.message_seq or 0) - last_read)
+
+
+def push_new_message(db_session, room, message, socketio=None):
+    """Envia o novo número de sequência da sala aos demais membros"""
+    # O autor já leu a própria mensagem
+    read_pointers.mark_read(message.user_id, room.id, message.seq)
+
+    member_ids = db_session.query(RoomMember.user_id).filter(
+        RoomMember.room_id == room.id,
+        RoomMember.user_id != message.user_id
+    ).all()
+    room_fanout_members.observe(len(member_ids))
+
+    payload = {'room': room.slug, 'head_seq': message.seq}
+    for (user_id,) in member_ids:
+        emit_to_user(user_id, 'unread', payload, socketio=socketio)
+
+
+def init_unread(app, socketio):
+    """Inicia a gravação periódica dos ponteiros de leitura"""
+    start_periodic_task(
+        app, socketio, app.config.get('READ_POINTER_FLUSH_SECONDS', 2),
+        read_pointers.flush, 'gravar ponteiros de leitura'
+    )
+
+
+def register_unread_events(socketio):
+    """Registra os eventos Socket.IO de leitura"""
+
+    @socketio.on('mark_read')
+    @socket_db_session
+    def on_mark_read(data):
+        """Cliente informa até qual mensagem leu a sala"""
+        if not current_user.is_authenticated:
+            return
+
+        room_slug = data.get('room')
+        seq = data.get('seq')
+        if not room_slug or not isinstance(seq, int):
+            return
+
+        db = current_app.extensions['sqlalchemy']
+        room = db.session.query(Room.id, Room.message_seq).filter_by(slug=room_slug).first()
+        if not room:
+            return
+
+        seq = min(seq, room.message_seq or 0)
+        read_pointers.mark_read(current_user.id, room.id, seq)
+
+        # Sincronizar o indicador nos outros dispositivos do usuário
+        emit_to_user(current_user.id, 'unread', {
+            'room': room_slug,
+            'last_read_seq': seq,
+            'unread': max(0, (room.message_seq or 0) - seq)
+        }, socketio=socketio, skip_sid=request.sid)
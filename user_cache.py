@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+"""
+Cache do usuário autenticado para o Flask-Login.
+
+O `user_loader` roda em toda requisição e em todo evento Socket.IO. Em vez
+de carregar a entidade `User` do banco a cada vez, guarda um registro leve
+(id, username, email, is_admin, is_active) em um cache TTL por worker.
+
+Alterações desses campos feitas pelo ORM invalidam a entrada após o
+commit; o TTL limita a defasagem quando a alteração ocorre em outro
+processo. Os acertos do cache (`chat_cache_requests_total{cache="users",
+result="hit"}`) são as leituras do banco evitadas.
+"""
+
+from flask_login import UserMixin
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session
+from cache import TTLCache
+from models import User
+
+# Campos copiados para o registro em cache
+CACHED_FIELDS = ('username', 'email', 'is_admin', 'is_active')
+
+user_cache = TTLCache('users', maxsize=10000, ttl=60)
+
+
+class CachedUser(UserMixin):
+    """Registro leve do usuário autenticado (somente leitura)"""
+
+    def __init__(self, id, username, email, is_admin, is_active):
+        self.id = id
+        self.username = username
+        self.email = email
+        self.is_admin = bool(is_admin)
+        self._is_active = is_active is None or bool(is_active)
+
+    @property
+    def is_active(self):
+        return self._is_active
+
+    def __eq__(self, other):
+        return isinstance(other, (CachedUser, User)) and other.id == self.id
+
+    def __hash__(self):
+        return hash(self.id)
+
+    def __repr__(self):
+        return f'<CachedUser {self.username}>'
+
+
+def load_cached_user(db_session, user_id):
+    """user_loader: registro em cache ou uma consulta de colunas ao banco"""
+    try:
+        user_id = int(user_id)
+    except (TypeError, ValueError):
+        return None
+
+    user = user_cache.get(user_id)
+    if user is not None:
+        return user
+
+    row = db_session.query(User.id, *(getattr(User, field) for field in CACHED_FIELDS)).filter(
+        User.id == user_id
+    ).first()
+    if row is None:
+        return None
+
+    user = CachedUser(*row)
+    user_cache.set(user_id, user)
+    return user
+
+
+def invalidate_user(user_id):
+    """Remove o usuário do cache (para alterações fora do ORM)"""
+    user_cache.delete(user_id)
+
+
+def _collect_user_changes(session, flush_context):
+    """after_flush: usuários cujos campos em cache mudaram nesta transação"""
+    changed = session.info.setdefault('cached_users_changed', set())
+    for obj in session.deleted:
+        if isinstance(obj, User):
+            changed.add(obj.id)
+    for obj in session.dirty:
+        if isinstance(obj, User):
+            state = inspect(obj)
+            if any(state.attrs[field].history.has_changes() for field in CACHED_FIELDS):
+                changed.add(obj.id)
+
+
+def _invalidate_committed(session):
+    for user_id in session.info.pop('cached_users_changed', ()):
+        invalidate_user(user_id)
+
+
+def _discard(session):
+    session.info.pop('cached_users_changed', None)
+
+
+_listeners_installed = False
+
+
+def init_user_cache(app, login_manager):
+    """Configura o cache e registra o user_loader no login manager"""
+    global _listeners_installed
+    user_cache.maxsize = app.config.get('USER_CACHE_SIZE', 10000)
+    user_cache.ttl = app.config.get('USER_CACHE_TTL', 60)
+
+    if not _listeners_installed:
+        event.listen(Session, 'after_flush', _collect_user_changes)
+        event.listen(Session, 'after_commit', _invalidate_committed)
+        event.listen(Session, 'after_rollback', _discard)
+        _listeners_installed = True
+
+    @login_manager.user_loader
+    def load_user(user_id):
+        """Carrega o usuário para o Flask-Login (com cache)"""
+        return load_cached_user(app.extensions['sqlalchemy'].session, user_id)